@@ -0,0 +1,59 @@
+"""問題を表示してから回答するまでの時間（回答時間）をセッションごとに記録するモジュール。
+
+単語ごとの回答数・合計時間・「遅い正解」の数と、セッション全体の回答数・合計時間は回答ごとに少しずつ更新します。
+苦手モードの重み付けや平均回答時間の表示はこの集計値だけを使うので、回答の履歴は持ちません。
+"""
+
+# 離席などで極端に長くなった回答時間は、平均の計算ではこの値で打ち切る
+MAX_ELAPSED_MS = 120_000
+# 正解した回答の平均時間の何倍を超えたら「遅い正解」とみなすか
+SLOW_FACTOR = 1.5
+# 「遅い正解」の判定を始めるのに必要な正解数（少ないうちは平均が安定しないため）
+MIN_SAMPLES = 5
+# 苦手モードで「遅い正解」1回を何回分の不正解として扱うか
+SLOW_CORRECT_WEIGHT = 0.5
+
+
+class AnswerTimings:
+    """回答時間の単語ごと・セッション全体の集計値。"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.by_term = {}  # 単語 -> [回答数, 合計時間(ms), 遅い正解の数]
+        self.correct_count = 0  # 平均の計算に使った正解の数
+        self.correct_mean_ms = 0.0  # 正解した回答の平均時間（逐次平均）
+        self.total_count = 0  # 全体の回答数
+        self.total_ms = 0.0  # 全体の合計時間（打ち切り後の値）
+
+    def record(self, term: str, elapsed_ms: float, is_correct: bool):
+        """1回分の回答時間を記録します（O(1)）。遅い正解だった場合は True を返します。"""
+        clipped = min(elapsed_ms, MAX_ELAPSED_MS)
+        slow = is_correct and self.is_slow(clipped)
+        stats = self.by_term.setdefault(term, [0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += clipped
+        if slow:
+            stats[2] += 1
+        self.total_count += 1
+        self.total_ms += clipped
+        if is_correct:
+            self.correct_count += 1
+            self.correct_mean_ms += (clipped - self.correct_mean_ms) / self.correct_count
+        return slow
+
+    def is_slow(self, elapsed_ms: float) -> bool:
+        """正解した回答の平均時間と比べて遅いかどうかを返します。"""
+        return self.correct_count >= MIN_SAMPLES and elapsed_ms > self.correct_mean_ms * SLOW_FACTOR
+
+    def slow_correct_counts(self) -> dict:
+        """{単語: 遅い正解の数} を返します（遅い正解のない単語は含めない）。"""
+        return {term: stats[2] for term, stats in self.by_term.items() if stats[2]}
+
+    def mean_ms(self, term: str = None):
+        """単語ごと（term を省略した場合は全体）の平均回答時間を返します。記録がなければ None を返します。"""
+        if term is not None:
+            stats = self.by_term.get(term)
+            return stats[1] / stats[0] if stats else None
+        return self.total_ms / self.total_count if self.total_count else None
@@ -1,9 +1,63 @@
+from __future__ import annotations
+
 import streamlit as st
-import pandas as pd
-import random
 import io
+import importlib
+import logging
+import os
+import random
 from datetime import datetime, timedelta
 import time
+from search_index import NgramIndex
+from progress_stats import ProgressStats, STAT_DIMENSIONS
+from answer_timing import AnswerTimings
+from feedback_panel import PanelCache
+from session_recorder import SessionRecorder
+from classroom import ClassroomRegistry
+from startup_metrics import StartupMetrics
+import session_lifecycle
+from metrics import REGISTRY, ActivityTracker
+
+# スクリプト実行開始時刻（初回描画までの時間の計測用）
+_SCRIPT_START = time.perf_counter()
+
+
+class _LazyModule:
+    """属性に初めてアクセスしたときにモジュールを import する代理オブジェクト。
+    pandas や plotly などの重いモジュールの import を、画面の骨組みを描画した後まで遅らせるために使う。
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+pd = _LazyModule("pandas")
+go = _LazyModule("plotly.graph_objects")
+deck_watcher = _LazyModule("deck_watcher")
+progress_import = _LazyModule("progress_import")
+shared_deck = _LazyModule("shared_deck")
+term_details = _LazyModule("term_details")
+deck_validation = _LazyModule("deck_validation")
+quiz_engine = _LazyModule("quiz_engine")
+difficulty_stats = _LazyModule("difficulty_stats")
+session_snapshot = _LazyModule("session_snapshot")
+workbook_import = _LazyModule("workbook_import")
+viewer_cache = _LazyModule("viewer_cache")
+attempt_history = _LazyModule("attempt_history")
+
+# サーバー全体のメトリクス（REGISTRY は再実行をまたいで共有され、同じ名前なら登録済みのものが返る）
+SESSIONS_STARTED = REGISTRY.counter("tango_sessions_started_total", "開始されたセッション数")
+RERUNS = REGISTRY.counter("tango_reruns_total", "スクリプトの実行回数")
+RERUN_SECONDS = REGISTRY.histogram("tango_rerun_duration_seconds", "スクリプト1回の実行時間")
+LOAD_QUIZ_SECONDS = REGISTRY.histogram("tango_load_quiz_duration_seconds", "load_quiz の処理時間")
+PROCESS_ANSWER_SECONDS = REGISTRY.histogram("tango_process_answer_duration_seconds", "_process_answer の処理時間")
+FIRST_QUESTION_SECONDS = REGISTRY.histogram("tango_first_question_seconds", "セッション開始から最初の問題表示までの時間",
+                                            buckets=(0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0))
 
 # Streamlitページの初期設定
 st.set_page_config(
@@ -20,12 +74,12 @@ defaults = {
     "quiz_df": None,
     "current_quiz": None, # 現在出題中のクイズ（選択肢表示用）
     "latest_answered_quiz": None, # 回答後に詳細を表示するためのクイズ情報（一つ前の問題）
-    "total": 0,
-    "correct": 0,
+    "scope_counters": {}, # 絞り込み条件（スコープ）ごとの [回答数, 正解数]
     "latest_result": "",
-    "latest_correct_description": "",
+    "latest_correct_answer": "",
+    "latest_recall": None, # 入力式の回答の採点結果（typed_recall.RecallGrade）
     "selected_answer": None, # ユーザーが選択した回答
-    "quiz_choice_index": 0, # st.radio の key をユニークにするためのインデックス
+    "quiz_choice_index": 0, # st.radio の key を問題ごとに切り替えるためのインデックス（キーは固定数のプールで使い回す）
     "filter_category": "すべて",
     "filter_field": "すべて",
     "filter_level": "すべて",
@@ -33,12 +87,48 @@ defaults = {
     "uploaded_df_temp": None,
     "uploaded_file_name": None,
     "uploaded_file_size": None,
+    "upload_report": None, # アップロードCSVの検証結果（deck_validation.ValidationReport）
+    "rejected_upload": None, # 検証エラーで読み込まなかったアップロードファイル（ファイル名, サイズ, ファイルID）。変わるまで読み直さない
     "debug_mode": False,
     "quiz_mode": "復習",
+    "quiz_direction": "単語→説明", # 出題の方向（quiz_engine.DIRECTIONS のキー）
     "main_data_source_radio": "初期データ",
     "force_initial_load": True, # アプリ初回起動時にのみ初期データをロードするためのフラグ
     "processing_answer": False, # 回答処理中フラグ: Trueの間はUIをブロックする（スピナーなど）
-    "quiz_state": "question" # "question" (問題表示中) or "answered" (回答済み、結果表示中)
+    "quiz_state": "question", # "question" (問題表示中) or "answered" (回答済み、結果表示中)
+    "search_index": None, # 単語検索用の n-gram 転置インデックス
+    "search_query": "",
+    "search_terms_filter": None, # 「検索結果で出題」時に出題対象を絞り込む単語のリスト
+    "search_filter_query": None, # search_terms_filter を作った検索語（スコープの識別用）
+    "progress_stats": None, # 分析タブ用の集計値（_process_answer で逐次更新）
+    "answer_timings": None, # 問題表示から回答までの時間の記録（苦手モードの重み付けに使用）
+    "deck_version": None, # 反映済みの初期データ（tango.csv）のバージョン。アップロードデータ使用中は None
+    "detail_deck_id": None, # quiz_df から切り出した詳細列の TermDetailStore 上のID
+    "deck_columns": None, # 詳細列を切り出す前のカラム順（データビューア・エクスポート用）
+    "viewer_deck_key": None, # データビューアの Arrow テーブルのキャッシュキー（デッキを読み込むたびに変わる）
+    "progress_version": 0, # quiz_df の進捗カラムを変更するたびに増やす（データビューアのキャッシュ用）
+    "viewer_table": None, # (viewer_deck_key, progress_version, データビューア用の Arrow テーブル)
+    "exam_sampler": None, # 試験対策モードの重みと累積分布（詳細列を切り出す前に計算する）
+    "choice_pools": None, # 出題の方向ごとの選択肢のプール（詳細列を切り出す前に作る）
+    "recall_index": None, # 入力式の採点用の単語の索引（デッキの読み込み時に作り、同じデッキのセッションで共有する）
+    "direction_progress": None, # 単語・出題方向ごとの正解数と不正解数
+    "attempt_history": None, # 単語ごとの直近の回答の正誤と日時（学習曲線・直近の正答率用）
+    "resume_import": False, # アップロードCSVの進捗カラムを引き継ぐ（エクスポートしたCSVからの再開）
+    "merge_rule": "newest", # 進捗ファイルのマージで競合したときのルール
+    "session_started_at": None, # このセッションの最初の実行開始時刻（perf_counter）
+    "metrics_session_id": None, # アクティブなセッション数を数えるためのID
+    "learner_token": None, # 全学習者の難易度集計に回答結果を送るときの匿名ID
+    "snapshot_id": None, # セッションのスナップショットのID（URLの ?sid= で再接続時に引き継ぐ）
+    "snapshot_checked": False, # このセッションでスナップショットの復元を試みたかどうか
+    "quiz_seed": None, # 出題用の乱数のシード（操作の記録に書き出し、再生時に同じ出題を再現する）
+    "quiz_rng": None, # 出題用の乱数（セッションで1つを使い続ける）
+    "recording_id": None, # 操作の記録（TANGO_RECORD_DIR 設定時のみ）のID
+    "recorded_state": None, # 最後に記録した絞り込み条件・モード
+    "class_code": None, # 受講者として参加中のクラスの参加コード（参加中はデッキを読み込まない）
+    "class_index": 0, # クラスで解いている問題の番号
+    "class_answers": {}, # クラスの問題番号 -> (選んだ選択肢, 正解かどうか)
+    "class_hosting": None, # 講師として作成したクラスの参加コード
+    "first_question_ms": None # セッション開始から最初の問題を表示するまでの時間
 }
 
 for key, val in defaults.items():
@@ -48,8 +138,8 @@ for key, val in defaults.items():
 # --- ここまでセッション状態の初期化ロジック ---
 
 
-# カスタムCSSの適用
-st.markdown("""
+# カスタムCSS（main() で画面の骨組みと一緒に適用する）
+_CUSTOM_CSS = """
 <style>
     /* 全体のフォントを調整 */
     body {
@@ -183,28 +273,47 @@ st.markdown("""
         display: none !important;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+def inject_custom_css():
+    """カスタムCSSを適用します。"""
+    st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
+
+# 出題の方向ごとの (問題文の見出し, 選択肢の問い)
+_DIRECTION_LABELS = {
+    "単語→説明": ("単語", "この単語の説明として正しいものはどれですか？"),
+    "説明→単語": ("説明", "この説明に当てはまる単語はどれですか？"),
+    "使用例→単語": ("午後記述での使用例", "この使用例で使われている単語はどれですか？"),
+    "説明→単語（入力）": ("説明", "この説明に当てはまる単語を入力してください"),
+}
 
 class QuizApp:
     def __init__(self):
         pass 
 
-    def _reset_quiz_state_only(self):
+    def _reset_quiz_state_only(self, clear_progress: bool = True):
         """クイズの進行に関するセッションステートのみをリセットします。
         データソース切り替え時やクイズリセットボタン押下時に呼び出される。
+        clear_progress=False の場合は quiz_df の進捗カラム（〇×結果・正解回数など）を残します。
         """
-        st.session_state.total = 0
-        st.session_state.correct = 0
+        st.session_state.scope_counters = {}
         st.session_state.latest_result = ""
-        st.session_state.latest_correct_description = ""
+        st.session_state.latest_correct_answer = ""
+        st.session_state.latest_recall = None
         st.session_state.current_quiz = None
         st.session_state.latest_answered_quiz = None # 表示用クイズ情報もクリア
         st.session_state.selected_answer = None # 選択された回答もクリア
         st.session_state.quiz_choice_index = 0 
         st.session_state.processing_answer = False 
         st.session_state.quiz_state = "question" # クイズ状態をリセット
-
-        if st.session_state.quiz_df is not None and not st.session_state.quiz_df.empty:
+        st.session_state.progress_stats = ProgressStats() # 回答数と同時に集計値もリセット
+        st.session_state.answer_timings = AnswerTimings()
+        st.session_state.direction_progress = None
+        st.session_state.attempt_history = None
+        self._record("reset", clear_progress=clear_progress)
+        st.session_state.progress_version += 1
+
+        if clear_progress and st.session_state.quiz_df is not None and not st.session_state.quiz_df.empty:
             st.session_state.quiz_df.loc[:, '〇×結果'] = '' 
             st.session_state.quiz_df.loc[:, '正解回数'] = 0
             st.session_state.quiz_df.loc[:, '不正解回数'] = 0
@@ -214,11 +323,99 @@ class QuizApp:
                 st.sidebar.write(f"DEBUG: _reset_quiz_state_only: quiz_df['〇×結果'] reset. First 5: {st.session_state.quiz_df['〇×結果'].head()}")
 
 
+    def _quiz_rng(self) -> random.Random:
+        """このセッションの出題用の乱数を返します。"""
+        if st.session_state.quiz_rng is None:
+            st.session_state.quiz_seed = int.from_bytes(os.urandom(4), "little")
+            st.session_state.quiz_rng = random.Random(st.session_state.quiz_seed)
+        return st.session_state.quiz_rng
+
+    def _record(self, event: str, **data):
+        """操作の記録が有効なら、イベントを1件記録します。
+        最初のイベントで記録を開始し、出題用の乱数をシードから作り直して start イベントに書き出します。
+        """
+        recorder = get_session_recorder()
+        if recorder is None:
+            return
+        if st.session_state.recording_id is None:
+            st.session_state.recording_id = os.urandom(8).hex()
+            st.session_state.quiz_rng = None # 記録したシードから再現できるよう、乱数を作り直す
+            self._quiz_rng()
+            recorder.start(st.session_state.recording_id, st.session_state.quiz_seed, deck_version=st.session_state.deck_version)
+        recorder.record(st.session_state.recording_id, event, **data)
+
+    def _record_state_change(self):
+        """絞り込み条件・モード・出題形式が前回の記録から変わっていれば state イベントを記録します。"""
+        state = {
+            "mode": st.session_state.quiz_mode,
+            "direction": st.session_state.quiz_direction,
+            "category": st.session_state.filter_category,
+            "field": st.session_state.filter_field,
+            "level": st.session_state.filter_level,
+            "terms": st.session_state.search_terms_filter,
+            "query": st.session_state.search_filter_query,
+        }
+        if state != st.session_state.recorded_state:
+            st.session_state.recorded_state = state
+            self._record("state", **state)
+
+    @staticmethod
+    def _filters():
+        """セッション状態の絞り込み条件を quiz_engine.QuizFilters にして返します。"""
+        terms = st.session_state.search_terms_filter
+        return quiz_engine.QuizFilters(
+            category=st.session_state.filter_category,
+            field=st.session_state.filter_field,
+            level=st.session_state.filter_level,
+            terms=tuple(terms) if terms is not None else None,
+            query=st.session_state.search_filter_query,
+        )
+
+    @staticmethod
+    def _current_scope() -> tuple:
+        """現在の絞り込み条件（スコープ）を表すキーを返します。"""
+        return QuizApp._filters().scope()
+
+    @staticmethod
+    def _scope_counters() -> list:
+        """現在のスコープの [回答数, 正解数] を返します。"""
+        return st.session_state.scope_counters.get(QuizApp._current_scope(), [0, 0])
+
+    @staticmethod
+    def _quiz_choice_key() -> str:
+        """現在の問題のラジオボタンのキーを返します。"""
+        return session_lifecycle.pooled_widget_key("quiz_choice", st.session_state.quiz_choice_index)
+
+    def _on_filter_change(self):
+        """絞り込み条件やクイズモードが変わったときの処理。
+        進捗は単語ごとに quiz_df に保持したままなので、出題中の問題を切り替えるだけで全件の書き換えは行わない。
+        """
+        st.session_state.current_quiz = None
+        st.session_state.latest_answered_quiz = None
+        st.session_state.selected_answer = None
+        st.session_state.latest_result = ""
+        st.session_state.latest_correct_answer = ""
+        st.session_state.latest_recall = None
+        st.session_state.processing_answer = False
+        st.session_state.quiz_state = "question"
+
     def _load_initial_data(self):
         """初期データをロードし、セッション状態に設定します。"""
         try:
-            df = pd.read_csv("tango.csv", encoding='utf-8')
-            st.session_state.quiz_df = self._process_df_types(df)
+            # tango.csv のパースは全セッションで共有する DeckWatcher が一度だけ行う
+            watcher = get_deck_watcher()
+            try:
+                watcher.refresh()
+            except (OSError, ValueError):
+                if watcher.deck is None:
+                    raise
+                # 更新された tango.csv が読めない間は、前回読み込んだデッキを使う
+                st.warning(f"tango.csv を読み込めなかったため、前回読み込んだデータを使用します: {watcher.load_error}")
+            st.session_state.quiz_df = watcher.deck.copy()
+            st.session_state.deck_version = watcher.version
+            self._refresh_search_index()
+            self._split_detail_columns(cache_key=("tango.csv", watcher.version))
+            self._record("load", source="tango.csv", deck_version=watcher.version)
             st.success("初期データをロードしました！")
             self._reset_quiz_state_only() 
         except FileNotFoundError:
@@ -232,55 +429,202 @@ class QuizApp:
         """アップロードされたデータをロードし、セッション状態に設定します。"""
         if st.session_state.uploaded_df_temp is not None:
             st.session_state.quiz_df = self._process_df_types(st.session_state.uploaded_df_temp.copy())
+            st.session_state.deck_version = None
+            self._refresh_search_index()
+            self._split_detail_columns()
+            self._record("load", source="upload", file_name=st.session_state.uploaded_file_name)
             st.success(f"'{st.session_state.uploaded_file_name}' をロードしました！")
-            self._reset_quiz_state_only() 
+            self._reset_quiz_state_only(clear_progress=not st.session_state.resume_import) 
         else:
             st.warning("アップロードされたデータが見つかりません。")
             st.session_state.quiz_df = None 
 
     def _process_df_types(self, df: pd.DataFrame) -> pd.DataFrame:
         """DataFrameに対して、必要なカラムの型変換と、存在しないカラムの初期化を適用します。"""
-        df_processed = df.copy() 
-        
-        column_configs = {
-            '単語': {'type': str, 'default': ''}, # 単語列の追加
-            '説明': {'type': str, 'default': ''}, # 説明列の追加
-            'カテゴリ': {'type': str, 'default': ''}, # カテゴリ列の追加
-            '分野': {'type': str, 'default': ''}, # 分野列の追加
-            '正解回数': {'type': int, 'default': 0, 'numeric_coerce': True},
-            '不正解回数': {'type': int, 'default': 0, 'numeric_coerce': True},
-            '最終実施日時': {'type': 'datetime', 'default': pd.NaT},
-            '次回実施予定日時': {'type': 'datetime', 'default': pd.NaT},
-            'シラバス改定有無': {'type': str, 'default': '', 'replace_nan': True},
-            '午後記述での使用例': {'type': str, 'default': ''},
-            '使用理由／文脈': {'type': str, 'default': ''},
-            '試験区分': {'type': str, 'default': ''},
-            '出題確率（推定）': {'type': str, 'default': ''}, 
-            '改定の意図・影響': {'type': str, 'default': ''},
-            '〇×結果': {'type': str, 'default': '', 'replace_nan': True}
-        }
-
         # 必須カラムのチェック (エラーハンドリング強化)
-        required_columns = ['単語', '説明', 'カテゴリ', '分野']
-        missing_columns = [col for col in required_columns if col not in df_processed.columns]
+        missing_columns = deck_validation.missing_required_columns(df.columns)
         if missing_columns:
             st.error(f"エラー: 以下の必須カラムがデータに見つかりません: {', '.join(missing_columns)}")
             st.stop() # アプリの実行を停止
 
-        for col_name, config in column_configs.items():
-            if col_name not in df_processed.columns:
-                df_processed[col_name] = config['default']
-            else:
-                if config.get('replace_nan'):
-                    df_processed[col_name] = df_processed[col_name].astype(str).replace('nan', '')
-                if config.get('numeric_coerce'):
-                    df_processed[col_name] = pd.to_numeric(df_processed[col_name], errors='coerce').fillna(config['default']).astype(int)
-                if config['type'] == 'datetime':
-                    df_processed[col_name] = pd.to_datetime(df_processed[col_name], errors='coerce')
-                elif config['type'] == str and not config.get('replace_nan'):
-                    df_processed[col_name] = df_processed[col_name].astype(str)
-        
-        return df_processed
+        return deck_validation.apply_column_types(df)
+
+    def _refresh_search_index(self):
+        """検索インデックスを現在の quiz_df に合わせます。
+        初回は全件で構築し、以降のデータ切り替え時は差分（追加・削除・変更された単語）のみ反映します。
+        """
+        st.session_state.search_terms_filter = None # デッキが変わったら検索による絞り込みは解除
+        st.session_state.search_filter_query = None
+        if st.session_state.quiz_df is None:
+            st.session_state.search_index = None
+            return
+
+        if st.session_state.search_index is None:
+            st.session_state.search_index = NgramIndex().build(st.session_state.quiz_df)
+        else:
+            diff = st.session_state.search_index.update(st.session_state.quiz_df)
+            if st.session_state.debug_mode:
+                st.sidebar.write(f"DEBUG: search index updated: {diff}")
+
+    def _split_detail_columns(self, cache_key=None):
+        """quiz_df から詳細テキスト列を切り出して TermDetailStore に保存し、セッションには出題に必要な列だけを残します。
+        検索インデックスの更新など、詳細列を使う処理の後に呼び出してください。
+        """
+        # 初期データはバージョンごとに全セッションで共有し、アップロードデータはセッションごとのキーにする
+        st.session_state.viewer_deck_key = cache_key or ("upload", os.urandom(8).hex())
+        if st.session_state.quiz_df is None:
+            st.session_state.detail_deck_id = None
+            st.session_state.exam_sampler = None
+            st.session_state.choice_pools = None
+            st.session_state.recall_index = None
+            return
+        hot_df, details = term_details.split_details(st.session_state.quiz_df)
+        if details.columns.empty:
+            return # すでに切り出し済み
+        # 試験区分・使用例は詳細列なので、切り出す前に試験対策モードの重みと選択肢のプールを作っておく
+        st.session_state.exam_sampler = quiz_engine.ExamSampler.from_deck(st.session_state.quiz_df)
+        st.session_state.choice_pools = quiz_engine.ChoicePools(st.session_state.quiz_df)
+        st.session_state.recall_index = get_recall_index(st.session_state.viewer_deck_key, st.session_state.quiz_df["単語"])
+        st.session_state.deck_columns = list(st.session_state.quiz_df.columns)
+        st.session_state.detail_deck_id = get_detail_store().put(details, cache_key=cache_key)
+        st.session_state.quiz_df = hot_df
+
+    def _term_details(self, quiz: dict) -> dict:
+        """出題した単語の詳細列（試験区分・午後記述での使用例など）を取り出します。"""
+        return get_detail_store().get(st.session_state.detail_deck_id, quiz.get("term_id"))
+
+    def _with_details(self, df: pd.DataFrame) -> pd.DataFrame:
+        """quiz_df に詳細列を結合し、元のカラム順に戻した DataFrame を返します。"""
+        details = get_detail_store().get_frame(st.session_state.detail_deck_id)
+        if details.empty:
+            return df
+        merged = df.join(details[[col for col in details.columns if col not in df.columns]])
+        if st.session_state.deck_columns:
+            ordered = [col for col in st.session_state.deck_columns if col in merged.columns]
+            merged = merged[ordered + [col for col in merged.columns if col not in ordered]]
+        return merged
+
+    def _sync_with_deck_watcher(self):
+        """tango.csv が更新されていれば、進捗を保ったまま差分をこのセッションに反映します。"""
+        if st.session_state.deck_version is None or st.session_state.quiz_df is None:
+            return
+
+        watcher = get_deck_watcher()
+        try:
+            watcher.refresh()
+        except (OSError, ValueError):
+            # ファイルが一時的に読めない・書き込み途中などでパースできない場合は現在のデッキを使い続ける
+            # （ParserError・UnicodeDecodeError は ValueError のサブクラス。失敗の内容は watcher.load_error に残る）
+            return
+        if watcher.version == st.session_state.deck_version:
+            return
+
+        changes = watcher.changes_since(st.session_state.deck_version)
+        old_df = st.session_state.quiz_df
+        st.session_state.quiz_df = deck_watcher.carry_over_progress(watcher.deck, old_df)
+        by_term_id = [st.session_state.attempt_history, st.session_state.direction_progress]
+        if any(state is not None for state in by_term_id):
+            # 回答履歴と方向ごとの進捗は term_id で持っているので、（単語, 出現番号）のキーで新しい term_id に付け替える
+            positions = deck_watcher.deck_keys(old_df).get_indexer(deck_watcher.deck_keys(st.session_state.quiz_df))
+            found = positions >= 0
+            new_ids = dict(zip(old_df.index[positions[found]], st.session_state.quiz_df.index[found]))
+            for state in by_term_id:
+                if state is not None:
+                    state.remap(new_ids)
+        st.session_state.deck_version = watcher.version
+
+        # 検索インデックスは変更のあった単語だけを更新（履歴が足りない場合は全件で差分計算）
+        if st.session_state.search_index is None:
+            st.session_state.search_index = NgramIndex().build(st.session_state.quiz_df)
+        elif changes is None:
+            st.session_state.search_index.update(st.session_state.quiz_df)
+        else:
+            upserted = set().union(*(c.added | c.changed for c in changes))
+            removed = set().union(*(c.removed for c in changes))
+            st.session_state.search_index.apply_changes(
+                st.session_state.quiz_df[st.session_state.quiz_df["単語"].isin(upserted)],
+                removed
+            )
+
+        self._split_detail_columns(cache_key=("tango.csv", watcher.version))
+
+        # 出題中の単語がデッキから削除された場合は次の問題へ
+        if st.session_state.current_quiz and not (st.session_state.quiz_df["単語"] == st.session_state.current_quiz["単語"]).any():
+            st.session_state.current_quiz = None
+            st.session_state.latest_answered_quiz = None
+            st.session_state.quiz_state = "question"
+
+        st.toast("初期データ（tango.csv）の更新を反映しました。")
+
+    def _start_quiz_from_search(self, terms: list, query: str):
+        """検索結果の単語だけを出題対象にします。"""
+        st.session_state.search_terms_filter = list(terms)
+        st.session_state.search_filter_query = query
+        self._on_filter_change()
+
+    def _clear_search_filter(self):
+        """検索結果による出題対象の絞り込みを解除します。"""
+        st.session_state.search_terms_filter = None
+        st.session_state.search_filter_query = None
+        self._on_filter_change()
+
+    @staticmethod
+    def _read_uploaded_csv(uploaded_file) -> pd.DataFrame:
+        """アップロードされたCSVを DataFrame として読み込みます。"""
+        try:
+            # UTF-8でデコードを試み、失敗したらShift-JISで試す
+            content_str = uploaded_file.getvalue().decode('utf-8')
+        except UnicodeDecodeError:
+            content_str = uploaded_file.getvalue().decode('shift_jis')
+        return pd.read_csv(io.StringIO(content_str))
+
+    @staticmethod
+    def _read_uploaded_deck(uploaded_file) -> pd.DataFrame:
+        """アップロードされたデッキ（CSV・xlsx・ods）を DataFrame として読み込みます。
+        ブックはシートごとに並列で解析し、結果は内容のハッシュでキャッシュします。
+        """
+        kind = workbook_import.workbook_kind(uploaded_file.name)
+        if kind is None:
+            return QuizApp._read_uploaded_csv(uploaded_file)
+        try:
+            with st.spinner(f"'{uploaded_file.name}' のシートを読み込んでいます..."):
+                result = read_workbook_cached(uploaded_file.getvalue(), kind)
+        except ImportError as e:
+            st.error(f"{kind} ファイルの読み込みに必要なライブラリがありません: {e}")
+            st.stop()
+        for sheet, reason in result.skipped.items():
+            st.sidebar.warning(f"シート '{sheet}' は読み込みませんでした（{reason}）")
+        return result.deck
+
+    def _merge_progress_file(self, progress_file):
+        """エクスポートした進捗CSVを現在の quiz_df にマージします。"""
+        if progress_file is None or st.session_state.quiz_df is None:
+            return
+        progress_df = self._process_df_types(self._read_uploaded_csv(progress_file))
+
+        start_time = time.perf_counter()
+        st.session_state.quiz_df, merged_count = progress_import.merge_progress(
+            st.session_state.quiz_df, progress_df, rule=st.session_state.merge_rule
+        )
+        st.session_state.progress_version += 1
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+        st.session_state.current_quiz = None
+        st.session_state.latest_answered_quiz = None
+        st.session_state.quiz_state = "question"
+        st.success(f"{merged_count} 語の進捗をマージしました（{elapsed_ms:.0f} ms）。")
+
+    @staticmethod
+    def display_upload_report(report):
+        """アップロードCSVの検証結果（エラーと警告）をサイドバーに表示します。"""
+        for issue in report.errors:
+            st.sidebar.error(f"読み込めません: {issue.message}")
+        if report.warnings:
+            with st.sidebar.expander(f"⚠️ データの警告（{len(report.warnings)} 件）"):
+                for issue in report.warnings:
+                    st.markdown(f"- {issue.message}")
+                    if issue.examples:
+                        st.text("\n".join(f"{value}: {', '.join(map(str, rows))} 行目" for value, rows in issue.examples))
 
     def handle_upload_logic(self, uploaded_file):
         """ファイルアップロードのロジックを処理します。"""
@@ -290,20 +634,26 @@ class QuizApp:
                 st.session_state.uploaded_file_size != uploaded_file.size or
                 st.session_state.uploaded_df_temp is None): # 初回アップロード時はtempがNone
                 
-                try:
-                    # UTF-8でデコードを試み、失敗したらShift-JISで試す
-                    content_str = uploaded_file.getvalue().decode('utf-8')
-                except UnicodeDecodeError:
-                    content_str = uploaded_file.getvalue().decode('shift_jis')
-
-                uploaded_df = pd.read_csv(io.StringIO(content_str))
+                upload_key = (uploaded_file.name, uploaded_file.size, getattr(uploaded_file, "file_id", None))
+                if st.session_state.rejected_upload == upload_key:
+                    return # 検証エラーになったファイルのまま。再実行のたびにパース・検証し直さない
+                uploaded_df = self._read_uploaded_deck(uploaded_file)
+                st.session_state.upload_report = deck_validation.validate_frame(uploaded_df)
+                if not st.session_state.upload_report.ok:
+                    st.session_state.rejected_upload = upload_key
+                    return # 現在のデータのまま。エラー内容は display_upload_report で表示する
+                st.session_state.rejected_upload = None
                 st.session_state.uploaded_df_temp = uploaded_df
                 st.session_state.uploaded_file_name = uploaded_file.name
                 st.session_state.uploaded_file_size = uploaded_file.size
                 
                 st.session_state.quiz_df = self._process_df_types(uploaded_df.copy())
+                st.session_state.deck_version = None
+                self._refresh_search_index()
+                self._split_detail_columns()
+                self._record("load", source="upload", file_name=uploaded_file.name)
                 st.session_state.data_source_selection = "アップロード" 
-                self._reset_quiz_state_only() 
+                self._reset_quiz_state_only(clear_progress=not st.session_state.resume_import) 
             else:
                 # 同じファイルが再アップロードされた場合（内容変更なし）
                 pass
@@ -320,135 +670,110 @@ class QuizApp:
     @staticmethod
     def _apply_filters(df: pd.DataFrame) -> pd.DataFrame:
         """セッション状態のフィルターに基づいてDataFrameをフィルターします。"""
-        filtered_df = df.copy()
-
-        if st.session_state.filter_category != "すべて":
-            filtered_df = filtered_df[filtered_df["カテゴリ"] == st.session_state.filter_category]
-        if st.session_state.filter_field != "すべて":
-            filtered_df = filtered_df[filtered_df["分野"] == st.session_state.filter_field]
-        if st.session_state.filter_level != "すべて":
-            filtered_df = filtered_df[filtered_df["シラバス改定有無"] == st.session_state.filter_level]
-        
-        return filtered_df
+        return QuizApp._filters().apply(df)
+
+    @staticmethod
+    def _progress_view(df: pd.DataFrame) -> pd.DataFrame:
+        """選択中の出題の方向から見た進捗の df を返します（単語→説明 以外は方向ごとの回答数に置き換えます）。"""
+        direction = st.session_state.quiz_direction
+        if direction == quiz_engine.DEFAULT_DIRECTION:
+            return df
+        if st.session_state.direction_progress is None:
+            st.session_state.direction_progress = quiz_engine.DirectionProgress()
+        return st.session_state.direction_progress.progress(df, direction)
+
+    def _engine(self):
+        """セッション状態の quiz_df と集計値をそのまま（コピーせずに）使うクイズエンジンを返します。"""
+        if st.session_state.progress_stats is None:
+            st.session_state.progress_stats = ProgressStats()
+        if st.session_state.answer_timings is None:
+            st.session_state.answer_timings = AnswerTimings()
+        if st.session_state.direction_progress is None:
+            st.session_state.direction_progress = quiz_engine.DirectionProgress()
+        if st.session_state.attempt_history is None:
+            st.session_state.attempt_history = attempt_history.AttemptHistory()
+        return quiz_engine.QuizEngine(
+            st.session_state.quiz_df,
+            progress_stats=st.session_state.progress_stats,
+            answer_timings=st.session_state.answer_timings,
+            scope_counters=st.session_state.scope_counters,
+            details_fn=self._term_details,
+            rng=self._quiz_rng(),
+            difficulty_weights=get_difficulty_aggregator().snapshot.weights,
+            exam_sampler=st.session_state.exam_sampler,
+            choice_pools=st.session_state.choice_pools,
+            direction_progress=st.session_state.direction_progress,
+            attempt_history=st.session_state.attempt_history,
+            recall_index=st.session_state.recall_index,
+        )
 
+    @LOAD_QUIZ_SECONDS.time()
     def load_quiz(self): 
         """クイズの単語をロードします。"""
         if st.session_state.quiz_df is None or st.session_state.quiz_df.empty:
             st.session_state.current_quiz = None
             return 
 
-        df_filtered = QuizApp._apply_filters(st.session_state.quiz_df)
-        remaining_df_for_quiz = df_filtered[df_filtered["〇×結果"] == '']
-
-        st.session_state.quiz_choice_index += 1 
+        # ラジオボタンのキーはプールで使い回し、過去の問題のウィジェット状態は削除する
+        st.session_state.quiz_choice_index = (st.session_state.quiz_choice_index + 1) % session_lifecycle.WIDGET_KEY_POOL_SIZE
+        session_lifecycle.recycle_widget_key(st.session_state, self._quiz_choice_key())
         st.session_state.selected_answer = None # 新しい問題がロードされるので選択された回答をクリア
 
-        quiz_candidates_df = pd.DataFrame()
-        
-        if st.session_state.quiz_mode == "未回答":
-            if not remaining_df_for_quiz.empty: 
-                quiz_candidates_df = remaining_df_for_quiz.assign(temp_weight=1) 
-            
-        elif st.session_state.quiz_mode == "苦手":
-            struggled_answered = df_filtered[
-                (df_filtered["〇×結果"] != '') & 
-                (df_filtered["不正解回数"] > df_filtered["正解回数"])
-            ].copy()
-            if not struggled_answered.empty:
-                struggled_answered['temp_weight'] = struggled_answered['不正解回数'] + 5 
-                quiz_candidates_df = pd.concat([quiz_candidates_df, struggled_answered], ignore_index=True)
-
-            low_correct_count_answered = df_filtered[
-                (df_filtered['〇×結果'] != '') & 
-                (df_filtered["正解回数"] <= 3) 
-            ].copy()
-            if not low_correct_count_answered.empty:
-                # 既にstruggled_answeredに含まれている単語を除外
-                low_correct_count_answered = low_correct_count_answered[~low_correct_count_answered['単語'].isin(quiz_candidates_df['単語'])]
-                if not low_correct_count_answered.empty:
-                    low_correct_count_answered['temp_weight'] = low_correct_count_answered['正解回数'].apply(lambda x: 4 - x) 
-                    quiz_candidates_df = pd.concat([quiz_candidates_df, low_correct_count_answered], ignore_index=True)
-            
-
-        elif st.session_state.quiz_mode == "復習":
-            if not df_filtered.empty:
-                quiz_candidates_df = df_filtered.assign(temp_weight=1) 
-            
-        
-        if quiz_candidates_df.empty:
-            st.session_state.current_quiz = None
-            return
-
-        # 重複する単語を除外し、temp_weightでソート
-        quiz_candidates_df = quiz_candidates_df.sort_values(by='temp_weight', ascending=False).drop_duplicates(subset='単語', keep='first')
-
-        if quiz_candidates_df.empty: # 重複排除後も空になる可能性があるので再チェック
-            st.session_state.current_quiz = None
+        # セッションには出題に必要な項目と term_id・選択肢だけを持たせる
+        st.session_state.current_quiz = self._engine().next_question(
+            self._filters(), st.session_state.quiz_mode, st.session_state.quiz_direction
+        )
+        self._stage_snapshot()
+        quiz = st.session_state.current_quiz
+        self._record("question", term_id=quiz["term_id"] if quiz else None, term=quiz["単語"] if quiz else None)
+        if st.session_state.current_quiz is None:
             return
-
-        weights = quiz_candidates_df['temp_weight'].tolist()
-        
-        if not weights or all(w == 0 for w in weights): 
-            # 重みが全て0または空の場合、均等にサンプリング
-            selected_quiz_row = quiz_candidates_df.sample(n=1).iloc[0]
-        else:
-            selected_quiz_row = quiz_candidates_df.sample(n=1, weights=weights).iloc[0]
-
-        st.session_state.current_quiz = selected_quiz_row.to_dict()
-
-        correct_description = st.session_state.current_quiz["説明"]
-        all_descriptions = st.session_state.quiz_df["説明"].unique().tolist()
-        other_descriptions = [desc for desc in all_descriptions if desc != correct_description]
-        
-        num_wrong_choices = min(3, len(other_descriptions))
-        wrong_choices = random.sample(other_descriptions, num_wrong_choices)
-
-        choices = wrong_choices + [correct_description]
-        random.shuffle(choices)
-        st.session_state.current_quiz["choices"] = choices
         
         if st.session_state.debug_mode:
             st.session_state.debug_message_quiz_start = f"DEBUG: New quiz loaded: '{st.session_state.current_quiz['単語']}' (Mode: {st.session_state.quiz_mode})"
+            st.session_state.debug_message_answer_update = "" 
+            st.session_state.debug_message_error = ""
+            st.session_state.debug_message_answer_end = ""
         else:
-            st.session_state.debug_message_quiz_start = "" 
-        st.session_state.debug_message_answer_update = "" 
-        st.session_state.debug_message_error = ""
-        st.session_state.debug_message_answer_end = ""
+            # デバッグモードでなければ問題ごとのデバッグ文字列は残さない
+            for key in [k for k in st.session_state.keys() if str(k).startswith("debug_message_")]:
+                del st.session_state[key]
 
 
+    @PROCESS_ANSWER_SECONDS.time()
     def _process_answer(self):
         """ユーザーが「回答する」ボタンをクリックしたときに実行される処理。"""
         if st.session_state.current_quiz and st.session_state.selected_answer:
             st.session_state.latest_answered_quiz = st.session_state.current_quiz.copy() # 直前のクイズ情報を保持
 
-            correct_answer_description = st.session_state.latest_answered_quiz["説明"]
-            term = st.session_state.latest_answered_quiz["単語"]
-            
-            # DataFrameを直接変更するため、コピーではなく参照で操作
-            idx_list = st.session_state.quiz_df.index[st.session_state.quiz_df["単語"] == term].tolist()
-            if idx_list:
-                idx = idx_list[0]
-                
-                # DataFrameの更新
-                if st.session_state.selected_answer == correct_answer_description:
-                    st.session_state.quiz_df.loc[idx, '〇×結果'] = '〇'
-                    st.session_state.quiz_df.loc[idx, '正解回数'] += 1
-                    st.session_state.latest_result = "正解！🎉"
-                    st.session_state.correct += 1
-                else:
-                    st.session_state.quiz_df.loc[idx, '〇×結果'] = '×'
-                    st.session_state.quiz_df.loc[idx, '不正解回数'] += 1
-                    st.session_state.latest_result = "不正解…💧"
-                
-                st.session_state.quiz_df.loc[idx, '最終実施日時'] = datetime.now() # 実施日時を更新
+            quiz = st.session_state.latest_answered_quiz
+            shown_at = quiz.get("shown_at")
+            elapsed_ms = (time.monotonic() - shown_at) * 1000 if shown_at is not None else None # 問題表示から回答までの時間
 
-                st.session_state.total += 1
-                st.session_state.latest_correct_description = correct_answer_description
-                
+            # term_id（quiz_df のインデックス）で行を特定する。デッキ更新などで位置がずれていれば単語で探し直す
+            engine = self._engine()
+            result = engine.record_answer(
+                quiz.get("term_id"), st.session_state.selected_answer, term=quiz["単語"],
+                filters=self._filters(), elapsed_ms=elapsed_ms, direction=quiz.get("direction"),
+            )
+            self._record(
+                "answer", term_id=quiz.get("term_id"), term=quiz["単語"], choice=st.session_state.selected_answer,
+                elapsed_ms=elapsed_ms, correct=result.is_correct if result is not None else None,
+            )
+            if result is not None:
+                if st.session_state.learner_token is None:
+                    st.session_state.learner_token = os.urandom(8).hex()
+                get_difficulty_aggregator().submit(st.session_state.learner_token, result.term, result.is_correct)
+                st.session_state.latest_result = "正解！🎉" if result.is_correct else "不正解…💧"
+                st.session_state.latest_correct_answer = result.correct_answer
+                st.session_state.latest_recall = result.recall
+                quiz["elapsed_ms"] = result.elapsed_ms
                 st.session_state.quiz_state = "answered" # 回答済み状態へ遷移
+                st.session_state.progress_version += 1
+                self._stage_snapshot()
             else:
                 if st.session_state.debug_mode:
-                    st.session_state.debug_message_error = f"DEBUG: エラー: 単語 '{term}' がDataFrameに見つかりません。"
+                    st.session_state.debug_message_error = f"DEBUG: エラー: 単語 '{quiz['単語']}' がDataFrameに見つかりません。"
                 st.error("回答処理中にエラーが発生しました。")
         else: # selected_answerがない場合など
             if st.session_state.debug_mode:
@@ -458,8 +783,61 @@ class QuizApp:
         # Streamlitがこれを検知して再実行する。
 
 
+    def _stage_snapshot(self):
+        """サーバー再起動後に復元できるよう、このセッションの状態をスナップショットの書き込み待ちに登録します。
+        回答済みの単語の進捗と出題方向ごとの回答数をコピーして預けるだけで、エンコードと書き込みはストアのバックグラウンドスレッドが行います。
+        """
+        store = get_snapshot_store()
+        if store is None or st.session_state.snapshot_id is None or st.session_state.deck_version is None:
+            return # アップロードデータは復元できないので保存しない
+        ui_state = {key: st.session_state[key] for key in session_snapshot.UI_KEYS}
+        ui_state["scope_counters"] = [[list(scope), counts] for scope, counts in st.session_state.scope_counters.items()]
+        quiz = st.session_state.current_quiz
+        if quiz is not None and st.session_state.quiz_state == "question":
+            ui_state["current"] = {"term_id": quiz["term_id"], "単語": quiz["単語"], "direction": quiz.get("direction")}
+        store.stage(st.session_state.snapshot_id, st.session_state.quiz_df, ui_state, st.session_state.direction_progress)
+
+    def _restore_snapshot(self):
+        """URL の ?sid= に対応するスナップショットがあれば、進捗と画面状態を復元します。
+        sid がなければ新しく発行して URL に付け、再接続時に同じセッションとして扱えるようにします。
+        """
+        store = get_snapshot_store()
+        if store is None:
+            return
+        snapshot_id = st.query_params.get("sid")
+        if not session_snapshot.is_valid_session_id(snapshot_id):
+            st.session_state.snapshot_id = os.urandom(12).hex()
+            st.query_params["sid"] = st.session_state.snapshot_id
+            return
+        st.session_state.snapshot_id = snapshot_id
+        if st.session_state.deck_version is None or st.session_state.quiz_df is None:
+            return
+        snapshot = store.load(snapshot_id)
+        if snapshot is None:
+            return
+
+        restored = session_snapshot.apply_progress(st.session_state.quiz_df, snapshot)
+        # 方向ごとの回答数も、進捗と同じく今のデッキの term_id に付け替えて戻す
+        st.session_state.direction_progress = quiz_engine.DirectionProgress.from_arrays(
+            *session_snapshot.direction_arrays(st.session_state.quiz_df, snapshot)
+        )
+        st.session_state.progress_version += 1
+        ui_state = snapshot["ui"]
+        for key in session_snapshot.UI_KEYS:
+            if key in ui_state:
+                st.session_state[key] = ui_state[key]
+        st.session_state.scope_counters = {tuple(scope): counts for scope, counts in ui_state.get("scope_counters", [])}
+        current = ui_state.get("current")
+        if current is not None:
+            st.session_state.current_quiz = self._engine().question_for(
+                current["term_id"], current["単語"], current.get("direction") or quiz_engine.DEFAULT_DIRECTION
+            )
+            st.session_state.quiz_state = "question"
+        st.toast(f"前回の学習状態を復元しました（回答済み {restored} 語）")
+
     def _go_to_next_quiz(self):
         """「次へ」ボタンクリックで次のクイズをロードする処理。"""
+        self._record("next")
         st.session_state.current_quiz = None 
         st.session_state.latest_answered_quiz = None # 前回の回答表示をクリア
         st.session_state.selected_answer = None # 選択肢もクリア
@@ -469,10 +847,121 @@ class QuizApp:
         self.load_quiz() 
 
 
+    def _create_class(self):
+        """現在の絞り込み条件・モード・出題形式で問題の並びを一度だけ作り、クラスとして登録します（講師用）。"""
+        engine = self._engine()
+        engine.rng = random.Random() # 講師自身の出題の乱数は進めない
+        direction = st.session_state.quiz_direction
+        if direction in quiz_engine.TYPED_DIRECTIONS:
+            direction = "説明→単語" # クラスは選択肢の回答を集計するので、入力式は同じ列の選択式で出題する
+        questions = engine.question_set(
+            st.session_state.class_question_count, self._filters(), st.session_state.quiz_mode, direction
+        )
+        if not questions:
+            st.toast("現在の絞り込み条件では出題できる単語がありません。")
+            return
+        answer_column = quiz_engine.DIRECTIONS[direction][1]
+        for question in questions:
+            question["answer"] = question[answer_column]
+        filters = self._filters()
+        title = " / ".join(value for value in (filters.category, filters.field, filters.level) if value != quiz_engine.ALL)
+        session = get_classroom_registry().create(questions, title=title or "すべて", detail_deck_id=st.session_state.detail_deck_id)
+        st.session_state.class_hosting = session.code
+
+    def _close_class(self):
+        get_classroom_registry().close(st.session_state.class_hosting)
+        st.session_state.class_hosting = None
+
+    def _join_class(self, code: str):
+        """参加コードのクラスに受講者として参加します。"""
+        if st.session_state.learner_token is None:
+            st.session_state.learner_token = os.urandom(8).hex()
+        session = get_classroom_registry().join(code, st.session_state.learner_token)
+        if session is None:
+            st.toast(f"参加コード {code} のクラスが見つかりません。")
+            return
+        st.session_state.class_code = session.code
+        st.session_state.class_index = 0
+        st.session_state.class_answers = {}
+        st.query_params["class"] = session.code
+
+    def _leave_class(self):
+        st.session_state.class_code = None
+        st.query_params.pop("class", None)
+
+    def _submit_class_answer(self, index: int, choice: str):
+        is_correct = get_classroom_registry().submit(st.session_state.class_code, st.session_state.learner_token, index, choice)
+        if is_correct is not None:
+            st.session_state.class_answers[index] = (choice, is_correct)
+
+    def _next_class_question(self):
+        st.session_state.class_index += 1
+        st.session_state.pop("class_choice", None)
+
+    def display_class_participant(self):
+        """クラスの受講者用の画面。共有された問題を順に表示するだけで、デッキの読み込みや抽選は行いません。"""
+        session = get_classroom_registry().get(st.session_state.class_code)
+        if session is None:
+            st.error("クラスが見つかりません（講師がクラスを終了した可能性があります）。")
+            st.button("通常のクイズに戻る", on_click=self._leave_class)
+            return
+
+        st.header(f"🏫 クラス: {session.title}（{session.code}）")
+        total = len(session.questions)
+        index = st.session_state.class_index
+        if index >= total:
+            score = sum(is_correct for _, is_correct in st.session_state.class_answers.values())
+            st.success(f"お疲れさまでした！ {total} 問中 {score} 問正解です。")
+            st.button("クラスを抜ける", on_click=self._leave_class)
+            return
+
+        quiz = session.questions[index]
+        st.progress(index / total, text=f"{index + 1} / {total} 問")
+        prompt_label, choice_label = _DIRECTION_LABELS[quiz["direction"]]
+        st.markdown(f"### {prompt_label}: **{quiz['prompt']}**")
+        answer = st.session_state.class_answers.get(index)
+        choice = st.radio(
+            choice_label,
+            quiz["choices"],
+            index=quiz["choices"].index(answer[0]) if answer else None,
+            key="class_choice",
+            disabled=answer is not None,
+        )
+        if answer is None:
+            st.button("回答する", on_click=self._submit_class_answer, args=(index, choice), disabled=choice is None)
+            return
+
+        if answer[1]:
+            st.markdown("<div class='correct-answer-feedback'>正解！🎉</div>", unsafe_allow_html=True)
+        else:
+            st.markdown("<div class='incorrect-answer-feedback'>不正解…💧</div>", unsafe_allow_html=True)
+        st.info(f"正解は: **{session.answers[index]}**")
+        details_fn = lambda q: get_detail_store().get(session.detail_deck_id, q.get("term_id"))
+        st.markdown(get_panel_cache().get_or_render(session.detail_deck_id, dict(quiz), details_fn), unsafe_allow_html=True)
+        st.button("次へ", on_click=self._next_class_question)
+
+    def display_class_host(self):
+        """サイドバーのクラスモード（講師用の作成・集計と、受講者としての参加）。"""
+        with st.expander("🏫 クラスモード"):
+            if st.session_state.class_hosting is None:
+                st.number_input("問題数", min_value=1, max_value=100, value=20, key="class_question_count")
+                st.button(
+                    "現在の条件でクラスを作成",
+                    on_click=self._create_class,
+                    disabled=(st.session_state.quiz_df is None),
+                )
+            else:
+                st.success(f"参加コード: **{st.session_state.class_hosting}**")
+                st.caption("受講者は URL に ?class=参加コード を付けて開くか、下の欄に参加コードを入力します。")
+                _class_results(st.session_state.class_hosting)
+                st.button("クラスを終了", on_click=self._close_class)
+            code = st.text_input("参加コード", key="class_join_code").strip().upper()
+            st.button("クラスに参加", on_click=self._join_class, args=(code,), disabled=not code)
+
     def display_quiz(self, df_filtered: pd.DataFrame, remaining_df: pd.DataFrame):
         """クイズのUIを表示します。"""
         if st.session_state.debug_mode:
-            st.expander("デバッグ情報 (問題ロード)", expanded=False).write(st.session_state.debug_message_quiz_start)
+            st.expander("デバッグ情報 (問題ロード)", expanded=False).write(st.session_state.get("debug_message_quiz_start", ""))
 
         # アプリ起動時やフィルター変更後など、current_quizがまだ設定されていない場合に、最初の問題をロード
         # quiz_state が "question" のときのみロードを試みる
@@ -481,19 +970,30 @@ class QuizApp:
         
         # 問題が存在する場合のみUIを表示
         if st.session_state.current_quiz:
-            st.markdown(f"### 単語: **{st.session_state.current_quiz['単語']}**")
+            direction = st.session_state.current_quiz.get("direction", quiz_engine.DEFAULT_DIRECTION)
+            prompt_label, choice_label = _DIRECTION_LABELS[direction]
+            st.markdown(f"### {prompt_label}: **{st.session_state.current_quiz.get('prompt', st.session_state.current_quiz['単語'])}**")
             st.caption(f"カテゴリ: {st.session_state.current_quiz['カテゴリ']} / 分野: {st.session_state.current_quiz['分野']}")
+
+            if st.session_state.first_question_ms is None and st.session_state.session_started_at is not None:
+                st.session_state.first_question_ms = (time.perf_counter() - st.session_state.session_started_at) * 1000
+                get_startup_metrics().record_first_question(st.session_state.first_question_ms)
+                FIRST_QUESTION_SECONDS.observe(st.session_state.first_question_ms / 1000)
             
             # --- ステートごとの表示制御 ---
+            typed = direction in quiz_engine.TYPED_DIRECTIONS
             if st.session_state.quiz_state == "question":
-                # 問題表示中: ラジオボタンと「回答する」ボタンを表示
-                st.session_state.selected_answer = st.radio(
-                    "この単語の説明として正しいものはどれですか？",
-                    st.session_state.current_quiz["choices"],
-                    index=None, 
-                    key=f"quiz_choice_{st.session_state.quiz_choice_index}",
-                    disabled=False # 問題表示中は常に有効（選択されていないだけ）
-                )
+                # 問題表示中: ラジオボタン（入力式は入力欄）と「回答する」ボタンを表示
+                if typed:
+                    st.session_state.selected_answer = st.text_input(choice_label, key=self._quiz_choice_key()).strip() or None
+                else:
+                    st.session_state.selected_answer = st.radio(
+                        choice_label,
+                        st.session_state.current_quiz["choices"],
+                        index=None, 
+                        key=self._quiz_choice_key(),
+                        disabled=False # 問題表示中は常に有効（選択されていないだけ）
+                    )
                 
                 # 回答が選択されたら「回答する」ボタンを有効化
                 col1, col2 = st.columns(2)
@@ -510,13 +1010,16 @@ class QuizApp:
             elif st.session_state.quiz_state == "answered":
                 # 回答済み状態: ラジオボタンは無効化して表示、フィードバックと「次へ」ボタンを表示
                 # current_quiz の選択肢を表示し、selected_answer をデフォルトにする
-                st.radio(
-                    "この単語の説明として正しいものはどれですか？",
-                    st.session_state.current_quiz["choices"],
-                    index=st.session_state.current_quiz["choices"].index(st.session_state.selected_answer) if st.session_state.selected_answer in st.session_state.current_quiz["choices"] else None,
-                    key=f"quiz_choice_{st.session_state.quiz_choice_index}",
-                    disabled=True # 回答済みなので無効化
-                )
+                if typed:
+                    st.text_input(choice_label, key=self._quiz_choice_key(), disabled=True)
+                else:
+                    st.radio(
+                        choice_label,
+                        st.session_state.current_quiz["choices"],
+                        index=st.session_state.current_quiz["choices"].index(st.session_state.selected_answer) if st.session_state.selected_answer in st.session_state.current_quiz["choices"] else None,
+                        key=self._quiz_choice_key(),
+                        disabled=True # 回答済みなので無効化
+                    )
                 
                 # フィードバックと詳細情報の表示（latest_answered_quiz を使用）
                 if st.session_state.latest_answered_quiz: # latest_answered_quiz が存在することを確認
@@ -524,18 +1027,22 @@ class QuizApp:
                         st.markdown(f"<div class='correct-answer-feedback'>{st.session_state.latest_result}</div>", unsafe_allow_html=True)
                     else:
                         st.markdown(f"<div class='incorrect-answer-feedback'>{st.session_state.latest_result}</div>", unsafe_allow_html=True)
-                    st.info(f"正解は: **{st.session_state.latest_correct_description}**")
-                    
-                    description_html = f"""
-                    <div style="background-color: #f0f8ff; padding: 15px; border-left: 5px solid #2F80ED; margin-top: 15px; border-radius: 5px;">
-                        <p><strong>単語の説明:</strong> {st.session_state.latest_answered_quiz['説明']}</p>
-                        <p><strong>試験区分:</strong> {st.session_state.latest_answered_quiz.get('試験区分', 'N/A')}</p>
-                        <p><strong>午後記述での使用例:</strong> {st.session_state.latest_answered_quiz.get('午後記述での使用例', 'N/A')}</p>
-                        <p><strong>使用理由／文脈:</strong> {st.session_state.latest_answered_quiz.get('使用理由／文脈', 'N/A')}</p>
-                        <p><strong>シラバス改定有無:</strong> {st.session_state.latest_answered_quiz.get('シラバス改定有無', 'N/A')}</p>
-                        <p><strong>改定の意図・影響:</strong> {st.session_state.latest_answered_quiz.get('改定の意図・影響', 'N/A')}</p>
-                    </div>
-                    """
+                    st.info(f"正解は: **{st.session_state.latest_correct_answer}**")
+                    recall = st.session_state.latest_recall
+                    if recall is not None and not recall.exact:
+                        if recall.is_correct:
+                            st.caption(f"入力「{st.session_state.selected_answer}」は表記が少し違いますが正解にしました。")
+                        elif recall.other_term is not None:
+                            st.caption(f"入力は別の単語「{recall.other_term}」に近いようです。")
+                        if recall.suggestions:
+                            st.caption(f"入力に近い単語: {'、'.join(recall.suggestions)}")
+                    if st.session_state.latest_answered_quiz.get("elapsed_ms") is not None:
+                        st.caption(f"回答時間: {st.session_state.latest_answered_quiz['elapsed_ms'] / 1000:.1f} 秒")
+
+                    # 詳細パネルは単語ごとに一度だけ（エスケープして）描画し、再実行ではキャッシュ済みの HTML を使う
+                    description_html = get_panel_cache().get_or_render(
+                        st.session_state.detail_deck_id, st.session_state.latest_answered_quiz, self._term_details
+                    )
                     st.markdown(description_html, unsafe_allow_html=True)
 
                 col1, col2 = st.columns(2)
@@ -546,10 +1053,10 @@ class QuizApp:
                     st.button("次へ", on_click=self._go_to_next_quiz, disabled=False) # 回答後は常に有効
                 
                 if st.session_state.debug_mode:
-                    st.expander("デバッグ情報 (回答後)", expanded=False).write(st.session_state.debug_message_answer_update)
+                    st.expander("デバッグ情報 (回答後)", expanded=False).write(st.session_state.get("debug_message_answer_update", ""))
 
         else: # current_quiz が None の場合（問題がない場合）
-            current_df_filtered = QuizApp._apply_filters(st.session_state.quiz_df)
+            current_df_filtered = QuizApp._progress_view(QuizApp._apply_filters(st.session_state.quiz_df))
             current_remaining_df = current_df_filtered[current_df_filtered["〇×結果"] == '']
 
             if len(current_df_filtered) == 0:
@@ -557,13 +1064,14 @@ class QuizApp:
             elif st.session_state.quiz_mode == "未回答" and len(current_remaining_df) == 0:
                 st.info("おめでとうございます！選択されたフィルター条件で、すべての未回答単語をクリアしました。フィルターを変更するか、別のクイズモードを試してください。")
             elif st.session_state.quiz_mode == "苦手":
+                weak_incorrect, weak_correct = quiz_engine.weak_counts(current_df_filtered, st.session_state.answer_timings)
                 struggled_candidates = current_df_filtered[
                     (current_df_filtered["〇×結果"] != '') & 
-                    (current_df_filtered["不正解回数"] > current_df_filtered["正解回数"])
+                    (weak_incorrect > weak_correct)
                 ]
                 low_correct_candidates = current_df_filtered[
                     (current_df_filtered['〇×結果'] != '') & 
-                    (current_df_filtered["正解回数"] <= 3) 
+                    (weak_correct <= 3) 
                 ]
                 if struggled_candidates.empty and low_correct_candidates.empty:
                     st.info("「苦手」モードで出題すべき単語がありません。全ての苦手な単語を克服したようです！フィルターを変更するか、別のクイズモードを試してください。")
@@ -578,38 +1086,348 @@ class QuizApp:
                 st.expander("デバッグ情報 (問題なし)", expanded=False).write("DEBUG: current_quiz is None.")
 
 
+    def display_search(self):
+        """単語検索のUIを表示します。"""
+        if st.session_state.quiz_df is None or st.session_state.quiz_df.empty or st.session_state.search_index is None:
+            st.info("表示するデータがありません。")
+            return
+
+        query = st.text_input("単語・説明・使用例を検索", key="search_query", placeholder="例: 暗号, ハッシュ")
+        if not query.strip():
+            return
+
+        start_time = time.perf_counter()
+        results = st.session_state.search_index.search(query, limit=200)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+        if not results:
+            st.info("一致する単語が見つかりませんでした。")
+            return
+
+        st.caption(f"{len(results)} 件ヒット（{elapsed_ms:.1f} ms）")
+
+        score_by_term = dict(results)
+        df = st.session_state.quiz_df
+        hits_df = df[df["単語"].isin(score_by_term)].drop_duplicates(subset='単語', keep='first')
+        hits_df = hits_df.assign(スコア=hits_df["単語"].map(score_by_term)).sort_values(by='スコア', ascending=False)
+        st.dataframe(hits_df[["単語", "説明", "カテゴリ", "分野", "スコア"]], hide_index=True)
+
+        st.button(
+            "この検索結果で出題",
+            on_click=self._start_quiz_from_search,
+            args=([term for term, _ in results], query.strip())
+        )
+
+    def display_analytics(self):
+        """学習状況の分析UIを表示します。_process_answer で更新された集計値のみを使います。"""
+        stats = st.session_state.progress_stats
+        if stats is None or stats.total == 0:
+            st.info("まだ回答がありません。クイズに回答すると分析結果が表示されます。")
+            return
+
+        st.markdown(f"<div class='metric-container'><span class='metric-label'>正答率：</span><span class='metric-value'>{stats.correct / stats.total:.0%}</span></div>", unsafe_allow_html=True)
+        timings = st.session_state.answer_timings
+        mean_ms = timings.mean_ms() if timings is not None else None
+        if mean_ms is not None:
+            st.markdown(f"<div class='metric-container'><span class='metric-label'>平均回答時間：</span><span class='metric-value'>{mean_ms / 1000:.1f} 秒</span></div>", unsafe_allow_html=True)
+        direction_rows = st.session_state.direction_progress.summary() if st.session_state.direction_progress is not None else []
+        if len(direction_rows) > 1:
+            st.dataframe(
+                pd.DataFrame(
+                    [(direction, answered, f"{correct / answered:.0%}") for direction, answered, correct in direction_rows],
+                    columns=["出題形式", "回答数", "正答率"],
+                ),
+                hide_index=True,
+            )
+
+        dim = st.radio("集計軸", list(STAT_DIMENSIONS), horizontal=True, key="analytics_dimension")
+        rows = stats.accuracy_by(dim)
+        fig = go.Figure()
+        fig.add_bar(x=[r[0] or "(未設定)" for r in rows], y=[r[1] for r in rows], name="正解")
+        fig.add_bar(x=[r[0] or "(未設定)" for r in rows], y=[r[2] for r in rows], name="不正解")
+        fig.add_scatter(x=[r[0] or "(未設定)" for r in rows], y=[r[3] * 100 for r in rows], name="正答率(%)", yaxis="y2", mode="markers+lines")
+        fig.update_layout(
+            barmode="stack",
+            title=f"{dim}別の回答数と正答率",
+            yaxis=dict(title="回答数"),
+            yaxis2=dict(title="正答率(%)", overlaying="y", side="right", range=[0, 100]),
+            height=400,
+        )
+        st.plotly_chart(fig)
+
+        timeline = stats.downsampled_timeline()
+        fig = go.Figure()
+        fig.add_bar(x=[t[0] for t in timeline], y=[t[1] for t in timeline], name="正解")
+        fig.add_bar(x=[t[0] for t in timeline], y=[t[2] for t in timeline], name="不正解")
+        fig.update_layout(barmode="stack", title="回答数の推移", height=300)
+        st.plotly_chart(fig)
+
+        history = st.session_state.attempt_history
+        curve = history.learning_curve() if history is not None else pd.DataFrame()
+        if len(curve) > 1:
+            fig = go.Figure()
+            fig.add_bar(x=curve["回答回数"], y=curve["回答数"], name="回答数")
+            fig.add_scatter(x=curve["回答回数"], y=curve["正答率"] * 100, name="正答率(%)", yaxis="y2", mode="markers+lines")
+            fig.update_layout(
+                title="学習曲線（同じ単語の n 回目の回答の正答率）",
+                xaxis=dict(title="回答回数", dtick=1),
+                yaxis=dict(title="回答数"),
+                yaxis2=dict(title="正答率(%)", overlaying="y", side="right", range=[0, 100]),
+                height=300,
+            )
+            st.plotly_chart(fig)
+
+        st.subheader("苦手な単語")
+        weak_terms = stats.weak_terms()
+        if weak_terms:
+            weak_df = pd.DataFrame(weak_terms, columns=["単語", "正解回数", "不正解回数"])
+            if history is not None and len(history):
+                # 直近の正答率は全単語分をまとめて計算し、単語で引く
+                recent = history.recent_accuracy(window=5)
+                words = st.session_state.quiz_df["単語"].reindex(recent.index)
+                recent_by_word = recent.groupby(words.to_numpy()).mean()
+                weak_df["直近5回の正答率"] = weak_df["単語"].map(recent_by_word).map(lambda v: f"{v:.0%}" if pd.notna(v) else "-")
+            if timings is not None:
+                weak_df["平均回答時間(秒)"] = [
+                    round(ms / 1000, 1) if ms is not None else None for ms in map(timings.mean_ms, weak_df["単語"])
+                ]
+            st.dataframe(weak_df, hide_index=True)
+        else:
+            st.info("苦手な単語はありません。")
+
+    def _viewer_table(self):
+        """データビューア用の Arrow テーブルを返します。進捗が変わっていなければ前回のテーブルをそのまま返します。"""
+        key = (st.session_state.viewer_deck_key, st.session_state.progress_version)
+        cached = st.session_state.viewer_table
+        if cached is not None and cached[:2] == key:
+            return cached[2]
+        # 詳細列はセッションに持たないので、デッキの列を Arrow に変換するときだけ結合する
+        table = get_viewer_table_cache().viewer_table(
+            st.session_state.viewer_deck_key,
+            lambda: self._with_details(st.session_state.quiz_df),
+            st.session_state.quiz_df,
+            columns=st.session_state.deck_columns,
+        )
+        st.session_state.viewer_table = (*key, table)
+        return table
+
     def display_data_viewer(self):
         """データビューアのUIを表示します。"""
         if st.session_state.quiz_df is not None and not st.session_state.quiz_df.empty:
-            st.dataframe(st.session_state.quiz_df)
-            
-            # データのエクスポート
-            @st.cache_data
-            def convert_df_to_csv(df):
-                return df.to_csv(index=False).encode('utf-8')
+            table = self._viewer_table()
+            st.dataframe(table)
+
+            # データのエクスポート（CSV はダウンロードボタンを押したときに別スレッドで作る）
+            def convert_table_to_csv():
+                return table.to_pandas().to_csv(index=False).encode('utf-8')
 
-            csv_data = convert_df_to_csv(st.session_state.quiz_df)
-            
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             file_name = f"TANGO_{timestamp}.csv"
 
             st.download_button(
                 label="現在のデータをCSVでダウンロード",
-                data=csv_data,
+                data=convert_table_to_csv,
                 file_name=file_name,
                 mime="text/csv",
             )
         else:
             st.info("表示するデータがありません。")
 
+@st.cache_resource
+def get_deck_watcher() -> deck_watcher.DeckWatcher:
+    """全セッションで共有する tango.csv の監視オブジェクトを返します。初回ロードはバックグラウンドで始まります。"""
+    return deck_watcher.DeckWatcher("tango.csv", QuizApp()._process_df_types, preload=True, store=get_shared_deck_store())
+
+@st.cache_resource
+def get_shared_deck_store():
+    """複数のワーカープロセスでデッキを共有するストアを返します。
+    環境変数 TANGO_SHARED_DECK=0 で無効化、TANGO_SHARED_DECK_DIR で保存先を変更できます。
+    """
+    if os.environ.get("TANGO_SHARED_DECK", "1") == "0":
+        return None
+    try:
+        return shared_deck.SharedDeckStore(os.environ.get("TANGO_SHARED_DECK_DIR", shared_deck.DEFAULT_STORE_DIR))
+    except (ImportError, OSError) as e:
+        logging.getLogger(__name__).warning("shared deck store disabled: %s", e)
+        return None
+
+@st.cache_resource
+def get_detail_store() -> term_details.TermDetailStore:
+    """全セッションで共有する詳細列のストアを返します。保存先は環境変数 TANGO_TERM_DETAILS_DIR で変更できます。"""
+    return term_details.TermDetailStore(os.environ.get("TANGO_TERM_DETAILS_DIR", term_details.DEFAULT_STORE_DIR))
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def read_workbook_cached(data: bytes, kind: str):
+    """ブックを読み込みます。st.cache_data が内容のハッシュをキーにするので、同じブックは全セッションで一度だけ解析します。"""
+    return workbook_import.read_workbook(data, kind)
+
+@st.cache_resource
+def get_classroom_registry() -> ClassroomRegistry:
+    """全セッションで共有するクラスの登録と回答の集計を返します。"""
+    return ClassroomRegistry()
+
+@st.fragment(run_every=5)
+def _class_results(code: str):
+    """講師用のクラスの集計。5秒ごとにこの部分だけ再実行して最新の集計を表示します。"""
+    results = get_classroom_registry().results(code)
+    if not results:
+        return
+    st.write(f"参加者: {results['participants']} 人")
+    st.dataframe(
+        pd.DataFrame(
+            [
+                (q["number"], q["term"], q["answered"], f"{q['accuracy']:.0%}" if q["accuracy"] is not None else "-", q["top_choice"] or "")
+                for q in results["questions"]
+            ],
+            columns=["問題", "単語", "回答数", "正答率", "最も多い回答"],
+        ),
+        hide_index=True,
+    )
+
+@st.cache_resource
+def get_panel_cache() -> PanelCache:
+    """全セッションで共有する、描画済みの詳細パネルのキャッシュを返します。"""
+    return PanelCache()
+
+@st.cache_resource
+def get_viewer_table_cache() -> viewer_cache.ViewerTableCache:
+    """全セッションで共有する、データビューア用のデッキの Arrow テーブルのキャッシュを返します。"""
+    return viewer_cache.ViewerTableCache()
+
+@st.cache_resource(max_entries=8)
+def get_recall_index(deck_key, _terms) -> quiz_engine.RecallIndex:
+    """デッキのキーごとに、全セッションで共有する入力式の採点用の単語の索引を返します（回答時には作らない）。"""
+    return quiz_engine.RecallIndex(_terms)
+
+@st.cache_resource
+def get_session_recorder():
+    """操作の記録用のレコーダーを返します。環境変数 TANGO_RECORD_DIR を設定したときだけ有効です（それ以外は None）。"""
+    directory = os.environ.get("TANGO_RECORD_DIR")
+    return SessionRecorder(directory) if directory else None
+
+@st.cache_resource
+def get_startup_metrics() -> StartupMetrics:
+    """全セッションで共有する起動時間の計測値を返します。"""
+    return StartupMetrics()
+
+@st.cache_resource
+def get_difficulty_aggregator() -> difficulty_stats.DifficultyAggregator:
+    """全セッションの回答結果から単語の難易度を推定する集計オブジェクトを返します。"""
+    return difficulty_stats.DifficultyAggregator()
+
+@st.cache_resource
+def get_snapshot_store():
+    """セッションのスナップショットを保存するストアを返します。
+    環境変数 TANGO_SESSION_SNAPSHOTS=0 で無効化、TANGO_SESSION_SNAPSHOT_DIR で保存先を変更できます。
+    """
+    if os.environ.get("TANGO_SESSION_SNAPSHOTS", "1") == "0":
+        return None
+    try:
+        return session_snapshot.SnapshotStore(os.environ.get("TANGO_SESSION_SNAPSHOT_DIR", session_snapshot.DEFAULT_STORE_DIR))
+    except OSError as e:
+        logging.getLogger(__name__).warning("session snapshots disabled: %s", e)
+        return None
+
+@st.cache_resource
+def get_session_tracker() -> ActivityTracker:
+    """直近に実行のあったセッションを記録するトラッカーを返します。"""
+    return ActivityTracker()
+
+@st.cache_resource
+def start_metrics_export():
+    """メトリクスの出力を開始し、出力時に値を集めるゲージを登録します（プロセスごとに1回）。
+    環境変数 TANGO_METRICS_PORT で 127.0.0.1 の HTTP エンドポイント（/metrics）を、
+    TANGO_METRICS_FILE で定期的に書き出すファイル（{pid} はプロセスIDに置換）を有効にします。
+    """
+    logger = logging.getLogger(__name__)
+    REGISTRY.gauge("tango_active_sessions", "直近5分以内に実行のあったセッション数").set_function(get_session_tracker().count)
+
+    cache_requests = REGISTRY.counter("tango_cache_requests_total", "共有キャッシュの参照回数", ("cache", "result"))
+    detail_store = get_detail_store()
+    cache_requests.labels("term_details", "hit").set_function(lambda: detail_store.cache_hits)
+    cache_requests.labels("term_details", "miss").set_function(lambda: detail_store.cache_misses)
+    panel_cache = get_panel_cache()
+    cache_requests.labels("feedback_panel", "hit").set_function(lambda: panel_cache.cache_hits)
+    cache_requests.labels("feedback_panel", "miss").set_function(lambda: panel_cache.cache_misses)
+    viewer_tables = get_viewer_table_cache()
+    cache_requests.labels("viewer_table", "hit").set_function(lambda: viewer_tables.cache_hits)
+    cache_requests.labels("viewer_table", "miss").set_function(lambda: viewer_tables.cache_misses)
+
+    deck_memory = REGISTRY.gauge("tango_deck_memory_bytes", "共有デッキのメモリ使用量", ("kind",))
+    watcher = get_deck_watcher()
+    deck_memory.labels("dataframe").set_function(
+        lambda: 0 if watcher.deck is None else int(watcher.deck.memory_usage(deep=True).sum())
+    )
+    store = get_shared_deck_store()
+    if store is not None:
+        cache_requests.labels("shared_deck", "hit").set_function(lambda: store.cache_hits)
+        cache_requests.labels("shared_deck", "miss").set_function(lambda: store.cache_misses)
+        deck_memory.labels("mmap").set_function(lambda: store.mapped_bytes)
+    REGISTRY.gauge("tango_deck_version", "反映済みの tango.csv のバージョン").set_function(lambda: watcher.version)
+    aggregator = get_difficulty_aggregator()
+    REGISTRY.gauge("tango_difficulty_pending_answers", "難易度の集計待ちの回答数").set_function(aggregator.pending)
+    REGISTRY.gauge("tango_difficulty_rated_terms", "難易度を推定済みの単語数").set_function(lambda: len(aggregator.snapshot.weights))
+
+    port = os.environ.get("TANGO_METRICS_PORT")
+    if port:
+        try:
+            REGISTRY.start_http_server(int(port))
+        except (ValueError, OSError) as e:  # 複数ワーカーで同じポートを指定した場合など
+            logger.warning("metrics endpoint disabled: %s", e)
+    path = os.environ.get("TANGO_METRICS_FILE")
+    if path:
+        REGISTRY.start_file_exporter(path.replace("{pid}", str(os.getpid())),
+                                     float(os.environ.get("TANGO_METRICS_INTERVAL", "15")))
+    return REGISTRY
+
+def _wait_for_initial_deck(placeholder):
+    """バックグラウンドでの初期データのロードが終わるまで、進捗をプレースホルダーに表示して待ちます。"""
+    watcher = get_deck_watcher()
+    if watcher.loaded.is_set():
+        return
+    with placeholder.container():
+        progress_bar = st.progress(0.0, text="初期データを読み込み中…")
+        while not watcher.loaded.wait(0.1):
+            fraction, stage = watcher.load_progress
+            progress_bar.progress(fraction, text=f"初期データを読み込み中…（{stage}）")
+    placeholder.empty()
+
 # アプリケーションの実行
+@RERUN_SECONDS.time()
 def main():
     quiz_app = QuizApp()
+    RERUNS.inc()
+
+    # まず画面の骨組み（CSSと読み込み中表示の枠）を描画し、初回描画までの時間を記録する
+    inject_custom_css()
+    loading_placeholder = st.empty()
+    if st.session_state.session_started_at is None:
+        st.session_state.session_started_at = _SCRIPT_START
+        get_startup_metrics().record_first_paint((time.perf_counter() - _SCRIPT_START) * 1000)
+        st.session_state.metrics_session_id = os.urandom(8).hex()
+        SESSIONS_STARTED.inc()
+    get_session_tracker().touch(st.session_state.metrics_session_id)
+
+    # クラスの受講者は共有された問題を解くだけなので、デッキを読み込まずに専用の画面を表示する
+    if st.session_state.class_code is None and st.query_params.get("class"):
+        quiz_app._join_class(st.query_params["class"].strip().upper())
+    if st.session_state.class_code is not None:
+        quiz_app.display_class_participant()
+        return
 
     # アプリケーションの初期ロード時に初期データをロード
     if st.session_state.quiz_df is None and st.session_state.force_initial_load:
+        _wait_for_initial_deck(loading_placeholder)
         quiz_app._load_initial_data()
         st.session_state.force_initial_load = False 
+    else:
+        quiz_app._sync_with_deck_watcher()
+    start_metrics_export() # pandas などを読み込むので初回描画の後に行う
+
+    # 再接続したセッションは、サイドバーのウィジェットを作る前に前回の状態を復元する
+    if not st.session_state.snapshot_checked:
+        st.session_state.snapshot_checked = True
+        quiz_app._restore_snapshot()
 
     # サイドバーのデータソース選択
     st.sidebar.header("📚 データソース")
@@ -639,12 +1457,28 @@ def main():
     )
 
     uploaded_file = st.sidebar.file_uploader(
-        "CSVファイルをアップロード", 
-        type=["csv"], 
+        "CSV・Excelファイルをアップロード", 
+        type=["csv", "xlsx", "ods"], 
         key="uploader", 
         label_visibility="hidden",
         disabled=(st.session_state.data_source_selection == "初期データ")
     )
+    st.sidebar.checkbox(
+        "エクスポートしたCSVの進捗を引き継ぐ（再開）",
+        key="resume_import",
+        disabled=(st.session_state.data_source_selection == "初期データ")
+    )
+
+    with st.sidebar.expander("📥 進捗ファイルをマージ"):
+        progress_file = st.file_uploader("進捗CSVをアップロード", type=["csv"], key="progress_uploader")
+        merge_rules = progress_import.MERGE_RULES
+        st.selectbox("競合時のルール", list(merge_rules), format_func=merge_rules.get, key="merge_rule")
+        st.button(
+            "現在のデッキにマージ",
+            on_click=quiz_app._merge_progress_file,
+            args=(progress_file,),
+            disabled=(progress_file is None or st.session_state.quiz_df is None)
+        )
     
     # ファイルアップロードのハンドリング
     if uploaded_file is not None:
@@ -655,7 +1489,10 @@ def main():
         elif st.session_state.data_source_selection == "アップロード" and st.session_state.uploaded_df_temp is None:
             # アップロードモードなのにtempデータがない場合（例：アプリ再起動後）
             quiz_app.handle_upload_logic(uploaded_file)
+        if st.session_state.upload_report is not None:
+            quiz_app.display_upload_report(st.session_state.upload_report)
     else:
+        st.session_state.upload_report = None
         # アップロードファイルがクリアされた、または選択されていない場合
         if st.session_state.data_source_selection == "アップロード" and st.session_state.uploaded_df_temp is not None:
             st.session_state.uploaded_df_temp = None
@@ -666,35 +1503,53 @@ def main():
 
 
     # タブの作成
-    tab1, tab2 = st.tabs(["クイズ", "データビューア"])
+    tab1, tab2, tab3, tab4 = st.tabs(["クイズ", "検索", "分析", "データビューア"])
 
     # --- サイドバーに表示するフィルターと件数の計算を、sidebarコンテキスト内で実行 ---
     with st.sidebar:
         st.header("🎯 クイズモード")
-        quiz_modes = ["未回答", "苦手", "復習"]
+        quiz_modes = list(quiz_engine.QUIZ_MODES)
         st.session_state.quiz_mode = st.radio(
             "",
             quiz_modes, 
             index=quiz_modes.index(st.session_state.quiz_mode) if st.session_state.quiz_mode in quiz_modes else 0,
             key="quiz_mode_radio",
             label_visibility="hidden",
-            on_change=quiz_app._reset_quiz_state_only 
+            on_change=quiz_app._on_filter_change 
         )
 
+        directions = st.session_state.choice_pools.directions() if st.session_state.choice_pools is not None else [quiz_engine.DEFAULT_DIRECTION]
+        if len(directions) > 1:
+            st.header("出題形式")
+            st.session_state.quiz_direction = st.radio(
+                "出題形式",
+                directions,
+                index=directions.index(st.session_state.quiz_direction) if st.session_state.quiz_direction in directions else 0,
+                key="quiz_direction_radio",
+                label_visibility="hidden",
+                on_change=quiz_app._on_filter_change
+            )
+        else:
+            st.session_state.quiz_direction = directions[0]
+
         st.header("クイズの絞り込み") 
+
+        if st.session_state.search_terms_filter is not None:
+            st.info(f"検索結果の {len(st.session_state.search_terms_filter)} 語に絞り込み中")
+            st.button("検索による絞り込みを解除", on_click=quiz_app._clear_search_filter)
         
         df_filtered = pd.DataFrame()
         remaining_df = pd.DataFrame()
 
         if st.session_state.quiz_df is not None and not st.session_state.quiz_df.empty:
-            df_base_for_filters = st.session_state.quiz_df.copy() 
+            df_base_for_filters = st.session_state.quiz_df # 選択肢の作成にのみ使うのでコピーしない
 
             categories = ["すべて"] + df_base_for_filters["カテゴリ"].dropna().unique().tolist()
             st.session_state.filter_category = st.selectbox(
                 "カテゴリで絞り込み", categories, 
                 index=categories.index(st.session_state.filter_category) if st.session_state.filter_category in categories else 0,
                 key="filter_category_selectbox",
-                on_change=quiz_app._reset_quiz_state_only 
+                on_change=quiz_app._on_filter_change 
             )
 
             fields = ["すべて"] + df_base_for_filters["分野"].dropna().unique().tolist()
@@ -702,7 +1557,7 @@ def main():
                 "分野で絞り込み", fields, 
                 index=fields.index(st.session_state.filter_field) if st.session_state.filter_field in fields else 0,
                 key="filter_field_selectbox",
-                on_change=quiz_app._reset_quiz_state_only 
+                on_change=quiz_app._on_filter_change 
             )
 
             # シラバス改定有無のオプションを動的に取得し、空文字列を削除
@@ -714,11 +1569,13 @@ def main():
                 syllabus_change_options, 
                 index=syllabus_change_options.index(st.session_state.filter_level) if st.session_state.filter_level in syllabus_change_options else 0,
                 key="filter_level_selectbox",
-                on_change=quiz_app._reset_quiz_state_only 
+                on_change=quiz_app._on_filter_change 
             )
 
+            quiz_app._record_state_change()
             df_filtered = QuizApp._apply_filters(st.session_state.quiz_df) 
-            remaining_df = df_filtered[df_filtered["〇×結果"] == '']
+            progress_df = QuizApp._progress_view(df_filtered)
+            remaining_df = progress_df[progress_df["〇×結果"] == '']
         else:
             st.info("データがロードされていません。") 
         
@@ -727,10 +1584,16 @@ def main():
         
         filtered_count = len(df_filtered)
 
-        st.markdown(f"<div class='metric-container'><span class='metric-label'>正解：</span><span class='metric-value'>{st.session_state.correct}</span></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='metric-container'><span class='metric-label'>回答：</span><span class='metric-value'>{st.session_state.total}</span></div>", unsafe_allow_html=True)
+        scope_total, scope_correct = QuizApp._scope_counters()
+        st.markdown(f"<div class='metric-container'><span class='metric-label'>正解：</span><span class='metric-value'>{scope_correct}</span></div>", unsafe_allow_html=True)
+        st.markdown(f"<div class='metric-container'><span class='metric-label'>回答：</span><span class='metric-value'>{scope_total}</span></div>", unsafe_allow_html=True)
         st.markdown(f"<div class='metric-container'><span class='metric-label'>未回答：</span><span class='metric-value'>{len(remaining_df)}</span></div>", unsafe_allow_html=True)
         st.markdown(f"<div class='metric-container'><span class='metric-label'>対象：</span><span class='metric-value'>{filtered_count}</span></div>", unsafe_allow_html=True)
+        # 絞り込みの変更では進捗は消えないので、最初からやり直したい場合はこのボタンで全件リセットする
+        st.button("学習進捗をリセット", on_click=quiz_app._reset_quiz_state_only, disabled=(st.session_state.quiz_df is None))
+
+        st.markdown("---")
+        quiz_app.display_class_host()
 
         st.markdown("---")
         st.subheader("開発者ツール")
@@ -739,12 +1602,41 @@ def main():
             value=st.session_state.debug_mode, 
             key="debug_mode_checkbox"
         )
+        if st.session_state.debug_mode:
+            with st.expander("起動パフォーマンス", expanded=False):
+                summary = get_startup_metrics().summary()
+                if summary["cold_first_paint_ms"] is not None:
+                    st.write(f"コールドスタート時の初回描画: {summary['cold_first_paint_ms']:.0f} ms")
+                for label, key in (("初回描画", "first_paint_ms"), ("最初の問題表示", "first_question_ms")):
+                    count, p50, p95 = summary[key]
+                    st.write(f"{label}: p50 {p50:.0f} ms / p95 {p95:.0f} ms（{count} セッション）")
+                if st.session_state.first_question_ms is not None:
+                    st.write(f"このセッションの最初の問題表示: {st.session_state.first_question_ms:.0f} ms")
+            with st.expander("セッション状態", expanded=False):
+                report = session_lifecycle.session_state_report(st.session_state)
+                total_bytes = sum(size for _, size, _ in report)
+                st.write(f"{len(report)} 件 / 約 {total_bytes / 1024:.0f} KB")
+                st.dataframe(
+                    pd.DataFrame(
+                        [(key, round(size / 1024, 1), "以上" if truncated else "") for key, size, truncated in report],
+                        columns=["キー", "KB", "見積もり"]
+                    ),
+                    hide_index=True
+                )
     
     with tab1:
         st.header("情報処理試験対策クイズ")
         quiz_app.display_quiz(df_filtered, remaining_df)
 
     with tab2:
+        st.header("単語検索")
+        quiz_app.display_search()
+
+    with tab3:
+        st.header("学習状況の分析")
+        quiz_app.display_analytics()
+
+    with tab4:
         st.header("登録データ一覧")
         quiz_app.display_data_viewer()
 
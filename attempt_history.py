@@ -0,0 +1,116 @@
+"""単語ごとの直近の回答履歴（正誤の順序と回答日時）を固定長で保持するモジュール。
+
+正解回数・不正解回数の集計値では分からない「どの順に正解・不正解したか」を、単語ごとに
+直近 depth 回分だけ保持します。正誤は1語あたり1つの uint32 のビット列（最下位ビットが最新の回答、1=正解）、
+回答日時は (単語数, depth) の配列をリングバッファとして使います。回答の追加は O(1) で、
+直近の正答率や学習曲線は全単語分をまとめて NumPy で計算します。
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# 1語あたりに保持する回答数（ビット列に収まるよう 32 以下）
+DEFAULT_DEPTH = 16
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """各要素の立っているビットの数を返します。"""
+    if hasattr(np, "bitwise_count"):  # NumPy 2.0 以降
+        return np.bitwise_count(values)
+    as_bytes = values.astype('<u4').view(np.uint8).reshape(-1, 4)
+    return np.unpackbits(as_bytes, axis=1).sum(axis=1)
+
+
+class AttemptHistory:
+    """term_id ごとの直近 depth 回の正誤と回答日時。"""
+
+    def __init__(self, depth: int = DEFAULT_DEPTH, capacity: int = 256):
+        if not 1 <= depth <= 32:
+            raise ValueError("depth must be between 1 and 32")
+        self.depth = depth
+        self._mask = (1 << depth) - 1
+        self._rows = {}  # term_id -> 行番号
+        self.term_ids = np.zeros(capacity, dtype=np.int64)
+        self.outcomes = np.zeros(capacity, dtype=np.uint32)  # 直近の正誤のビット列
+        self.counts = np.zeros(capacity, dtype=np.int64)  # これまでの回答数（depth を超えても数え続ける）
+        self.times = np.full((capacity, depth), np.datetime64('NaT', 'ms'))  # 回答日時（列 counts % depth が次の書き込み先）
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _row(self, term_id: int) -> int:
+        row = self._rows.get(term_id)
+        if row is None:
+            row = len(self._rows)
+            if row == len(self.term_ids):
+                self._grow(2 * row)
+            self._rows[term_id] = row
+            self.term_ids[row] = term_id
+        return row
+
+    def _grow(self, capacity: int):
+        extra = capacity - len(self.term_ids)
+        self.term_ids = np.concatenate([self.term_ids, np.zeros(extra, dtype=np.int64)])
+        self.outcomes = np.concatenate([self.outcomes, np.zeros(extra, dtype=np.uint32)])
+        self.counts = np.concatenate([self.counts, np.zeros(extra, dtype=np.int64)])
+        self.times = np.concatenate([self.times, np.full((extra, self.depth), np.datetime64('NaT', 'ms'))])
+
+    def append(self, term_id: int, is_correct: bool, answered_at: datetime):
+        """回答を1件追加します（O(1)）。"""
+        row = self._row(int(term_id))
+        self.outcomes[row] = ((int(self.outcomes[row]) << 1) | bool(is_correct)) & self._mask
+        self.times[row, self.counts[row] % self.depth] = np.datetime64(answered_at, 'ms')
+        self.counts[row] += 1
+
+    def attempts(self, term_id: int) -> list:
+        """1語分の保持している回答を古い順に [(回答日時, 正解かどうか), ...] で返します。"""
+        row = self._rows.get(int(term_id))
+        if row is None:
+            return []
+        count = int(self.counts[row])
+        stored = min(count, self.depth)
+        bits = int(self.outcomes[row])
+        return [
+            (self.times[row, (count - 1 - back) % self.depth].astype(datetime), bool(bits >> back & 1))
+            for back in range(stored - 1, -1, -1)
+        ]
+
+    def recent_accuracy(self, window: int = None) -> pd.Series:
+        """回答のある全単語について、直近 window 回（省略時は depth 回）の正答率を term_id をインデックスにして返します。"""
+        n = len(self._rows)
+        window = min(window or self.depth, self.depth)
+        stored = np.minimum(self.counts[:n], window)
+        masks = ((np.uint64(1) << stored.astype(np.uint64)) - np.uint64(1)).astype(np.uint32)
+        correct = _popcount(self.outcomes[:n] & masks)
+        return pd.Series(correct / stored, index=self.term_ids[:n], name="recent_accuracy")
+
+    def learning_curve(self) -> pd.DataFrame:
+        """n 回目の回答ごとの回答数と正答率を返します（保持している直近 depth 回分の回答から計算します）。"""
+        n = len(self._rows)
+        counts, outcomes = self.counts[:n], self.outcomes[:n]
+        backs = np.arange(self.depth)
+        valid = backs[None, :] < np.minimum(counts, self.depth)[:, None]  # (単語, 何回前の回答か)
+        attempt_numbers = (counts[:, None] - backs[None, :])[valid]
+        correct = ((outcomes[:, None] >> backs[None, :].astype(np.uint32)) & 1)[valid]
+        if len(attempt_numbers) == 0:
+            return pd.DataFrame(columns=["回答回数", "回答数", "正答率"])
+        answered = np.bincount(attempt_numbers)
+        correct_by_attempt = np.bincount(attempt_numbers, weights=correct)
+        numbers = np.flatnonzero(answered)
+        return pd.DataFrame({
+            "回答回数": numbers,
+            "回答数": answered[numbers],
+            "正答率": correct_by_attempt[numbers] / answered[numbers],
+        })
+
+    def remap(self, new_ids: dict):
+        """デッキの更新で term_id が変わったときに、{旧 term_id: 新 term_id} で付け替えます。対応のない単語の履歴は捨てます。"""
+        kept = [(row, new_ids[term_id]) for term_id, row in self._rows.items() if term_id in new_ids]
+        rows = np.array([row for row, _ in kept], dtype=np.int64)
+        size = max(len(rows), 1)
+        self.term_ids = np.concatenate([np.array([new_id for _, new_id in kept], dtype=np.int64), np.zeros(size - len(rows), dtype=np.int64)])
+        self.outcomes = np.concatenate([self.outcomes[rows], np.zeros(size - len(rows), dtype=np.uint32)])
+        self.counts = np.concatenate([self.counts[rows], np.zeros(size - len(rows), dtype=np.int64)])
+        self.times = np.concatenate([self.times[rows], np.full((size - len(rows), self.depth), np.datetime64('NaT', 'ms'))])
+        self._rows = {int(new_id): i for i, (_, new_id) in enumerate(kept)}
@@ -0,0 +1,136 @@
+"""授業で使うクラスモード。
+
+講師のセッションが出題条件（デッキ・絞り込み・モード・出題形式）から問題の並びと選択肢を一度だけ作り、
+変更不可のクラスとして登録します。受講者は参加コードでクラスに入り、共有された問題を順に解くだけなので、
+受講者側ではデッキの読み込みも出題の抽選も行いません。回答はプロセス内の集計器で問題ごと・受講者ごとに数え、
+講師はその集計をいつでも読み出せます。
+"""
+import secrets
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+# 参加コードに使う文字（読み間違えやすい文字を除く）
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+CODE_LENGTH = 6
+# この時間を過ぎたクラスは破棄する
+CLASS_TTL_SECONDS = 6 * 3600
+
+
+@dataclass(frozen=True)
+class ClassSession:
+    """講師が作成したクラス。作成後は変更されないので、全受講者がロックなしで読めます。"""
+    code: str
+    questions: tuple  # 問題（読み取り専用の dict）のタプル
+    answers: tuple  # 問題ごとの正解の選択肢
+    title: str = ""
+    detail_deck_id: str = None  # 回答後に表示する詳細列の TermDetailStore 上のID
+    created_at: float = field(default_factory=time.time)
+
+
+class _ClassResults:
+    """1クラス分の回答の集計値。"""
+
+    def __init__(self, question_count: int):
+        self.answered = [0] * question_count
+        self.correct = [0] * question_count
+        self.choices = [Counter() for _ in range(question_count)]
+        self.students = {}  # 受講者トークン -> {問題番号: 正解かどうか}
+
+
+class ClassroomRegistry:
+    """クラスの登録と回答の集計（全セッションで共有）。"""
+
+    def __init__(self, ttl: float = CLASS_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._classes = {}  # 参加コード -> ClassSession
+        self._results = {}  # 参加コード -> _ClassResults
+
+    def create(self, questions: list, title: str = "", detail_deck_id: str = None) -> ClassSession:
+        """QuizEngine で作った問題のリストからクラスを作り、参加コード付きで登録します。"""
+        shared = tuple(
+            MappingProxyType({key: value for key, value in question.items() if key not in ("shown_at", "answer")})
+            for question in questions
+        )
+        answers = tuple(question["answer"] for question in questions)
+        with self._lock:
+            self._prune()
+            code = self._new_code()
+            session = ClassSession(code, shared, answers, title, detail_deck_id)
+            self._classes[code] = session
+            self._results[code] = _ClassResults(len(shared))
+        return session
+
+    def _new_code(self) -> str:
+        while True:
+            code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+            if code not in self._classes:
+                return code
+
+    def get(self, code: str):
+        """参加コードのクラスを返します。なければ None を返します。"""
+        if not code:
+            return None
+        return self._classes.get(code.strip().upper())
+
+    def join(self, code: str, student: str):
+        """受講者をクラスの参加者として登録し、クラスを返します。クラスがなければ None を返します。"""
+        session = self.get(code)
+        if session is not None:
+            with self._lock:
+                self._results[session.code].students.setdefault(student, {})
+        return session
+
+    def submit(self, code: str, student: str, index: int, choice: str):
+        """受講者の回答を記録し、正解かどうかを返します。同じ問題への2回目以降の回答は集計しません。"""
+        session = self.get(code)
+        if session is None or not 0 <= index < len(session.questions):
+            return None
+        is_correct = choice == session.answers[index]
+        with self._lock:
+            results = self._results[session.code]
+            answered = results.students.setdefault(student, {})
+            if index not in answered:
+                answered[index] = is_correct
+                results.answered[index] += 1
+                results.correct[index] += is_correct
+                results.choices[index][choice] += 1
+        return is_correct
+
+    def results(self, code: str) -> dict:
+        """クラスの集計（参加者数・問題ごとの回答数と正答率・受講者ごとの得点）を返します。"""
+        session = self.get(code)
+        if session is None:
+            return {}
+        with self._lock:
+            results = self._results[session.code]
+            return {
+                "participants": len(results.students),
+                "questions": [
+                    {
+                        "number": i + 1,
+                        "term": question["単語"],
+                        "answered": results.answered[i],
+                        "correct": results.correct[i],
+                        "accuracy": results.correct[i] / results.answered[i] if results.answered[i] else None,
+                        "top_choice": results.choices[i].most_common(1)[0][0] if results.choices[i] else None,
+                    }
+                    for i, question in enumerate(session.questions)
+                ],
+                "scores": sorted((sum(answered.values()) for answered in results.students.values()), reverse=True),
+            }
+
+    def close(self, code: str):
+        with self._lock:
+            self._classes.pop(code, None)
+            self._results.pop(code, None)
+
+    def _prune(self):
+        limit = time.time() - self.ttl
+        for code in [code for code, session in self._classes.items() if session.created_at < limit]:
+            del self._classes[code]
+            del self._results[code]
+
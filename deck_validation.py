@@ -0,0 +1,349 @@
+"""単語CSV（デッキ）の検証。
+
+アプリで読み込んだときに初めて分かる問題（必須カラムの欠落・単語の重複・同じ説明の重複・
+解釈できない日時や回数）を、読み込み前にまとめて報告します。CSVはチャンク単位で読み、
+各チェックは列単位のベクトル演算で行うので、100万行規模のデッキでも数秒で終わります。
+
+コマンドラインからも実行できます::
+
+    python deck_validation.py tango.csv [他のCSV ...]
+
+エラーがあれば終了コード 1 を返します。
+"""
+import argparse
+import sys
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow がなければ pandas のチャンク読み込みを使う
+    pa_csv = None
+
+# アプリで出題するために必須のカラム
+REQUIRED_COLUMNS = ['単語', '説明', 'カテゴリ', '分野']
+# 読み込み時に日時へ変換するカラム（変換できない値は NaT になる）
+DATE_COLUMNS = ['最終実施日時', '次回実施予定日時']
+# 読み込み時に整数へ変換するカラム（変換できない値は 0 になる）
+COUNT_COLUMNS = ['正解回数', '不正解回数']
+# 選択肢の数（正解1つ＋誤答3つ）
+CHOICE_COUNT = 4
+# 読み込み時のカラムの型と、カラムがない場合の既定値
+COLUMN_TYPES = {
+    '単語': {'type': str, 'default': ''},
+    '説明': {'type': str, 'default': ''},
+    'カテゴリ': {'type': str, 'default': ''},
+    '分野': {'type': str, 'default': ''},
+    '正解回数': {'type': int, 'default': 0, 'numeric_coerce': True},
+    '不正解回数': {'type': int, 'default': 0, 'numeric_coerce': True},
+    '最終実施日時': {'type': 'datetime', 'default': pd.NaT},
+    '次回実施予定日時': {'type': 'datetime', 'default': pd.NaT},
+    'シラバス改定有無': {'type': str, 'default': '', 'replace_nan': True},
+    '午後記述での使用例': {'type': str, 'default': ''},
+    '使用理由／文脈': {'type': str, 'default': ''},
+    '試験区分': {'type': str, 'default': ''},
+    '出題確率（推定）': {'type': str, 'default': ''},
+    '改定の意図・影響': {'type': str, 'default': ''},
+    '〇×結果': {'type': str, 'default': '', 'replace_nan': True},
+}
+
+_CHECKED_COLUMNS = ['単語', '説明'] + DATE_COLUMNS + COUNT_COLUMNS
+
+
+@dataclass
+class ValidationIssue:
+    """検証で見つかった1種類の問題。line は CSV の行番号（ヘッダーが1行目、セル内改行がない場合）です。"""
+    level: str  # "error" または "warning"
+    code: str
+    message: str
+    count: int = 0
+    examples: list = field(default_factory=list)  # [(値, [行番号, ...]), ...]
+
+    def format(self) -> str:
+        lines = [f"[{self.level}] {self.code}: {self.message}"]
+        for value, rows in self.examples:
+            lines.append(f"    {value!r}: {', '.join(str(r) for r in rows)} 行目")
+        return "\n".join(lines)
+
+
+@dataclass
+class ValidationReport:
+    row_count: int = 0
+    issues: list = field(default_factory=list)
+
+    @property
+    def errors(self) -> list:
+        return [issue for issue in self.issues if issue.level == "error"]
+
+    @property
+    def warnings(self) -> list:
+        return [issue for issue in self.issues if issue.level == "warning"]
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def format(self) -> str:
+        if not self.issues:
+            return f"{self.row_count} 行: 問題は見つかりませんでした。"
+        header = f"{self.row_count} 行: エラー {len(self.errors)} 件 / 警告 {len(self.warnings)} 件"
+        return "\n".join([header] + [issue.format() for issue in self.issues])
+
+
+def apply_column_types(df: pd.DataFrame) -> pd.DataFrame:
+    """COLUMN_TYPES に従って型を変換し、存在しないカラムを既定値で追加した DataFrame を返します。"""
+    df_processed = df.copy()
+    for col_name, config in COLUMN_TYPES.items():
+        if col_name not in df_processed.columns:
+            df_processed[col_name] = config['default']
+        else:
+            if config.get('replace_nan'):
+                # pandas 3 の astype(str) は欠損値を 'nan' にしないので、先に空文字で埋める
+                df_processed[col_name] = df_processed[col_name].fillna('').astype(str).replace('nan', '')
+            if config.get('numeric_coerce'):
+                df_processed[col_name] = pd.to_numeric(df_processed[col_name], errors='coerce').fillna(config['default']).astype(int)
+            if config['type'] == 'datetime':
+                df_processed[col_name] = pd.to_datetime(df_processed[col_name], errors='coerce')
+            elif config['type'] == str and not config.get('replace_nan'):
+                df_processed[col_name] = df_processed[col_name].fillna(config['default']).astype(str)
+    return df_processed
+
+
+def missing_required_columns(columns) -> list:
+    """必須カラムのうち columns に含まれないものを返します。"""
+    return [col for col in REQUIRED_COLUMNS if col not in columns]
+
+
+def _line_numbers(rows: np.ndarray) -> np.ndarray:
+    return rows + 2  # 0始まりのデータ行 -> ヘッダーを1行目とした行番号
+
+
+class _DuplicateTracker:
+    """チャンクをまたいで値の重複を数えます。
+
+    値そのものではなく 64bit ハッシュ（ソート済み配列）と出現回数・最初の行だけを保持し、
+    重複した値の文字列は報告用の例として max_examples 件までしか残しません。
+    """
+
+    def __init__(self, max_examples: int, max_rows_per_example: int = 5):
+        self.max_examples = max_examples
+        self.max_rows_per_example = max_rows_per_example
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.first_rows = np.empty(0, dtype=np.int64)
+        self.examples = {}  # ハッシュ -> [値, [行, ...]]
+
+    def add(self, values: np.ndarray, rows: np.ndarray):
+        if len(values) == 0:
+            return
+        hashes = pd.util.hash_array(values)
+
+        # 以前のチャンクに出現済みか、このチャンク内で重複している行だけを Python で処理する
+        if len(self.hashes):
+            pos = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+            seen_before = self.hashes[pos] == hashes
+        else:
+            pos = np.zeros(len(hashes), dtype=np.int64)
+            seen_before = np.zeros(len(hashes), dtype=bool)
+        duplicated = np.flatnonzero(seen_before | pd.Series(hashes).duplicated(keep=False).to_numpy())
+        if len(duplicated):
+            # 例として残す値（既存の例＋空きがあれば新しい値）の先頭数行だけを Python で処理する
+            frame = pd.DataFrame({"hash": hashes[duplicated], "i": duplicated})
+            known = frame["hash"].isin(list(self.examples))
+            new = frame.loc[~known, "hash"].drop_duplicates().head(self.max_examples - len(self.examples))
+            frame = frame[known | frame["hash"].isin(new)].groupby("hash", sort=False).head(self.max_rows_per_example)
+            for h, i in zip(frame["hash"].to_numpy(), frame["i"].to_numpy()):
+                entry = self.examples.get(h)
+                if entry is None:
+                    entry = self.examples[h] = [values[i], []]
+                    if seen_before[i]:
+                        entry[1].append(int(self.first_rows[pos[i]]))
+                if len(entry[1]) < self.max_rows_per_example:
+                    entry[1].append(int(rows[i]))
+
+        chunk_hashes, first_index, chunk_counts = np.unique(hashes, return_index=True, return_counts=True)
+        merged, first, inverse = np.unique(
+            np.concatenate([self.hashes, chunk_hashes]), return_index=True, return_inverse=True
+        )
+        counts = np.bincount(inverse.ravel(), weights=np.concatenate([self.counts, chunk_counts]),
+                             minlength=len(merged)).astype(np.int64)
+        # concatenate で既存の値を先に並べているので、return_index は最初に出現した行を指す
+        self.first_rows = np.concatenate([self.first_rows, rows[first_index]])[first]
+        self.hashes, self.counts = merged, counts
+
+    def issue(self, level: str, code: str, message: str):
+        duplicated = self.counts > 1
+        value_count = int(duplicated.sum())
+        if value_count == 0:
+            return None
+        examples = [(value, [int(r) for r in _line_numbers(np.array(sorted(rows)))]) for value, rows in self.examples.values()]
+        return ValidationIssue(
+            level, code, message.format(values=value_count, rows=int(self.counts[duplicated].sum())),
+            count=value_count, examples=examples,
+        )
+
+
+class _InvalidValueCollector:
+    """変換できなかった値の件数と例を集めます。"""
+
+    def __init__(self, max_examples: int):
+        self.max_examples = max_examples
+        self.count = 0
+        self.examples = {}  # 値 -> [行, ...]
+
+    def add(self, values: np.ndarray, rows: np.ndarray):
+        self.count += len(values)
+        for value, row in zip(values[:self.max_examples], rows[:self.max_examples]):
+            if value in self.examples or len(self.examples) < self.max_examples:
+                self.examples.setdefault(value, []).append(int(row))
+
+    def issue(self, level: str, code: str, message: str):
+        if self.count == 0:
+            return None
+        examples = [(value, [int(r) for r in _line_numbers(np.array(rows))]) for value, rows in self.examples.items()]
+        return ValidationIssue(level, code, message.format(count=self.count), count=self.count, examples=examples)
+
+
+class _DeckValidator:
+    """チャンクを順に受け取って検証結果を集計します。"""
+
+    def __init__(self, columns, max_examples: int = 10):
+        self.columns = list(columns)
+        self.row_count = 0
+        self.terms = _DuplicateTracker(max_examples)
+        self.descriptions = _DuplicateTracker(max_examples)
+        self.empty = {col: _InvalidValueCollector(max_examples) for col in ('単語', '説明')}
+        self.invalid = {col: _InvalidValueCollector(max_examples) for col in DATE_COLUMNS + COUNT_COLUMNS}
+
+    def feed(self, chunk: pd.DataFrame):
+        rows = np.arange(self.row_count, self.row_count + len(chunk), dtype=np.int64)
+        self.row_count += len(chunk)
+
+        for col, tracker in (('単語', self.terms), ('説明', self.descriptions)):
+            if col not in chunk.columns:
+                continue
+            values = chunk[col].fillna('').astype(str).str.strip().to_numpy(dtype=object)
+            blank = values == ''
+            if blank.any():
+                self.empty[col].add(values[blank], rows[blank])
+            tracker.add(values[~blank], rows[~blank])
+
+        for col in DATE_COLUMNS + COUNT_COLUMNS:
+            if col not in chunk.columns:
+                continue
+            raw = chunk[col]
+            present = raw.notna().to_numpy() & (raw.astype(str).str.strip() != '').to_numpy()
+            if not present.any():
+                continue
+            # アプリの _process_df_types と同じ変換を行い、値があるのに変換できなかったものを数える
+            if col in DATE_COLUMNS:
+                converted = pd.to_datetime(raw[present], errors='coerce')
+            else:
+                converted = pd.to_numeric(raw[present], errors='coerce')
+            failed = converted.isna().to_numpy()
+            if failed.any():
+                self.invalid[col].add(raw[present].astype(str).to_numpy(dtype=object)[failed], rows[present][failed])
+
+    def report(self) -> ValidationReport:
+        report = ValidationReport(row_count=self.row_count)
+        missing = missing_required_columns(self.columns)
+        if missing:
+            report.issues.append(ValidationIssue(
+                "error", "missing-columns", f"必須カラムが見つかりません: {', '.join(missing)}", count=len(missing)
+            ))
+
+        candidates = [
+            self.terms.issue("warning", "duplicate-term",
+                             "同じ単語が複数の行にあります（{values} 語 / {rows} 行）。進捗は出現順で区別されます。"),
+            self.descriptions.issue("warning", "duplicate-description",
+                                    "同じ説明が複数の行にあります（{values} 件 / {rows} 行）。選択肢で正解が区別できなくなります。"),
+            self.empty['単語'].issue("warning", "empty-term", "単語が空の行があります（{count} 行）。"),
+            self.empty['説明'].issue("warning", "empty-description", "説明が空の行があります（{count} 行）。"),
+        ]
+        for col in DATE_COLUMNS:
+            candidates.append(self.invalid[col].issue(
+                "warning", "invalid-date", f"{col} に日時として解釈できない値があります（{{count}} 行）。空欄として扱われます。"
+            ))
+        for col in COUNT_COLUMNS:
+            candidates.append(self.invalid[col].issue(
+                "warning", "invalid-count", f"{col} に数値として解釈できない値があります（{{count}} 行）。0 として扱われます。"
+            ))
+        report.issues.extend(issue for issue in candidates if issue is not None)
+
+        if '説明' in self.columns and 0 < len(self.descriptions.hashes) < CHOICE_COUNT:
+            report.issues.append(ValidationIssue(
+                "warning", "too-few-descriptions",
+                f"異なる説明が {len(self.descriptions.hashes)} 件しかないため、選択肢が {CHOICE_COUNT} つ揃いません。",
+                count=len(self.descriptions.hashes),
+            ))
+        return report
+
+
+def validate_frame(df: pd.DataFrame, max_examples: int = 10) -> ValidationReport:
+    """読み込み済みの DataFrame を検証します（アップロード時に使用）。"""
+    validator = _DeckValidator(df.columns, max_examples)
+    validator.feed(df[[col for col in _CHECKED_COLUMNS if col in df.columns]])
+    return validator.report()
+
+
+def validate_csv(source, encoding: str = 'utf-8-sig', chunksize: int = 250_000, max_examples: int = 10) -> ValidationReport:
+    """CSVファイル（パスまたはファイルオブジェクト）をチャンク単位で読みながら検証します。
+
+    検証に使うカラムだけを文字列として読み込むので、メモリ使用量はチャンクの大きさ程度に抑えられます。
+    pyarrow があればその CSV ストリーミングリーダー（マルチスレッド）を使います。この場合の読み込み単位は
+    バイト数の固定のブロックなので、chunksize（行数）は pyarrow がないときだけ使われます。
+    """
+    header = pd.read_csv(source, encoding=encoding, nrows=0)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    validator = _DeckValidator(header.columns, max_examples)
+    usecols = [col for col in _CHECKED_COLUMNS if col in header.columns]
+    if not usecols:
+        return validator.report()
+
+    if pa_csv is not None:
+        reader = pa_csv.open_csv(
+            source,
+            read_options=pa_csv.ReadOptions(
+                encoding='utf8' if encoding.lower().replace('-', '') in ('utf8', 'utf8sig') else encoding,
+                block_size=64 << 20,  # 重複チェックの併合はチャンクごとに行うので、チャンクは大きめにする
+            ),
+            convert_options=pa_csv.ConvertOptions(include_columns=usecols, column_types={col: 'string' for col in usecols}),
+        )
+        for batch in reader:
+            validator.feed(batch.to_pandas())
+    else:
+        for chunk in pd.read_csv(source, encoding=encoding, usecols=usecols, dtype=str, chunksize=chunksize):
+            validator.feed(chunk)
+    return validator.report()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="単語CSV（デッキ）を検証します。")
+    parser.add_argument("paths", nargs="+", help="検証するCSVファイル")
+    parser.add_argument("--encoding", default="utf-8-sig", help="文字コード（既定: utf-8-sig。失敗したら shift_jis で再試行）")
+    parser.add_argument("--chunksize", type=int, default=250_000, help="一度に読み込む行数（pyarrow がない場合のみ。pyarrow では 64MB ずつ読みます）")
+    parser.add_argument("--max-examples", type=int, default=10, help="問題ごとに表示する例の数")
+    args = parser.parse_args(argv)
+
+    exit_code = 0
+    for path in args.paths:
+        try:
+            try:
+                report = validate_csv(path, args.encoding, args.chunksize, args.max_examples)
+            except ValueError:  # UnicodeDecodeError や pyarrow の不正な UTF-8 エラー
+                report = validate_csv(path, 'shift_jis', args.chunksize, args.max_examples)
+        except (OSError, ValueError) as e:  # pandas / pyarrow のパースエラーも ValueError の派生
+            print(f"{path}: 読み込めません: {e}", file=sys.stderr)
+            exit_code = 1
+            continue
+        print(f"{path}: {report.format()}")
+        if not report.ok:
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
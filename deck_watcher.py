@@ -0,0 +1,278 @@
+"""初期データ（tango.csv）の変更監視と行単位の差分反映。
+
+バックグラウンドスレッドでファイルの更新を検知し、次にセッションから refresh() が呼ばれたときに
+変更のあった行だけを再パースして共有デッキに反映します。各セッションは DeckChange の履歴を使って、
+正解回数・不正解回数などの進捗を保ったまま新しいデッキに追従します。
+"""
+import io
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# セッションごとの進捗カラム（デッキの更新では上書きしない）
+PROGRESS_COLUMNS = ['〇×結果', '正解回数', '不正解回数', '最終実施日時']
+
+
+def deck_keys(df: pd.DataFrame) -> pd.MultiIndex:
+    """行を識別するキー（単語, 同じ単語の出現番号）を返します。重複した単語も区別できるようにします。"""
+    return pd.MultiIndex.from_arrays(
+        [df['単語'].to_numpy(), df.groupby('単語', sort=False).cumcount().to_numpy()],
+        names=['単語', '出現番号'],
+    )
+
+
+def changed_positions(old_deck: pd.DataFrame, new_deck: pd.DataFrame) -> np.ndarray:
+    """新デッキのうち、旧デッキにも同じキーがあり内容（進捗カラム以外）が変わった行の位置を返します。"""
+    positions = deck_keys(old_deck).get_indexer(deck_keys(new_deck))
+    found = np.flatnonzero(positions >= 0)
+    differs = np.zeros(len(found), dtype=bool)
+    for col in new_deck.columns:
+        if col in PROGRESS_COLUMNS or col not in old_deck.columns:
+            continue
+        new_values = new_deck[col].astype(str).to_numpy(dtype=object)[found]
+        old_values = old_deck[col].astype(str).to_numpy(dtype=object)[positions[found]]
+        differs |= new_values != old_values
+    return found[differs]
+
+
+@dataclass
+class DeckChange:
+    """1回のデッキ更新で追加・削除・変更された単語。"""
+    version: int
+    added: set = field(default_factory=set)
+    removed: set = field(default_factory=set)
+    changed: set = field(default_factory=set)
+
+
+class DeckWatcher:
+    """CSVファイルを監視し、全セッションで共有するデッキを差分更新します。"""
+
+    def __init__(self, path: str, process_fn, poll_interval: float = 2.0, max_changes: int = 50, preload: bool = False,
+                 store=None):
+        self.path = path
+        self._process_fn = process_fn  # 生の DataFrame をアプリのスキーマに整える関数
+        self._store = store  # 他のワーカープロセスとデッキを共有する SharedDeckStore（任意）
+        self._poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stat = None
+        self._header = None
+        self._line_positions = {}  # 行文字列のハッシュ -> その行から作られたデッキ上の位置のリスト
+        self.deck = None
+        self.version = 0
+        self.changes = deque(maxlen=max_changes)
+        self.loaded = threading.Event()  # 初回ロード（成功・失敗を問わず）が終わったら set される
+        self.load_error = None
+        self.load_progress = (0.0, "待機中")  # (進捗率, 段階の説明)
+
+        self._thread = threading.Thread(target=self._watch, name="deck-watcher", daemon=True)
+        self._thread.start()
+        if preload:
+            threading.Thread(target=self._initial_load, name="deck-loader", daemon=True).start()
+
+    def _initial_load(self):
+        """初回ロードをバックグラウンドで行います。UIスレッドは loaded を待つ間に進捗を表示できます。"""
+        try:
+            self.refresh()
+        except BaseException as e:  # _process_df_types の st.stop() も含めて記録し、UI側で報告する
+            self.load_error = e
+        finally:
+            self.loaded.set()
+
+    def _current_stat(self):
+        st_result = os.stat(self.path)
+        return (st_result.st_mtime_ns, st_result.st_size)
+
+    def _watch(self):
+        """ファイルの更新日時とサイズを定期的に確認し、変化があれば dirty フラグを立てます。"""
+        while True:
+            try:
+                if self._stat is not None and self._current_stat() != self._stat:
+                    self._dirty.set()
+            except OSError:
+                pass
+            time.sleep(self._poll_interval)
+
+    def changes_since(self, version: int):
+        """指定バージョン以降の DeckChange のリストを返します。履歴が足りない場合は None を返します。"""
+        with self._lock:
+            pending = [c for c in self.changes if c.version > version]
+            if version < self.version and (not pending or pending[0].version != version + 1):
+                return None
+            return pending
+
+    def refresh(self) -> bool:
+        """ファイルが更新されていればデッキに差分を反映します。デッキが更新された場合は True を返します。
+
+        読み込み・パースに失敗した場合は、デッキを変えずに load_error に例外を残して送出します。
+        """
+        if self.deck is not None and not self._dirty.is_set():
+            return False
+        with self._lock:
+            if self.deck is not None and not self._dirty.is_set():
+                return False
+            self._dirty.clear()
+            self.load_progress = (0.1, "ファイルを読み込み中")
+            try:
+                stat = self._current_stat()
+                with open(self.path, encoding='utf-8-sig') as f:
+                    text = f.read()
+                self.load_progress = (0.3, "データを解析中")
+                if self._store is None:
+                    updated = self._apply_text(text)
+                else:
+                    updated = self._apply_shared(text, stat)
+            except Exception as e:
+                # 書き込み途中・不正なファイルではデッキを変えない。_stat を進めないので、監視スレッドが次の確認で読み直させる
+                self.load_error = e
+                self.load_progress = (1.0, "読み込みに失敗しました")
+                raise
+            self._stat = stat
+            self.load_progress = (1.0, "完了")
+            self.load_error = None
+            self.loaded.set()
+            return updated
+
+    def _apply_shared(self, text: str, stat) -> bool:
+        """共有ストアにこのファイル内容のデッキがあれば取り込み、なければパースして公開します。"""
+        old_deck = self.deck
+        build_results = []
+        build_errors = []
+
+        def build():
+            try:
+                build_results.append(self._apply_text(text))
+            except Exception as e:
+                build_errors.append(e)
+                raise
+            return self.deck
+
+        try:
+            _, shared_deck, built = self._store.get_or_build(stat, build)
+        except Exception as e:  # 共有ストアが使えない場合はこのプロセス内のデッキで続行する
+            if build_errors:  # ファイル自体をパースできない場合はストアのせいにせず、そのまま呼び出し元に返す
+                raise build_errors[0]
+            logger.warning("shared deck store unavailable: %s", e)
+            return build_results[0] if build_results else self._apply_text(text)
+
+        self.deck = shared_deck
+        if built:
+            return build_results[0]
+
+        # 他のワーカーが公開したデッキを取り込む（パースは行わない）
+        lines = text.splitlines()
+        self._header = lines[0] if lines else None
+        self._line_positions = {}
+        for pos, line in enumerate(line for line in lines[1:] if line.strip()):
+            self._line_positions.setdefault(hash(line), []).append(pos)
+        if old_deck is None:
+            return True
+        change = self._diff(old_deck, shared_deck, changed_positions=changed_positions(old_deck, shared_deck))
+        self.version += 1
+        change.version = self.version
+        self.changes.append(change)
+        return True
+
+    def _full_load(self, text: str, header: str, lines: list):
+        self.deck = self._process_fn(pd.read_csv(io.StringIO(text))).reset_index(drop=True)
+        self._header = header
+        self._line_positions = {}
+        for pos, line in enumerate(lines):
+            self._line_positions.setdefault(hash(line), []).append(pos)
+
+    def _apply_text(self, text: str) -> bool:
+        lines = text.splitlines()
+        if not lines:
+            return False
+        header, rows = lines[0], [line for line in lines[1:] if line.strip()]
+
+        # 初回・ヘッダー変更・複数行にまたがるセルがある場合は全件パースする
+        if self.deck is None or header != self._header or any(line.count('"') % 2 for line in rows):
+            old_deck = self.deck
+            self._full_load(text, header, rows)
+            if old_deck is None:
+                return True
+            change = self._diff(old_deck, self.deck, changed_positions=changed_positions(old_deck, self.deck))
+        else:
+            old_deck = self.deck
+            remaining = {h: list(p) for h, p in self._line_positions.items()}
+            known = []  # (行番号, 旧デッキ上の位置)
+            unknown = []  # (行番号, 行文字列)
+            for seq, line in enumerate(rows):
+                positions = remaining.get(hash(line))
+                if positions:
+                    known.append((seq, positions.pop(0)))
+                else:
+                    unknown.append((seq, line))
+
+            if not unknown and len(known) == len(old_deck):
+                self._line_positions = {}
+                for pos, line in enumerate(rows):
+                    self._line_positions.setdefault(hash(line), []).append(pos)
+                if [p for _, p in known] == list(range(len(old_deck))):
+                    return False  # 内容に変化なし（更新日時のみ変化）
+
+            # 変更のあった行だけをパースする
+            parts = []
+            if known:
+                kept = old_deck.iloc[[p for _, p in known]].copy()
+                kept['_seq'] = [seq for seq, _ in known]
+                parts.append(kept)
+            if unknown:
+                parsed = self._process_fn(pd.read_csv(io.StringIO('\n'.join([header] + [line for _, line in unknown]))))
+                parsed['_seq'] = [seq for seq, _ in unknown]
+                parts.append(parsed)
+            new_deck = pd.concat(parts, ignore_index=True).sort_values('_seq', kind='stable')
+            parsed_mask = new_deck['_seq'].isin([seq for seq, _ in unknown]).to_numpy()
+            new_deck = new_deck.drop(columns='_seq').reset_index(drop=True)
+
+            self.deck = new_deck
+            self._line_positions = {}
+            for pos, line in enumerate(rows):
+                self._line_positions.setdefault(hash(line), []).append(pos)
+            change = self._diff(old_deck, new_deck, changed_positions=parsed_mask.nonzero()[0])
+
+        self.version += 1
+        change.version = self.version
+        self.changes.append(change)
+        return True
+
+    @staticmethod
+    def _diff(old_deck: pd.DataFrame, new_deck: pd.DataFrame, changed_positions) -> DeckChange:
+        """旧デッキと新デッキを（単語, 出現番号）のキーで比較します。"""
+        old_keys, new_keys = deck_keys(old_deck), deck_keys(new_deck)
+        old_key_set, new_key_set = set(old_keys), set(new_keys)
+        change = DeckChange(version=0)
+        change.added = {term for term, _ in new_key_set - old_key_set}
+        change.removed = {term for term, _ in old_key_set - new_key_set} - set(new_deck['単語'])
+        for pos in changed_positions:
+            key = new_keys[pos]
+            if key in old_key_set:
+                change.changed.add(key[0])
+        return change
+
+
+def carry_over_progress(new_deck: pd.DataFrame, session_df: pd.DataFrame) -> pd.DataFrame:
+    """新しいデッキにセッションの進捗カラムを（単語, 出現番号）のキーで引き継いだ DataFrame を返します。"""
+    merged = new_deck.copy()
+    if session_df is None or session_df.empty:
+        return merged
+
+    positions = deck_keys(session_df).get_indexer(deck_keys(merged))
+    found = positions >= 0
+    for col in PROGRESS_COLUMNS:
+        if col not in session_df.columns:
+            continue
+        values = session_df[col].to_numpy()[positions[found]]
+        column = merged[col].copy()
+        column.iloc[found.nonzero()[0]] = values
+        merged[col] = column
+    return merged
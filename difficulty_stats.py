@@ -0,0 +1,121 @@
+"""全学習者の回答結果から単語ごとの難易度を推定するモジュール。
+
+各セッションは回答結果（匿名の学習者トークン・単語・正誤）をキューに入れるだけで、ロックは取りません。
+バックグラウンドスレッドが定期的にキューをまとめて取り出し、Elo レーティングで単語の難易度と
+学習者の実力を更新して、変更不可のスナップショットとして公開します。
+セッションはスナップショットを読むだけなので、まだ自分の回答履歴がない単語にも難易度に応じた重みを付けられます。
+"""
+import logging
+import math
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+INITIAL_RATING = 1500.0
+TERM_K = 16.0  # 単語の難易度の更新幅（多くの学習者の結果が集まるので小さめ）
+LEARNER_K = 32.0
+# 重みを付けるのに必要な回答数（少ない単語は重み 1.0 のまま）
+MIN_ANSWERS = 5
+# 重みの範囲（平均的な難易度の単語が 1.0）
+MIN_WEIGHT, MAX_WEIGHT = 0.5, 2.0
+# この時間回答のない学習者のレーティングは破棄する
+LEARNER_TTL_SECONDS = 24 * 3600
+
+
+def _expected(ability: float, difficulty: float) -> float:
+    """実力 ability の学習者が難易度 difficulty の単語に正解する確率（Elo）。"""
+    return 1.0 / (1.0 + math.pow(10.0, (difficulty - ability) / 400.0))
+
+
+@dataclass(frozen=True)
+class DifficultySnapshot:
+    """ある時点の難易度の推定結果。公開後は変更されないので、ロックなしで読めます。"""
+    version: int = 0
+    ratings: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))  # 単語 -> 難易度
+    answers: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))  # 単語 -> 回答数
+    weights: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))  # 単語 -> 出題の重み
+    learners: int = 0
+    published_at: float = 0.0
+
+
+class DifficultyAggregator:
+    """回答結果をバッチで集計し、単語ごとの難易度のスナップショットを定期的に公開します。"""
+
+    def __init__(self, interval: float = 10.0):
+        self.interval = interval
+        self._queue = queue.SimpleQueue()
+        self._term_ratings = {}  # 単語 -> 難易度（フィット用スレッドのみが触る）
+        self._term_answers = {}
+        self._learners = {}  # 学習者トークン -> [実力, 最終回答時刻]
+        self.snapshot = DifficultySnapshot()
+        self._thread = threading.Thread(target=self._run, name="difficulty-fit", daemon=True)
+        self._thread.start()
+
+    def submit(self, learner: str, term: str, is_correct: bool):
+        """回答結果を1件追加します。キューに入れるだけなので回答処理を待たせません。"""
+        self._queue.put((learner, term, bool(is_correct), time.time()))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.fit()
+            except Exception:  # 集計に失敗しても次の周期で再試行する
+                logger.exception("difficulty fit failed")
+
+    def fit(self) -> bool:
+        """キューに溜まった回答結果を反映し、新しいスナップショットを公開します。反映した結果がなければ False を返します。"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return False
+
+        for learner, term, is_correct, answered_at in batch:
+            ability = self._learners.setdefault(learner, [INITIAL_RATING, answered_at])
+            difficulty = self._term_ratings.get(term, INITIAL_RATING)
+            surprise = (1.0 if is_correct else 0.0) - _expected(ability[0], difficulty)
+            ability[0] += LEARNER_K * surprise
+            ability[1] = answered_at
+            self._term_ratings[term] = difficulty - TERM_K * surprise
+            self._term_answers[term] = self._term_answers.get(term, 0) + 1
+
+        limit = time.time() - LEARNER_TTL_SECONDS
+        for learner in [k for k, (_, seen) in self._learners.items() if seen < limit]:
+            del self._learners[learner]
+
+        self.snapshot = DifficultySnapshot(  # 参照の差し替えだけで公開する（読み手はロック不要）
+            version=self.snapshot.version + 1,
+            ratings=MappingProxyType(dict(self._term_ratings)),
+            answers=MappingProxyType(dict(self._term_answers)),
+            weights=MappingProxyType(self._weights()),
+            learners=len(self._learners),
+            published_at=time.time(),
+        )
+        return True
+
+    def _weights(self) -> dict:
+        """平均的な学習者が不正解になる確率を、単語間の平均で割った値を重みにします。"""
+        abilities = [ability for ability, _ in self._learners.values()]
+        typical = sum(abilities) / len(abilities) if abilities else INITIAL_RATING
+        failure = {
+            term: 1.0 - _expected(typical, rating)
+            for term, rating in self._term_ratings.items()
+            if self._term_answers[term] >= MIN_ANSWERS
+        }
+        if not failure:
+            return {}
+        mean_failure = sum(failure.values()) / len(failure)
+        if mean_failure <= 0:
+            return {}
+        return {term: min(MAX_WEIGHT, max(MIN_WEIGHT, p / mean_failure)) for term, p in failure.items()}
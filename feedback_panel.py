@@ -0,0 +1,73 @@
+"""回答後に表示する単語の詳細パネル（HTML）を作り、全セッションで共有する LRU キャッシュに置くモジュール。
+
+詳細パネルは単語ごとに一度だけ HTML エスケープして組み立て、(詳細列のデッキID, term_id) をキーに保存します。
+回答済み画面の再実行では、キャッシュ済みの HTML をそのまま使います。
+キャッシュには表示する値の組（フィンガープリント）も保存し、デッキの更新で値が変わった単語は作り直します。
+"""
+import html
+import threading
+from collections import OrderedDict
+
+# パネルに表示する項目: (見出し, 値を取り出す場所)。"quiz" は出題した問題の dict、"details" は詳細列
+PANEL_FIELDS = (
+    ("単語", "quiz", "単語"),
+    ("単語の説明", "quiz", "説明"),
+    ("試験区分", "details", "試験区分"),
+    ("午後記述での使用例", "details", "午後記述での使用例"),
+    ("使用理由／文脈", "details", "使用理由／文脈"),
+    ("シラバス改定有無", "quiz", "シラバス改定有無"),
+    ("改定の意図・影響", "details", "改定の意図・影響"),
+)
+
+
+def fingerprint(quiz: dict) -> tuple:
+    """キャッシュ済みのパネルがまだ使えるかを判定するための、問題側の表示値の組を返します。"""
+    return tuple(quiz.get(key) for _, source, key in PANEL_FIELDS if source == "quiz")
+
+
+def render_panel(quiz: dict, details: dict) -> str:
+    """詳細パネルの HTML を返します。値はすべて HTML エスケープします。"""
+    sources = {"quiz": quiz, "details": details}
+    rows = "\n".join(
+        f"    <p><strong>{html.escape(label)}:</strong> {html.escape(str(sources[source].get(key, 'N/A')))}</p>"
+        for label, source, key in PANEL_FIELDS
+    )
+    return (
+        '<div style="background-color: #f0f8ff; padding: 15px; border-left: 5px solid #2F80ED; margin-top: 15px; border-radius: 5px;">\n'
+        f"{rows}\n"
+        "</div>"
+    )
+
+
+class PanelCache:
+    """描画済みの詳細パネルの LRU キャッシュ（スレッドセーフ）。"""
+
+    def __init__(self, maxsize: int = 2048):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (deck_id, term_id) -> (フィンガープリント, HTML)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def get_or_render(self, deck_id, quiz: dict, details_fn) -> str:
+        """キャッシュ済みのパネルを返します。なければ details_fn(quiz) で詳細列を取り出して描画し、保存します。"""
+        key = (deck_id, quiz.get("term_id"))
+        current = fingerprint(quiz)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == current:
+                self._entries.move_to_end(key)
+                self.cache_hits += 1
+                return entry[1]
+            self.cache_misses += 1
+
+        rendered = render_panel(quiz, details_fn(quiz))  # 詳細列の取り出しと描画はロックの外で行う
+        with self._lock:
+            self._entries[key] = (current, rendered)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return rendered
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,293 @@
+"""サーバー全体のメトリクス（カウンター・ゲージ・ヒストグラム）を集めて Prometheus のテキスト形式で出力するモジュール。
+
+メトリクスはプロセス内で共有する REGISTRY に登録します。app.py は再実行のたびに評価されるので、
+counter() などは同じ名前で呼ばれたら登録済みのものを返します。
+出力は 127.0.0.1 の小さな HTTP エンドポイント、または定期的に書き出すファイルで行います。
+"""
+import bisect
+import functools
+import http.server
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 処理時間のヒストグラムの既定のバケット（秒）
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        """ラベル値ごとの子メトリクスを返します。"""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _ValueChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+        self._function = None
+
+    def set_function(self, function):
+        """出力のたびに function() を呼んで値を決めます（ストアが自分で数えているヒット数やデッキのメモリ量など）。"""
+        self._function = function
+
+    def render(self, name, labelnames, values):
+        value = self.value
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception as e:  # 出力処理全体は止めない
+                logger.debug("metric callback %s failed: %s", name, e)
+                value = float("nan")
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+
+class _CounterChild(_ValueChild):
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+
+class _GaugeChild(_ValueChild):
+    def set(self, value: float):
+        self.value = value
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: tuple):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts, total_sum = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total_sum)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        """関数の処理時間（秒）を記録するデコレーターを返します。"""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+
+class MetricsRegistry:
+    """メトリクスの登録と Prometheus テキスト形式での出力。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._exporters_started = set()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = cls(name, documentation, labelnames, **kwargs)
+                    self._metrics[name] = metric
+        if not isinstance(metric, cls):
+            raise ValueError(f"metric {name} is already registered as {metric.type_name}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port: int, host: str = "127.0.0.1"):
+        """GET /metrics でメトリクスを返す HTTP サーバーをデーモンスレッドで起動します（同じポートでは1回だけ）。"""
+        key = ("http", host, port)
+        with self._lock:
+            if key in self._exporters_started:
+                return
+            self._exporters_started.add(key)
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info("metrics endpoint listening on http://%s:%d/metrics", host, port)
+
+    def start_file_exporter(self, path: str, interval: float = 15.0):
+        """interval 秒ごとにメトリクスをファイルへ書き出すデーモンスレッドを起動します（同じパスでは1回だけ）。"""
+        key = ("file", path)
+        with self._lock:
+            if key in self._exporters_started:
+                return
+            self._exporters_started.add(key)
+
+        def write_loop():
+            while True:
+                try:
+                    tmp_path = f"{path}.tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        f.write(self.render())
+                    os.replace(tmp_path, path)  # スクレイパーが書きかけのファイルを読まないように
+                except OSError as e:
+                    logger.warning("failed to write metrics file %s: %s", path, e)
+                time.sleep(interval)
+
+        threading.Thread(target=write_loop, name="metrics-file", daemon=True).start()
+
+
+class ActivityTracker:
+    """直近 window 秒以内に実行のあったセッション数を数えます（切断を検知できないため、実行の有無で判定する）。"""
+
+    def __init__(self, window: float = 300.0):
+        self.window = window
+        self._lock = threading.Lock()
+        self._last_seen = {}
+
+    def touch(self, key):
+        with self._lock:
+            self._last_seen[key] = time.monotonic()
+
+    def count(self) -> int:
+        limit = time.monotonic() - self.window
+        with self._lock:
+            for key in [k for k, t in list(self._last_seen.items()) if t < limit]:
+                self._last_seen.pop(key, None)
+            return len(self._last_seen)
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,47 @@
+"""エクスポートしたCSVから学習進捗（〇×結果・正解回数・不正解回数・最終実施日時）を取り込むモジュール。"""
+import numpy as np
+import pandas as pd
+
+from deck_watcher import PROGRESS_COLUMNS, deck_keys
+
+# 同じ単語の進捗が両方にある場合の扱い
+MERGE_RULES = {
+    "newest": "最終実施日時が新しい方を優先",
+    "upload": "アップロードした進捗を優先",
+    "fill": "未回答の単語のみ補完",
+}
+
+
+def merge_progress(base_df: pd.DataFrame, progress_df: pd.DataFrame, rule: str = "newest"):
+    """progress_df の進捗カラムを base_df に（単語, 出現番号）のキーで1回結合して反映します。
+
+    どちらも _process_df_types 済みの DataFrame を渡してください。
+    戻り値は (マージ後の DataFrame, 進捗を取り込んだ行数) です。
+    """
+    if rule not in MERGE_RULES:
+        raise ValueError(f"不明なマージルールです: {rule}")
+
+    merged = base_df.copy()
+    if progress_df is None or progress_df.empty or merged.empty:
+        return merged, 0
+
+    positions = deck_keys(progress_df).get_indexer(deck_keys(merged))
+    found = positions >= 0
+    src = positions[found]
+    target = np.flatnonzero(found)
+
+    if rule == "newest":
+        incoming = progress_df['最終実施日時'].to_numpy()[src]
+        current = merged['最終実施日時'].to_numpy()[target]
+        take = ~pd.isna(incoming) & (pd.isna(current) | (incoming > current))
+    elif rule == "fill":
+        take = (merged['〇×結果'].to_numpy()[target] == '') & (progress_df['〇×結果'].to_numpy()[src] != '')
+    else:
+        take = np.ones(len(target), dtype=bool)
+
+    target, src = target[take], src[take]
+    for col in PROGRESS_COLUMNS:
+        column = merged[col].copy()
+        column.iloc[target] = progress_df[col].to_numpy()[src]
+        merged[col] = column
+    return merged, len(target)
@@ -0,0 +1,88 @@
+"""クイズ回答の集計値を回答ごとに少しずつ更新して保持するモジュール。
+
+分析タブは quiz_df 全体を groupby する代わりに、ここで保持している集計値だけを使って描画します。
+"""
+import math
+from datetime import datetime
+
+# 正答率を集計する軸
+STAT_DIMENSIONS = ('カテゴリ', '分野', '試験区分')
+
+# 時系列のダウンサンプリングで使うバケット幅（分）
+BUCKET_WIDTHS_MINUTES = (1, 5, 15, 60, 360, 1440)
+
+
+class ProgressStats:
+    """回答結果の集計値（軸ごとの正誤数・分単位の回答数・単語ごとの正誤数）。"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.by_dimension = {dim: {} for dim in STAT_DIMENSIONS}  # 軸 -> {値: [正解数, 不正解数]}
+        self.timeline = {}  # エポック分 -> [正解数, 不正解数]
+        self.by_term = {}  # 単語 -> [正解数, 不正解数]
+        self.total = 0
+        self.correct = 0
+
+    def record(self, quiz: dict, is_correct: bool, answered_at: datetime = None):
+        """1回分の回答を集計値に反映します（O(1)）。"""
+        slot = 0 if is_correct else 1
+        for dim in STAT_DIMENSIONS:
+            value = str(quiz.get(dim, '') or '')
+            counts = self.by_dimension[dim].setdefault(value, [0, 0])
+            counts[slot] += 1
+
+        answered_at = answered_at or datetime.now()
+        minute = int(answered_at.timestamp() // 60)
+        self.timeline.setdefault(minute, [0, 0])[slot] += 1
+
+        self.by_term.setdefault(quiz.get('単語', ''), [0, 0])[slot] += 1
+
+        self.total += 1
+        if is_correct:
+            self.correct += 1
+
+    def accuracy_by(self, dim: str) -> list:
+        """指定した軸の [(値, 正解数, 不正解数, 正答率), ...] を回答数の多い順で返します。"""
+        rows = []
+        for value, (correct, incorrect) in self.by_dimension.get(dim, {}).items():
+            answered = correct + incorrect
+            rows.append((value, correct, incorrect, correct / answered if answered else 0.0))
+        rows.sort(key=lambda r: -(r[1] + r[2]))
+        return rows
+
+    def downsampled_timeline(self, max_points: int = 120) -> list:
+        """回答数の時系列を max_points 点以下になるようにまとめて [(datetime, 正解数, 不正解数), ...] で返します。
+
+        バケット幅は BUCKET_WIDTHS_MINUTES から選び、1日幅でも収まらない長い履歴は日数の倍数に広げます。
+        """
+        if not self.timeline:
+            return []
+
+        first, last = min(self.timeline), max(self.timeline)
+
+        def bucket_count(width: int) -> int:  # 幅の倍数の時刻で区切ったときのバケット数
+            return last // width - first // width + 1
+
+        width = next((candidate for candidate in BUCKET_WIDTHS_MINUTES if bucket_count(candidate) <= max_points), None)
+        if width is None:
+            day = BUCKET_WIDTHS_MINUTES[-1]
+            width = math.ceil((last - first + 1) / max_points / day) * day
+            while bucket_count(width) > max_points:
+                width += day
+
+        buckets = {}
+        for minute, (correct, incorrect) in self.timeline.items():
+            key = minute - minute % width
+            counts = buckets.setdefault(key, [0, 0])
+            counts[0] += correct
+            counts[1] += incorrect
+
+        return [(datetime.fromtimestamp(key * 60), c, i) for key, (c, i) in sorted(buckets.items())]
+
+    def weak_terms(self, limit: int = 20) -> list:
+        """不正解数が正解数を上回っている単語を [(単語, 正解数, 不正解数), ...] で返します。"""
+        weak = [(term, c, i) for term, (c, i) in self.by_term.items() if i > c]
+        weak.sort(key=lambda r: (-(r[2] - r[1]), -r[2], r[0]))
+        return weak[:limit]
@@ -0,0 +1,642 @@
+"""Streamlit に依存しないクイズエンジン。
+
+出題（絞り込み・モードごとの重み付け・選択肢の作成）、回答の記録、集計値の取得を
+明示的な状態オブジェクトの上で行います。app.py の QuizApp はセッション状態の値を渡して
+このエンジンを呼び出すだけの薄いアダプターです。バッチ処理やベンチマークからは直接使えます::
+
+    engine = QuizEngine(deck, seed=0)
+    question = engine.next_question(QuizFilters(), "復習")
+    result = engine.record_answer(question["term_id"], question["choices"][0])
+    engine.stats()
+
+コマンドラインからは、回答をシミュレートして1問あたりの処理時間を計測できます::
+
+    python quiz_engine.py tango.csv --answers 1000 --mode 苦手
+"""
+import argparse
+import random
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from answer_timing import AnswerTimings, SLOW_CORRECT_WEIGHT
+from attempt_history import AttemptHistory
+from deck_validation import apply_column_types, missing_required_columns
+from progress_stats import ProgressStats, STAT_DIMENSIONS
+from typed_recall import RecallGrade, RecallIndex
+
+# 出題モード
+EXAM_MODE = "試験対策"
+QUIZ_MODES = ("未回答", "苦手", "復習", EXAM_MODE)
+# 絞り込みで「すべて」を表す値
+ALL = "すべて"
+# 出題した問題に持たせる項目（詳細テキストは term_id で別途取り出す）
+QUIZ_FIELDS = ['単語', '説明', 'カテゴリ', '分野', 'シラバス改定有無']
+# 誤答の選択肢の数
+WRONG_CHOICE_COUNT = 3
+# 出題の方向: 方向 -> (問題として表示する列, 選択肢にする列)
+DIRECTIONS = {
+    "単語→説明": ("単語", "説明"),
+    "説明→単語": ("説明", "単語"),
+    "使用例→単語": ("午後記述での使用例", "単語"),
+    "説明→単語（入力）": ("説明", "単語"),
+}
+DEFAULT_DIRECTION = "単語→説明"
+# 選択肢を選ぶのではなく、答えを入力して typed_recall で採点する方向
+RECALL_DIRECTION = "説明→単語（入力）"
+TYPED_DIRECTIONS = (RECALL_DIRECTION,)
+# 試験対策モードの重み: 出題確率（推定）ごとの重み（未設定は「中」と同じ扱い）
+PROBABILITY_WEIGHTS = {'高': 3.0, '中': 2.0, '低': 1.0}
+DEFAULT_PROBABILITY_WEIGHT = 2.0
+# 試験対策モードの重み: 午前・午後の両方で出題される単語に掛ける倍率
+BOTH_SESSIONS_FACTOR = 1.5
+
+
+@dataclass(frozen=True)
+class QuizFilters:
+    """出題対象の絞り込み条件。terms を指定すると、その単語だけに絞り込みます（検索結果での出題など）。"""
+    category: str = ALL
+    field: str = ALL
+    level: str = ALL
+    terms: tuple = None
+    query: str = None  # terms を作った検索語（スコープの識別用）
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """条件に合う行だけの DataFrame を返します。"""
+        mask = pd.Series(True, index=df.index)
+        if self.category != ALL:
+            mask &= df["カテゴリ"] == self.category
+        if self.field != ALL:
+            mask &= df["分野"] == self.field
+        if self.level != ALL:
+            mask &= df["シラバス改定有無"] == self.level
+        if self.terms is not None:
+            mask &= df["単語"].isin(self.terms)
+        return df[mask]
+
+    def scope(self) -> tuple:
+        """回答数・正解数を数える単位（スコープ）のキーを返します。"""
+        return (self.category, self.field, self.level, self.query)
+
+
+@dataclass
+class AnswerResult:
+    """record_answer の結果。"""
+    term_id: int
+    term: str
+    is_correct: bool
+    correct_description: str
+    answered_at: datetime
+    elapsed_ms: float = None
+    slow: bool = False
+    direction: str = DEFAULT_DIRECTION
+    correct_answer: str = None  # 正解の選択肢（単語→説明 なら説明、それ以外は単語）
+    recall: RecallGrade = None  # 入力式の方向の採点結果
+
+
+def weak_counts(df: pd.DataFrame, answer_timings: AnswerTimings = None) -> tuple:
+    """苦手モードで使う（実質の不正解回数, 実質の正解回数）を返します。
+    遅い正解は SLOW_CORRECT_WEIGHT 回分の不正解として扱います（単語ごとの集計値を引くだけで履歴は走査しない）。
+    """
+    incorrect, correct = df["不正解回数"], df["正解回数"]
+    slow_counts = answer_timings.slow_correct_counts() if answer_timings is not None else {}
+    if slow_counts:
+        slow = df["単語"].map(slow_counts).fillna(0) * SLOW_CORRECT_WEIGHT
+        incorrect, correct = incorrect + slow, correct - slow
+    return incorrect, correct
+
+
+def prior_weights(df: pd.DataFrame, difficulty_weights=None):
+    """まだ回答していない単語に、全学習者の結果から推定した難易度の重みを付けます（回答済みの単語と不明な単語は 1）。"""
+    if not difficulty_weights:
+        return 1
+    weights = df["単語"].map(difficulty_weights).fillna(1.0)
+    return weights.where(df["〇×結果"] == '', 1.0)
+
+
+def candidate_weights(df_filtered: pd.DataFrame, mode: str, answer_timings: AnswerTimings = None,
+                      difficulty_weights=None) -> pd.DataFrame:
+    """モードごとの出題候補を temp_weight 列付きで返します（単語の重複は重みの大きい方を残す）。
+
+    difficulty_weights（単語 -> 重み）を渡すと、自分の回答履歴がない単語は他の学習者にとっての難しさで重み付けします。
+    """
+    quiz_candidates_df = pd.DataFrame()
+
+    if mode == "未回答":
+        remaining_df = df_filtered[df_filtered["〇×結果"] == '']
+        if not remaining_df.empty:
+            quiz_candidates_df = remaining_df.assign(temp_weight=prior_weights(remaining_df, difficulty_weights))
+
+    elif mode == "苦手":
+        # 回答に時間がかかった正解は一部不正解として数える
+        weak_incorrect, weak_correct = weak_counts(df_filtered, answer_timings)
+        answered = df_filtered["〇×結果"] != ''
+        struggled_mask = answered & (weak_incorrect > weak_correct)
+        struggled_answered = df_filtered[struggled_mask]
+        if not struggled_answered.empty:
+            quiz_candidates_df = struggled_answered.assign(temp_weight=weak_incorrect[struggled_mask] + 5)
+
+        low_correct_mask = answered & (weak_correct <= 3)
+        low_correct_answered = df_filtered[low_correct_mask]
+        if not low_correct_answered.empty:
+            low_correct_answered = low_correct_answered.assign(temp_weight=4 - weak_correct[low_correct_mask])
+            # 既に struggled_answered に含まれている単語は除外する
+            if not quiz_candidates_df.empty:
+                low_correct_answered = low_correct_answered[~low_correct_answered["単語"].isin(quiz_candidates_df["単語"])]
+            quiz_candidates_df = pd.concat([quiz_candidates_df, low_correct_answered])  # インデックス（term_id）は保持する
+
+    elif mode == "復習":
+        if not df_filtered.empty:
+            quiz_candidates_df = df_filtered.assign(temp_weight=prior_weights(df_filtered, difficulty_weights))
+
+    if quiz_candidates_df.empty:
+        return quiz_candidates_df
+    return quiz_candidates_df.sort_values(by='temp_weight', ascending=False).drop_duplicates(subset='単語', keep='first')
+
+
+@dataclass
+class _ChoicePool:
+    prompts: np.ndarray  # デッキの行ごとの問題文
+    prompt_codes: np.ndarray  # 問題文の番号（同じ問題文は同じ番号）
+    answer_codes: np.ndarray  # 正解の選択肢の番号（answers の添字）
+    answers: np.ndarray  # 選択肢になる値（重複なし）
+    eligible: pd.Series  # この方向で出題できる行（インデックスは term_id）
+    ambiguous: dict  # 問題文の番号 -> 正解になりうる選択肢の番号（複数ある問題文のみ）
+
+
+class ChoicePools:
+    """出題の方向ごとの選択肢のプール。
+
+    デッキの読み込み時に一度だけ作り、出題のたびにデッキ全体から選択肢を集め直さないようにします。
+    使用例は詳細列なので、詳細列を切り出す前のデッキから作ってください。
+    """
+
+    def __init__(self, deck: pd.DataFrame):
+        self.index = deck.index
+        self._pools = {}
+        built = {}  # (問題の列, 選択肢の列) -> プール（入力式など、同じ列を使う方向では使い回す）
+        for direction, (prompt_col, answer_col) in DIRECTIONS.items():
+            if prompt_col not in deck.columns or answer_col not in deck.columns:
+                continue
+            if (prompt_col, answer_col) in built:
+                self._pools[direction] = built[(prompt_col, answer_col)]
+                continue
+            prompts = deck[prompt_col].fillna('').astype(str)
+            answers = deck[answer_col].fillna('').astype(str)
+            eligible = (prompts.str.strip() != '') & (answers.str.strip() != '')
+            prompt_codes, _ = pd.factorize(prompts)
+            answer_codes, answer_values = pd.factorize(answers)
+            # 同じ問題文に複数の正解がある場合（同じ説明の単語など）、それらは誤答の選択肢にしない
+            pairs = pd.DataFrame({'prompt': prompt_codes, 'answer': answer_codes})[eligible.to_numpy()].drop_duplicates()
+            shared = pairs[pairs.duplicated('prompt', keep=False)]
+            self._pools[direction] = _ChoicePool(
+                prompts=prompts.to_numpy(dtype=object),
+                prompt_codes=prompt_codes,
+                answer_codes=answer_codes,
+                answers=np.asarray(answer_values, dtype=object),
+                eligible=eligible,
+                ambiguous={int(p): frozenset(group.tolist()) for p, group in shared.groupby('prompt')['answer']},
+            )
+            built[(prompt_col, answer_col)] = self._pools[direction]
+
+    def directions(self) -> list:
+        """このデッキで出題できる方向の一覧を返します。"""
+        return [direction for direction, pool in self._pools.items() if pool.eligible.any()]
+
+    def matches(self, deck: pd.DataFrame) -> bool:
+        return self.index.equals(deck.index)
+
+    def pool(self, direction: str) -> _ChoicePool:
+        pool = self._pools.get(direction)
+        if pool is None:
+            raise ValueError(f"unsupported question direction for this deck: {direction}")
+        return pool
+
+    def question(self, position: int, direction: str, rng: random.Random) -> tuple:
+        """デッキの position 行目の (問題文, 正解, 選択肢のリスト) を返します。"""
+        pool = self.pool(direction)
+        correct = int(pool.answer_codes[position])
+        excluded = pool.ambiguous.get(int(pool.prompt_codes[position]), frozenset((correct,)))
+        wrong_count = min(WRONG_CHOICE_COUNT, len(pool.answers) - len(excluded))
+        wrong = set()
+        while len(wrong) < wrong_count:
+            code = rng.randrange(len(pool.answers))
+            if code not in excluded:
+                wrong.add(code)
+        choices = [pool.answers[code] for code in sorted(wrong)] + [pool.answers[correct]]
+        rng.shuffle(choices)
+        return pool.prompts[position], pool.answers[correct], choices
+
+
+class DirectionProgress:
+    """term_id・出題方向ごとの正解数・不正解数と直近の結果。term_id ごとに長さ 3×方向数 の array('i') を1つだけ持ちます。
+
+    デッキの進捗の列（〇×結果・正解回数・不正解回数）は既定の方向（単語→説明）の進捗です。
+    それ以外の方向の未回答・苦手・復習の候補は、progress() でこの値に置き換えたデッキから選びます。
+    """
+
+    _SLOTS = 3  # 正解, 不正解, 直近の結果（0: なし, 1: 〇, 2: ×）
+    _OFFSETS = dict(zip(DIRECTIONS, range(0, _SLOTS * len(DIRECTIONS), _SLOTS)))
+    _RESULTS = np.array(['', '〇', '×'], dtype=object)
+
+    def __init__(self):
+        self.by_id = {}  # term_id -> array('i', [正解, 不正解, 直近の結果] × 方向)
+
+    def record(self, term_id: int, direction: str, is_correct: bool):
+        counts = self.by_id.get(term_id)
+        if counts is None:
+            counts = self.by_id[term_id] = array('i', [0]) * (self._SLOTS * len(DIRECTIONS))
+        offset = self._OFFSETS[direction]
+        counts[offset + (0 if is_correct else 1)] += 1
+        counts[offset + 2] = 1 if is_correct else 2
+
+    def counts(self, term_id: int, direction: str) -> tuple:
+        """(正解数, 不正解数) を返します。"""
+        counts = self.by_id.get(term_id)
+        if counts is None:
+            return 0, 0
+        offset = self._OFFSETS[direction]
+        return counts[offset], counts[offset + 1]
+
+    def progress(self, df: pd.DataFrame, direction: str) -> pd.DataFrame:
+        """df の進捗の列（〇×結果・正解回数・不正解回数）を direction の方向の値に置き換えたコピーを返します。"""
+        results = np.zeros(len(df), dtype=np.int8)
+        correct = np.zeros(len(df), dtype=np.int64)
+        incorrect = np.zeros(len(df), dtype=np.int64)
+        if self.by_id:
+            offset = self._OFFSETS[direction]
+            term_ids = np.fromiter(self.by_id, dtype=np.int64, count=len(self.by_id))
+            positions = df.index.get_indexer(term_ids)
+            for term_id, position in zip(term_ids[positions >= 0].tolist(), positions[positions >= 0].tolist()):
+                counts = self.by_id[term_id]
+                correct[position], incorrect[position], results[position] = counts[offset:offset + 3]
+        return df.assign(**{'〇×結果': self._RESULTS[results], '正解回数': correct, '不正解回数': incorrect})
+
+    def to_arrays(self) -> tuple:
+        """(方向のリスト, term_id の配列, term_id ごとの [正解, 不正解, 直近の結果] × 方向 の2次元配列) を返します（スナップショット用）。"""
+        term_ids = np.fromiter(self.by_id, dtype=np.int64, count=len(self.by_id))
+        counts = np.zeros((len(term_ids), self._SLOTS * len(DIRECTIONS)), dtype=np.int32)
+        for row, term_id in enumerate(term_ids.tolist()):
+            counts[row] = self.by_id[term_id]
+        return list(self._OFFSETS), term_ids, counts
+
+    @classmethod
+    def from_arrays(cls, directions: list, term_ids: np.ndarray, counts: np.ndarray):
+        """to_arrays の値から作り直します。今はない方向の記録は捨てます。"""
+        progress = cls()
+        rebuilt = np.zeros((len(term_ids), cls._SLOTS * len(DIRECTIONS)), dtype=np.int32)
+        for i, direction in enumerate(directions):
+            offset = cls._OFFSETS.get(direction)
+            if offset is not None:
+                rebuilt[:, offset:offset + cls._SLOTS] = counts[:, i * cls._SLOTS:(i + 1) * cls._SLOTS]
+        progress.by_id = {term_id: array('i', row) for term_id, row in zip(term_ids.tolist(), rebuilt.tolist())}
+        return progress
+
+    def remap(self, new_ids: dict):
+        """デッキの更新で term_id が変わったときに、{旧 term_id: 新 term_id} で付け替えます。対応のない単語の記録は捨てます。"""
+        self.by_id = {int(new_ids[term_id]): counts for term_id, counts in self.by_id.items() if term_id in new_ids}
+
+    def summary(self) -> list:
+        """[(方向, 回答数, 正解数), ...] を返します（回答のない方向は含めない）。"""
+        rows = []
+        for direction, offset in self._OFFSETS.items():
+            correct = sum(counts[offset] for counts in self.by_id.values())
+            incorrect = sum(counts[offset + 1] for counts in self.by_id.values())
+            if correct + incorrect:
+                rows.append((direction, correct + incorrect, correct))
+        return rows
+
+
+def exam_weights(df: pd.DataFrame) -> pd.Series:
+    """出題確率（推定）と試験区分から、試験対策モードの重み（インデックスは term_id）を計算します。"""
+    weights = pd.Series(DEFAULT_PROBABILITY_WEIGHT, index=df.index, dtype=np.float64)
+    if '出題確率（推定）' in df.columns:
+        weights = df['出題確率（推定）'].astype(str).str.strip().map(PROBABILITY_WEIGHTS).fillna(DEFAULT_PROBABILITY_WEIGHT)
+    if '試験区分' in df.columns:
+        sessions = df['試験区分'].astype(str)
+        both = (sessions.str.contains('午前') & sessions.str.contains('午後')).to_numpy()
+        weights = weights * np.where(both, BOTH_SESSIONS_FACTOR, 1.0)
+    return weights.astype(np.float64)
+
+
+class ExamSampler:
+    """試験対策モードの重み付き抽出。
+
+    重みはデッキの読み込み時に一度だけ計算し、絞り込み条件ごとの累積分布をキャッシュします。
+    重みは進捗に依存しないので、1問あたりの抽出は累積分布の二分探索だけで済みます。
+    """
+
+    def __init__(self, weights: pd.Series, max_scopes: int = 16):
+        self.weights = weights
+        self.max_scopes = max_scopes
+        self._cumulative = OrderedDict()  # QuizFilters -> (term_id の配列, 累積重み)
+
+    @classmethod
+    def from_deck(cls, df: pd.DataFrame, **kwargs):
+        return cls(exam_weights(df), **kwargs)
+
+    def _distribution(self, deck: pd.DataFrame, filters: QuizFilters, eligible: pd.Series = None, key=None):
+        cache_key = (filters, key)
+        entry = self._cumulative.get(cache_key)
+        if entry is None:
+            target = filters.apply(deck)
+            if eligible is not None:
+                target = target[eligible.reindex(target.index, fill_value=False).to_numpy()]
+            term_ids = target.index.to_numpy()
+            weights = self.weights.reindex(term_ids).fillna(DEFAULT_PROBABILITY_WEIGHT).to_numpy()
+            entry = self._cumulative[cache_key] = (term_ids, np.cumsum(weights))
+            if len(self._cumulative) > self.max_scopes:
+                self._cumulative.popitem(last=False)
+        else:
+            self._cumulative.move_to_end(cache_key)
+        return entry
+
+    def sample(self, deck: pd.DataFrame, filters: QuizFilters, rng: random.Random, eligible: pd.Series = None, key=None):
+        """重みに比例して term_id を1つ選びます。対象がなければ None を返します。
+
+        eligible を渡すと、その行（出題の方向で出題できる行など）だけから選びます。key は eligible ごとに変えてください。
+        """
+        term_ids, cumulative = self._distribution(deck, filters, eligible, key)
+        if len(term_ids) == 0 or cumulative[-1] <= 0:
+            return None
+        position = int(np.searchsorted(cumulative, rng.random() * cumulative[-1], side='right'))
+        return term_ids[min(position, len(term_ids) - 1)]
+
+
+class QuizEngine:
+    """デッキ（quiz_df）と集計値を状態として持ち、出題と回答の記録を行います。
+
+    渡した DataFrame・集計オブジェクト・scope_counters はそのまま（コピーせずに）更新します。
+    """
+
+    def __init__(self, deck: pd.DataFrame, progress_stats: ProgressStats = None, answer_timings: AnswerTimings = None,
+                 scope_counters: dict = None, details_fn=None, seed=None, rng: random.Random = None,
+                 difficulty_weights=None, exam_sampler: ExamSampler = None, choice_pools: ChoicePools = None,
+                 direction_progress: DirectionProgress = None, attempt_history: AttemptHistory = None,
+                 recall_index: RecallIndex = None):
+        self.deck = deck
+        self.progress_stats = progress_stats if progress_stats is not None else ProgressStats()
+        self.answer_timings = answer_timings if answer_timings is not None else AnswerTimings()
+        self.scope_counters = scope_counters if scope_counters is not None else {}
+        self._details_fn = details_fn  # 問題 -> 詳細列の dict（試験区分など、デッキに含まれない列の取得用）
+        self.rng = rng if rng is not None else random.Random(seed)
+        self.difficulty_weights = difficulty_weights  # 単語 -> 全学習者の結果から推定した重み（任意）
+        self.exam_sampler = exam_sampler  # 試験対策モード用（省略時は初回に deck から作る）
+        self.choice_pools = choice_pools  # 出題の方向ごとの選択肢（省略時は初回に deck から作る）
+        self.direction_progress = direction_progress if direction_progress is not None else DirectionProgress()
+        self.attempt_history = attempt_history if attempt_history is not None else AttemptHistory()
+        self.recall_index = recall_index  # 入力式の採点用の単語の索引（省略時は初回の採点で deck から作る）
+        self.current = None  # 直近に出題した問題
+
+    def _pools(self) -> ChoicePools:
+        if self.choice_pools is None or not self.choice_pools.matches(self.deck):
+            self.choice_pools = ChoicePools(self.deck)
+        return self.choice_pools
+
+    def _recall(self) -> RecallIndex:
+        if self.recall_index is None or not self.recall_index.matches(self.deck["単語"]):
+            self.recall_index = RecallIndex(self.deck["単語"])
+        return self.recall_index
+
+    def next_question(self, filters: QuizFilters = None, mode: str = "復習", direction: str = DEFAULT_DIRECTION):
+        """次の問題を選び、{単語, 説明, ..., term_id, direction, prompt, choices, shown_at} の dict を返します。
+        候補がなければ None を返します。
+        """
+        self.current = None
+        if self.deck is None or self.deck.empty:
+            return None
+        filters = filters or QuizFilters()
+        # 使用例のない単語など、この方向で出題できない行は候補から外す
+        eligible = self._pools().pool(direction).eligible if direction != DEFAULT_DIRECTION else None
+
+        if mode == EXAM_MODE:
+            if self.exam_sampler is None:
+                self.exam_sampler = ExamSampler.from_deck(self.deck)
+            term_id = self.exam_sampler.sample(self.deck, filters, self.rng, eligible, key=direction)
+            return None if term_id is None else self._build_question(self.deck.loc[term_id], direction)
+
+        df_filtered = filters.apply(self.deck)
+        if eligible is not None:
+            df_filtered = df_filtered[eligible.reindex(df_filtered.index, fill_value=False).to_numpy()]
+        df_filtered = self.progress_view(df_filtered, direction)
+        candidates = candidate_weights(df_filtered, mode, self.answer_timings, self.difficulty_weights)
+        if candidates.empty:
+            return None
+
+        weights = candidates['temp_weight']
+        random_state = self.rng.randrange(2**32)
+        if (weights == 0).all():
+            # 重みが全て0の場合、均等にサンプリング
+            selected_row = candidates.sample(n=1, random_state=random_state).iloc[0]
+        else:
+            selected_row = candidates.sample(n=1, weights=weights, random_state=random_state).iloc[0]
+
+        return self._build_question(selected_row, direction)
+
+    def candidates(self, filters: QuizFilters = None, mode: str = "復習", direction: str = DEFAULT_DIRECTION) -> tuple:
+        """出題候補の (term_id の配列, 重みの配列) を返します。進捗が変わらない間は question_set に使い回せます。"""
+        filters = filters or QuizFilters()
+        df_filtered = filters.apply(self.deck)
+        if direction != DEFAULT_DIRECTION:
+            eligible = self._pools().pool(direction).eligible
+            df_filtered = df_filtered[eligible.reindex(df_filtered.index, fill_value=False).to_numpy()]
+        if mode == EXAM_MODE:
+            if self.exam_sampler is None:
+                self.exam_sampler = ExamSampler.from_deck(self.deck)
+            term_ids = df_filtered.index.to_numpy()
+            return term_ids, self.exam_sampler.weights.reindex(term_ids).fillna(DEFAULT_PROBABILITY_WEIGHT).to_numpy()
+        df_filtered = self.progress_view(df_filtered, direction)
+        candidates = candidate_weights(df_filtered, mode, self.answer_timings, self.difficulty_weights)
+        if candidates.empty:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        return candidates.index.to_numpy(), candidates['temp_weight'].to_numpy(dtype=np.float64)
+
+    def question_set(self, count: int, filters: QuizFilters = None, mode: str = "復習",
+                     direction: str = DEFAULT_DIRECTION, candidates: tuple = None) -> list:
+        """重複のない count 問の問題のリストを返します（小テストの作成用）。候補が足りなければある分だけ返します。
+
+        candidates に candidates() の結果を渡すと、候補の計算を省略します。
+        """
+        term_ids, weights = candidates if candidates is not None else self.candidates(filters, mode, direction)
+        if (weights > 0).any():
+            term_ids, weights = term_ids[weights > 0], weights[weights > 0]
+        else:  # 重みが全て0の場合、均等にサンプリング
+            weights = np.ones(len(term_ids))
+        if len(term_ids) == 0:
+            return []
+        generator = np.random.default_rng(self.rng.randrange(2**32))
+        picked = generator.choice(len(term_ids), size=min(count, len(term_ids)), replace=False, p=weights / weights.sum())
+        rows = self.deck.loc[term_ids[picked], QUIZ_FIELDS]  # 行ごとに loc で取り出すと遅いのでまとめて取り出す
+        questions = [
+            self._make_question(term_id, fields, direction)
+            for term_id, fields in zip(rows.index, rows.to_dict('records'))
+        ]
+        self.current = None
+        return questions
+
+    def question_for(self, term_id, term: str = None, direction: str = DEFAULT_DIRECTION):
+        """指定した単語の問題を作り直して返します（セッションの復元用）。見つからなければ None を返します。"""
+        idx = self._locate(term_id, term)
+        if idx is None:
+            return None
+        return self._build_question(self.deck.loc[idx], direction)
+
+    def progress_view(self, df: pd.DataFrame, direction: str = DEFAULT_DIRECTION) -> pd.DataFrame:
+        """出題の方向から見た進捗の df を返します。既定の方向ではそのまま、それ以外は方向ごとの回答数に置き換えます。"""
+        if direction == DEFAULT_DIRECTION:
+            return df
+        return self.direction_progress.progress(df, direction)
+
+    def _build_question(self, selected_row: pd.Series, direction: str = DEFAULT_DIRECTION) -> dict:
+        return self._make_question(selected_row.name, {name: selected_row[name] for name in QUIZ_FIELDS}, direction)
+
+    def _make_question(self, term_id, question: dict, direction: str) -> dict:
+        question["term_id"] = int(term_id)
+
+        position = self.deck.index.get_loc(term_id)
+        prompt, _, choices = self._pools().question(position, direction, self.rng)
+        question["direction"] = direction
+        question["prompt"] = prompt
+        question["choices"] = choices
+        question["shown_at"] = time.monotonic()  # 回答時間の計測開始
+        self.current = question
+        return question
+
+    def _locate(self, term_id, term: str = None):
+        """term_id の行を返します。デッキ更新などで位置がずれていれば単語で探し直します。見つからなければ None。"""
+        if term_id in self.deck.index and (term is None or self.deck.at[term_id, "単語"] == term):
+            return term_id
+        if term is None:
+            return None
+        matches = self.deck.index[self.deck["単語"] == term]
+        return matches[0] if len(matches) else None
+
+    def record_answer(self, term_id, choice: str, term: str = None, filters: QuizFilters = None,
+                      elapsed_ms: float = None, answered_at: datetime = None, direction: str = None):
+        """回答を記録して AnswerResult を返します。該当する単語がデッキにない場合は None を返します。
+
+        elapsed_ms・direction を省略した場合は、直近に出題した問題であればその経過時間と方向を使います。
+        """
+        idx = self._locate(term_id, term)
+        if idx is None:
+            return None
+        is_current = self.current is not None and self.current["term_id"] == term_id
+        if direction is None:
+            direction = self.current["direction"] if is_current else DEFAULT_DIRECTION
+        row_term = self.deck.at[idx, "単語"]
+        correct_description = self.deck.at[idx, "説明"]
+        correct_answer = self.deck.at[idx, DIRECTIONS[direction][1]]
+        recall = None
+        if direction in TYPED_DIRECTIONS:  # 入力式は表記ゆれ・タイプミスを考慮して採点する
+            recall = self._recall().grade(choice, correct_answer)
+            is_correct = recall.is_correct
+        else:
+            is_correct = choice == correct_answer
+        answered_at = answered_at or datetime.now()
+
+        if direction == DEFAULT_DIRECTION:  # デッキの進捗の列は既定の方向の進捗（他の方向は direction_progress だけに記録する）
+            if is_correct:
+                self.deck.loc[idx, '〇×結果'] = '〇'
+                self.deck.loc[idx, '正解回数'] += 1
+            else:
+                self.deck.loc[idx, '〇×結果'] = '×'
+                self.deck.loc[idx, '不正解回数'] += 1
+            self.deck.loc[idx, '最終実施日時'] = answered_at
+
+        self.direction_progress.record(int(idx), direction, is_correct)
+        self.attempt_history.append(idx, is_correct, answered_at)
+
+        if elapsed_ms is None and is_current:
+            elapsed_ms = (time.monotonic() - self.current["shown_at"]) * 1000
+        slow = False
+        if elapsed_ms is not None:
+            slow = self.answer_timings.record(row_term, elapsed_ms, is_correct)
+
+        # 分析用の集計値を更新（デッキ全体の再集計は行わない）
+        quiz = {name: self.deck.at[idx, name] for name in QUIZ_FIELDS if name in self.deck.columns}
+        quiz.update({dim: self.deck.at[idx, dim] for dim in STAT_DIMENSIONS if dim in self.deck.columns})
+        if self._details_fn is not None:
+            quiz.update(self._details_fn({**quiz, "term_id": int(idx)}))
+        self.progress_stats.record(quiz, is_correct, answered_at)
+
+        counters = self.scope_counters.setdefault((filters or QuizFilters()).scope(), [0, 0])
+        counters[0] += 1
+        if is_correct:
+            counters[1] += 1
+
+        self.current = None
+        return AnswerResult(int(idx), row_term, is_correct, correct_description, answered_at, elapsed_ms, slow,
+                            direction, correct_answer, recall)
+
+    def stats(self, filters: QuizFilters = None, direction: str = DEFAULT_DIRECTION) -> dict:
+        """全体とスコープごとの回答数・正解数、絞り込み後の件数、平均回答時間を返します。未回答の数は direction の方向で数えます。"""
+        filters = filters or QuizFilters()
+        scope_answered, scope_correct = self.scope_counters.get(filters.scope(), [0, 0])
+        target = self.progress_view(filters.apply(self.deck), direction) if self.deck is not None else pd.DataFrame(columns=["〇×結果"])
+        return {
+            "answered": self.progress_stats.total,
+            "correct": self.progress_stats.correct,
+            "accuracy": self.progress_stats.correct / self.progress_stats.total if self.progress_stats.total else 0.0,
+            "scope_answered": scope_answered,
+            "scope_correct": scope_correct,
+            "target": len(target),
+            "remaining": int((target["〇×結果"] == '').sum()),
+            "mean_answer_ms": self.answer_timings.mean_ms(),
+        }
+
+
+def load_deck(path: str) -> pd.DataFrame:
+    """単語CSVを読み込み、アプリと同じ型変換（進捗列がなければ未回答の状態で補う）をして返します（コマンドラインツール用）。"""
+    deck = pd.read_csv(path)
+    missing = missing_required_columns(deck.columns)
+    if missing:
+        raise ValueError(f"{path}: 必須カラムがありません: {', '.join(missing)}")
+    return apply_column_types(deck).reset_index(drop=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="回答をシミュレートしてクイズエンジンの処理時間を計測します。")
+    parser.add_argument("path", help="単語CSV")
+    parser.add_argument("--answers", type=int, default=500, help="シミュレートする回答数")
+    parser.add_argument("--mode", choices=QUIZ_MODES, default="復習")
+    parser.add_argument("--direction", choices=list(DIRECTIONS), default=DEFAULT_DIRECTION)
+    parser.add_argument("--accuracy", type=float, default=0.7, help="正解を選ぶ確率")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    deck = load_deck(args.path)
+    engine = QuizEngine(deck, seed=args.seed)
+    rng = random.Random(args.seed)
+    next_seconds, record_seconds = [], []
+    for _ in range(args.answers):
+        start = time.perf_counter()
+        question = engine.next_question(mode=args.mode, direction=args.direction)
+        if question is None:  # 苦手モードの最初など候補がない場合は復習モードで出題する
+            question = engine.next_question(mode="復習", direction=args.direction)
+        if question is None:
+            print(f"{args.path}: 出題できる単語がありません（方向: {args.direction}）", file=sys.stderr)
+            return 1
+        next_seconds.append(time.perf_counter() - start)
+        answer = question["単語"] if args.direction != DEFAULT_DIRECTION else question["説明"]
+        choice = answer if rng.random() < args.accuracy else rng.choice(question["choices"])
+        start = time.perf_counter()
+        engine.record_answer(question["term_id"], choice, elapsed_ms=rng.uniform(1000, 8000))
+        record_seconds.append(time.perf_counter() - start)
+
+    for label, values in (("next_question", next_seconds), ("record_answer", record_seconds)):
+        if not values:  # --answers 0
+            continue
+        values.sort()
+        print(f"{label}: p50 {values[len(values) // 2] * 1000:.2f} ms / p95 {values[int(len(values) * 0.95)] * 1000:.2f} ms")
+    print(engine.stats(direction=args.direction))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,142 @@
+"""印刷・配布用の小テスト（問題セット）をまとめて作るコマンドラインツール。
+
+出題の絞り込み・モードごとの重み付け・選択肢の作成はアプリと同じ QuizEngine を使います。
+問題セットごとにシードを決めるので、同じ引数で実行すれば同じ問題セットが再現できます。
+セットの作成はプロセスプールで並列に行い、できた順（セット番号順）に JSONL または CSV で書き出します::
+
+    python quiz_sheets.py tango.csv --per-field --sets 20 --questions 50 -o sheets.jsonl
+    python quiz_sheets.py tango.csv --category テクノロジ --sets 100 --format csv -o sheets.csv
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import quiz_engine
+from quiz_engine import ALL, DEFAULT_DIRECTION, DIRECTIONS, QUIZ_MODES, QuizEngine, QuizFilters
+
+CSV_FIELDS = ["set_id", "seed", "分野", "number", "term_id", "prompt", "choice_1", "choice_2", "choice_3", "choice_4", "answer"]
+
+# ワーカープロセスごとのエンジンと、(絞り込み条件, モード, 方向) ごとの出題候補
+_engine = None
+_candidates = {}
+
+
+def set_seed(base_seed: int, group: str, index: int) -> int:
+    """問題セットのシード。ワーカーへの割り当てや実行順に関係なく、同じ引数なら同じ値になります。"""
+    return random.Random(f"{base_seed}:{group}:{index}").randrange(2**31)
+
+
+def _init_worker(path: str):
+    global _engine
+    _engine = QuizEngine(quiz_engine.load_deck(path))
+    _engine.choice_pools = quiz_engine.ChoicePools(_engine.deck)  # 使用例→単語 のプールもここで一度だけ作る
+
+
+def _build_sets(specs: list) -> list:
+    """[(set_id, seed, filters, mode, direction, questions), ...] の問題セットを作ります（ワーカープロセスで実行）。"""
+    sets = []
+    for set_id, seed, filters, mode, direction, count in specs:
+        key = (filters, mode, direction)
+        if key not in _candidates:
+            _candidates[key] = _engine.candidates(filters, mode, direction)
+        _engine.rng = random.Random(seed)
+        questions = _engine.question_set(count, filters, mode, direction, candidates=_candidates[key])
+        sets.append({
+            "set_id": set_id,
+            "seed": seed,
+            "filters": {"category": filters.category, "field": filters.field, "level": filters.level},
+            "mode": mode,
+            "direction": direction,
+            "questions": [
+                {
+                    "term_id": q["term_id"],
+                    "単語": q["単語"],
+                    "prompt": q["prompt"],
+                    "choices": q["choices"],
+                    "answer": q["説明"] if direction == DEFAULT_DIRECTION else q["単語"],
+                }
+                for q in questions
+            ],
+        })
+    return sets
+
+
+def _write_jsonl(out, sheet: dict):
+    out.write(json.dumps(sheet, ensure_ascii=False, default=int) + "\n")
+
+
+def _write_csv(writer, sheet: dict):
+    for number, q in enumerate(sheet["questions"], start=1):
+        choices = list(q["choices"]) + [""] * (4 - len(q["choices"]))
+        writer.writerow([
+            sheet["set_id"], sheet["seed"], sheet["filters"]["field"], number, q["term_id"], q["prompt"],
+            *choices[:4], q["answer"],
+        ])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="小テスト（問題セット）をまとめて作成します。")
+    parser.add_argument("path", help="単語CSV（進捗列があれば苦手モードなどの重み付けに使います）")
+    parser.add_argument("--sets", type=int, default=1, help="作成する問題セットの数（--per-field では分野ごとの数）")
+    parser.add_argument("--questions", type=int, default=50, help="1セットあたりの問題数")
+    parser.add_argument("--mode", choices=QUIZ_MODES, default="復習")
+    parser.add_argument("--direction", choices=list(DIRECTIONS), default=DEFAULT_DIRECTION)
+    parser.add_argument("--category", default=ALL)
+    parser.add_argument("--field", default=ALL)
+    parser.add_argument("--level", default=ALL, help="シラバス改定有無")
+    parser.add_argument("--per-field", action="store_true", help="分野ごとに --sets 個ずつ作成する")
+    parser.add_argument("--seed", type=int, default=0, help="各セットのシードの元になる値")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch", type=int, default=50, help="ワーカーに一度に渡すセット数")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("-o", "--output", help="出力先（省略時は標準出力）")
+    args = parser.parse_args(argv)
+
+    if args.per_field:
+        fields = sorted(quiz_engine.load_deck(args.path)["分野"].dropna().unique().tolist())
+    else:
+        fields = [args.field]
+    specs = []
+    for field in fields:
+        filters = QuizFilters(args.category, field, args.level)
+        for index in range(args.sets):
+            set_id = f"{field}-{index + 1:04d}" if args.per_field else f"{index + 1:04d}"
+            specs.append((set_id, set_seed(args.seed, field, index), filters, args.mode, args.direction, args.questions))
+    batches = [specs[i:i + args.batch] for i in range(0, len(specs), args.batch)]
+
+    executor = None
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            writer = csv.writer(out)
+            writer.writerow(CSV_FIELDS)
+            write = lambda sheet: _write_csv(writer, sheet)
+        else:
+            write = lambda sheet: _write_jsonl(out, sheet)
+
+        if args.workers <= 1:
+            _init_worker(args.path)
+            results = map(_build_sets, batches)
+        else:
+            executor = ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(args.path,))
+            results = executor.map(_build_sets, batches)  # 結果はセット番号順に受け取り、順に書き出す
+        written = 0
+        for sheets in results:
+            for sheet in sheets:
+                write(sheet)
+            written += len(sheets)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if out is not sys.stdout:
+            out.close()
+    print(f"{written} sets written", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
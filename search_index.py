@@ -0,0 +1,181 @@
+"""単語データ用の文字 n-gram 転置インデックス。
+
+単語・説明・午後記述での使用例・使用理由／文脈 の各カラムから文字 bi-gram / tri-gram を作り、
+検索語を含む単語の候補を転置リストの積集合で絞り込んでからスコア付けします。
+デッキ全体を str.contains で走査する代わりに使うことで、大きなデッキでも入力ごとの検索を軽く保ちます。
+"""
+import heapq
+import unicodedata
+from collections import defaultdict
+
+# 検索対象カラムとスコアの重み（単語そのものへの一致を最も重く扱う）
+SEARCH_FIELDS = {
+    '単語': 5.0,
+    '説明': 2.0,
+    '午後記述での使用例': 1.0,
+    '使用理由／文脈': 1.0,
+}
+NGRAM_SIZES = (2, 3)
+
+
+def normalize_text(text) -> str:
+    """検索用に文字列を正規化します（NFKC + 小文字化）。"""
+    if text is None:
+        return ''
+    text = str(text)
+    if text == 'nan':
+        return ''
+    return unicodedata.normalize('NFKC', text).lower()
+
+
+def _ngrams(text: str, sizes=NGRAM_SIZES) -> set:
+    grams = set()
+    for n in sizes:
+        for i in range(len(text) - n + 1):
+            grams.add(text[i:i + n])
+    return grams
+
+
+class NgramIndex:
+    """単語（'単語' カラムの値）をキーとした n-gram 転置インデックス。"""
+
+    def __init__(self, fields: dict = None):
+        self.fields = dict(fields or SEARCH_FIELDS)
+        self._postings = defaultdict(set)  # n-gram -> 単語の集合
+        self._char_postings = defaultdict(set)  # 1文字 -> 単語の集合（1文字検索用）
+        self._docs = {}  # 単語 -> 正規化済みのフィールド文字列タプル
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _docs_from_df(self, df) -> dict:
+        """DataFrame から {単語: 正規化済みフィールドのタプル} を作ります。重複した単語は最初の行を採用します。"""
+        columns = [df[col] if col in df.columns else [''] * len(df) for col in self.fields]
+        docs = {}
+        for values in zip(*columns):
+            term = str(values[0])
+            if term in docs:
+                continue
+            docs[term] = tuple(normalize_text(v) for v in values)
+        return docs
+
+    def _add_doc(self, term: str, texts: tuple):
+        self._docs[term] = texts
+        for text in texts:
+            for gram in _ngrams(text):
+                self._postings[gram].add(term)
+            for ch in set(text):
+                self._char_postings[ch].add(term)
+
+    def _remove_doc(self, term: str):
+        texts = self._docs.pop(term, None)
+        if texts is None:
+            return
+        for text in texts:
+            for gram in _ngrams(text):
+                posting = self._postings.get(gram)
+                if posting is not None:
+                    posting.discard(term)
+                    if not posting:
+                        del self._postings[gram]
+            for ch in set(text):
+                posting = self._char_postings.get(ch)
+                if posting is not None:
+                    posting.discard(term)
+                    if not posting:
+                        del self._char_postings[ch]
+
+    def build(self, df):
+        """インデックスを作り直します。"""
+        self._postings.clear()
+        self._char_postings.clear()
+        self._docs.clear()
+        for term, texts in self._docs_from_df(df).items():
+            self._add_doc(term, texts)
+        return self
+
+    def update(self, df) -> dict:
+        """新しいデッキとの差分（追加・削除・変更された単語）だけをインデックスに反映します。"""
+        new_docs = self._docs_from_df(df)
+        removed = [term for term in self._docs if term not in new_docs]
+        added = [term for term in new_docs if term not in self._docs]
+        changed = [term for term, texts in new_docs.items()
+                   if term in self._docs and self._docs[term] != texts]
+
+        for term in removed + changed:
+            self._remove_doc(term)
+        for term in added + changed:
+            self._add_doc(term, new_docs[term])
+
+        return {'added': len(added), 'removed': len(removed), 'changed': len(changed)}
+
+    def apply_changes(self, upserted_df, removed_terms=()):
+        """追加・変更された単語の行と、削除された単語だけをインデックスに反映します。"""
+        for term in removed_terms:
+            self._remove_doc(term)
+        for term, texts in self._docs_from_df(upserted_df).items():
+            if self._docs.get(term) != texts:
+                self._remove_doc(term)
+                self._add_doc(term, texts)
+
+    def _candidates(self, token: str) -> set:
+        """1つの検索トークンを含む可能性がある単語の集合を返します。"""
+        if len(token) == 1:
+            return set(self._char_postings.get(token, ()))
+
+        n = 3 if len(token) >= 3 else 2
+        grams = {token[i:i + n] for i in range(len(token) - n + 1)}
+        postings = []
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if not posting:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+
+    def search(self, query: str, limit: int = 50) -> list:
+        """検索語に一致する単語を [(単語, スコア), ...] のスコア降順で返します。
+
+        空白で区切られた複数の語は AND 条件として扱います。
+        """
+        tokens = [t for t in normalize_text(query).split() if t]
+        if not tokens:
+            return []
+
+        candidates = None
+        for token in sorted(tokens, key=len, reverse=True):
+            token_candidates = self._candidates(token)
+            candidates = token_candidates if candidates is None else candidates & token_candidates
+            if not candidates:
+                return []
+
+        weighted_fields = list(enumerate(self.fields.values()))
+        whole_query = ' '.join(tokens)
+        docs = self._docs
+        results = []
+        for term in candidates:
+            texts = docs[term]
+            score = 0.0
+            for token in tokens:
+                token_score = 0.0
+                for i, weight in weighted_fields:
+                    if token in texts[i]:
+                        token_score += weight * texts[i].count(token)
+                if token_score == 0.0:
+                    break  # n-gram の積集合による偽陽性を除外
+                score += token_score
+            else:
+                if texts[0] == whole_query:
+                    score += 100.0
+                elif texts[0].startswith(whole_query):
+                    score += 20.0
+                results.append((score, term))
+
+        top = heapq.nlargest(limit, results)
+        return [(term, score) for score, term in top]
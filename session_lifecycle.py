@@ -0,0 +1,79 @@
+"""セッション状態のライフサイクル管理。
+
+問題ごとに作られるウィジェットのキーを小さな固定プールで使い回し、使われなくなったエントリを削除します。
+あわせて、開発者ツールで表示するためのセッション状態のサイズ見積もりを提供します。
+"""
+import re
+import sys
+
+# 問題ごとのラジオボタンのキーとして使い回す数（連続する問題でキーが重ならなければよい）
+WIDGET_KEY_POOL_SIZE = 4
+
+# 回答済みの問題ごとに残りうるセッション状態のキー
+_STALE_KEY_PATTERNS = (
+    re.compile(r"^quiz_choice_\d+$"),
+)
+
+
+def pooled_widget_key(prefix: str, index: int, pool_size: int = WIDGET_KEY_POOL_SIZE) -> str:
+    """index をプールの大きさで折り返したウィジェットキーを返します。"""
+    return f"{prefix}_{index % pool_size}"
+
+
+def recycle_widget_key(state, key: str, patterns=_STALE_KEY_PATTERNS) -> int:
+    """これから使うキーと、過去の問題のウィジェットのエントリをすべて削除します。削除した件数を返します。"""
+    removed = 0
+    for existing in list(state.keys()):
+        if existing == key or any(p.match(existing) for p in patterns):
+            # 現在のキーはこれから新しいウィジェットとして作り直すので、前回の選択値を残さない
+            del state[existing]
+            removed += 1
+    return removed
+
+
+def estimate_size(obj, max_objects: int = 200_000) -> tuple:
+    """オブジェクトのおおよそのメモリ使用量（バイト）を返します。
+
+    DataFrame / Series は memory_usage を使い、それ以外は dict・list・set などを再帰的にたどります。
+    たどるオブジェクト数が max_objects を超えた場合は打ち切り、(バイト数, 打ち切ったかどうか) を返します。
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    visited = 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        visited += 1
+        if visited > max_objects:
+            return total, True
+
+        memory_usage = getattr(current, "memory_usage", None)
+        if callable(memory_usage) and hasattr(current, "dtypes"):
+            usage = memory_usage(deep=True)
+            total += int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+            continue
+
+        total += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, "__dict__"):
+            stack.append(vars(current))
+        elif hasattr(current, "__slots__"):
+            stack.extend(getattr(current, name) for name in current.__slots__ if hasattr(current, name))
+    return total, False
+
+
+def session_state_report(state) -> list:
+    """[(キー, バイト数, 打ち切ったかどうか), ...] をサイズの大きい順で返します。"""
+    rows = []
+    for key in list(state.keys()):
+        size, truncated = estimate_size(state[key])
+        rows.append((key, size, truncated))
+    rows.sort(key=lambda r: -r[1])
+    return rows
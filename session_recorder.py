@@ -0,0 +1,58 @@
+"""セッションの操作（データソース・絞り込み・モード・出題・回答・リセット）を記録し、あとで再生するためのモジュール。
+
+記録は環境変数 TANGO_RECORD_DIR を設定したときだけ有効になり、セッションごとに1つの JSONL ファイルへ
+1行1イベントで追記します。先頭の start イベントには出題用の乱数のシードを書くので、
+session_replay.py で同じ操作列を同じ乱数でヘッドレスに再生し、イベントごとの処理時間とメモリを計測できます。
+"""
+import json
+import os
+import re
+import threading
+import time
+
+# 記録するイベントの種類
+EVENT_TYPES = ("start", "load", "state", "question", "answer", "next", "reset")
+_RECORDING_ID = re.compile(r"^[0-9a-f]{16,64}$")
+
+
+class SessionRecorder:
+    """セッションごとのイベントログを directory に書き出すレコーダー（全セッションで共有）。"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._started = {}  # 記録ID -> start イベントの時刻（monotonic）
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, recording_id: str) -> str:
+        return os.path.join(self.directory, f"session-{recording_id}.jsonl")
+
+    def start(self, recording_id: str, seed: int, **data):
+        """記録を開始し、乱数のシードなどを書いた start イベントを書き出します。"""
+        if not _RECORDING_ID.match(recording_id):
+            raise ValueError(f"invalid recording id: {recording_id}")
+        with self._lock:
+            self._started[recording_id] = time.monotonic()
+        self._write(recording_id, {"t": 0.0, "event": "start", "seed": seed, "wall_time": time.time(), **data})
+
+    def record(self, recording_id: str, event: str, **data):
+        """イベントを1件追記します。start していない記録IDは無視します。"""
+        started = self._started.get(recording_id)
+        if started is None:
+            return
+        self._write(recording_id, {"t": round(time.monotonic() - started, 6), "event": event, **data})
+
+    def _write(self, recording_id: str, entry: dict):
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self.path(recording_id), "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+def read_events(path: str) -> list:
+    """イベントログを読み込み、イベントの dict のリストを返します。"""
+    with open(path, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    if not events or events[0].get("event") != "start":
+        raise ValueError(f"not a session recording: {path}")
+    return events
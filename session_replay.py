@@ -0,0 +1,143 @@
+"""session_recorder で記録したセッションの操作を、Streamlit なしで再生して性能を計測するコマンドラインツール。
+
+QuizApp と同じ順序で QuizEngine を呼び出し、記録したシードの乱数を使うので、出題は記録時と同じ順に再現されます
+（他の学習者の結果による難易度の重みなど、記録時と条件が違って出題がずれた場合は、記録した単語に合わせて続けます）。
+イベントの種類ごとの処理時間と、tracemalloc で計測したイベントごとの最大メモリ使用量を表示します::
+
+    python session_replay.py /tmp/tango_records/session-0123456789abcdef.jsonl --repeat 5
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import quiz_engine
+from progress_stats import ProgressStats
+from answer_timing import AnswerTimings
+from attempt_history import AttemptHistory
+from quiz_engine import DEFAULT_DIRECTION, QuizEngine, QuizFilters
+from session_recorder import read_events
+
+
+class Replayer:
+    """記録したイベントを QuizEngine に対して再生します。"""
+
+    def __init__(self, events: list, deck_path: str):
+        self.events = events
+        self.deck_path = deck_path
+        self.engine = None
+        self.diverged = 0  # 記録と異なる単語が出題された回数
+        self.uploads = 0  # --deck のファイルで代用したアップロードデータの読み込み回数
+
+    def _load(self):
+        # 出題用の乱数はセッションで1つなので、デッキを読み込み直しても続きから使う
+        self.engine = QuizEngine(quiz_engine.load_deck(self.deck_path), rng=self.rng)
+
+    def _handle(self, event: dict):
+        kind = event["event"]
+        if kind == "load":
+            self.uploads += event.get("source") == "upload"
+            self._load()
+            return
+        if self.engine is None:  # load より前のイベントは、デッキを読み込んでから再生する
+            self._load()
+        if kind == "reset":
+            self.engine.progress_stats = ProgressStats()
+            self.engine.answer_timings = AnswerTimings()
+            self.engine.direction_progress = quiz_engine.DirectionProgress()
+            self.engine.attempt_history = AttemptHistory()
+            self.engine.scope_counters.clear()
+            if event.get("clear_progress", True):
+                deck = self.engine.deck
+                deck.loc[:, '〇×結果'] = ''
+                deck.loc[:, '正解回数'] = 0
+                deck.loc[:, '不正解回数'] = 0
+                deck.loc[:, '最終実施日時'] = quiz_engine.pd.NaT
+        elif kind == "state":
+            terms = tuple(event["terms"]) if event.get("terms") is not None else None
+            self.filters = QuizFilters(event["category"], event["field"], event["level"], terms, event.get("query"))
+            self.mode = event["mode"]
+            self.direction = event.get("direction") or DEFAULT_DIRECTION
+        elif kind == "question":
+            question = self.engine.next_question(self.filters, self.mode, self.direction)
+            recorded = event.get("term_id")
+            if (question["term_id"] if question else None) != recorded:
+                self.diverged += 1
+                if recorded is not None:
+                    self.engine.question_for(recorded, event.get("term"), self.direction)
+        elif kind == "answer":
+            self.engine.record_answer(
+                event["term_id"], event["choice"], term=event.get("term"), filters=self.filters,
+                elapsed_ms=event.get("elapsed_ms"),
+            )
+
+    def run(self, measure_memory: bool = False) -> list:
+        """全イベントを再生し、[(イベントの種類, 処理時間(秒), 最大メモリ使用量(バイト)), ...] を返します。"""
+        self.rng = random.Random(self.events[0]["seed"])
+        self.engine = None
+        self.filters = QuizFilters()
+        self.mode = "復習"
+        self.direction = DEFAULT_DIRECTION
+        self.diverged = 0
+        self.uploads = 0
+        samples = []
+        for event in self.events[1:]:
+            if measure_memory:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            self._handle(event)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - baseline if measure_memory else 0
+            samples.append((event["event"], elapsed, peak))
+        return samples
+
+
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="記録したセッションの操作を再生し、イベントごとの処理時間とメモリを計測します。")
+    parser.add_argument("recording", help="session_recorder が書き出した JSONL")
+    parser.add_argument("--deck", default="tango.csv", help="再生に使う単語CSV（アップロードデータの記録ではそのファイル）")
+    parser.add_argument("--repeat", type=int, default=3, help="処理時間の計測に使う再生回数")
+    parser.add_argument("--no-memory", action="store_true", help="tracemalloc によるメモリの計測を省略する")
+    parser.add_argument("--slowest", type=int, default=5, help="表示する遅いイベントの数")
+    args = parser.parse_args(argv)
+
+    events = read_events(args.recording)
+    replayer = Replayer(events, args.deck)
+
+    timings = {}  # イベントの種類 -> 処理時間のリスト
+    slowest = []
+    for _ in range(max(1, args.repeat)):  # 処理時間は tracemalloc なしで計測する
+        for index, (kind, elapsed, _) in enumerate(replayer.run()):
+            timings.setdefault(kind, []).append(elapsed)
+            slowest.append((elapsed, index + 2, kind))  # ファイルの行番号（1行目は start）
+    peaks = {}
+    if not args.no_memory:
+        tracemalloc.start()
+        for kind, _, peak in replayer.run(measure_memory=True):
+            peaks[kind] = max(peaks.get(kind, 0), peak)
+        tracemalloc.stop()
+
+    print(f"{args.recording}: {len(events) - 1} events, seed {events[0]['seed']}, replayed {max(1, args.repeat)} times")
+    print(f"{'event':<10}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'peak KiB':>10}")
+    for kind, values in timings.items():
+        peak = f"{peaks[kind] / 1024:.0f}" if kind in peaks else "-"
+        print(f"{kind:<10}{len(values):>7}{_percentile(values, 0.5) * 1000:>10.2f}{_percentile(values, 0.95) * 1000:>10.2f}"
+              f"{max(values) * 1000:>10.2f}{peak:>10}")
+    print("slowest events:")
+    for elapsed, line, kind in sorted(slowest, reverse=True)[:args.slowest]:
+        print(f"  line {line}: {kind} {elapsed * 1000:.2f} ms")
+    if replayer.diverged:
+        print(f"{replayer.diverged} questions differed from the recording (followed the recorded terms)")
+    if replayer.uploads:
+        print(f"{replayer.uploads} uploaded-deck loads were replayed with {args.deck}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,285 @@
+"""サーバーの再起動をまたいで学習中のセッションを復元するためのスナップショット。
+
+スナップショットには、回答済みの単語の進捗（〇×結果・正解回数・不正解回数・最終実施日時）と
+出題方向ごとの回答数（quiz_engine.DirectionProgress）、最小限の画面状態（クイズモード・絞り込み条件・出題中の問題・スコープごとの回答数）だけを
+バイナリ形式で保存します。未回答の単語は保存しないので、ファイルの大きさと復元時間は
+デッキの大きさではなく回答した単語数に比例します。
+
+書き込みはバックグラウンドスレッドがまとめて定期的に行い、プロセス終了時にも残りを書き出します。
+"""
+import atexit
+import json
+import logging
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from deck_watcher import deck_keys
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TQSNAP1\n"
+DEFAULT_STORE_DIR = os.path.join(tempfile.gettempdir(), "tango_quiz_sessions")
+# スナップショットに保存する画面状態（セッション状態のキー）
+UI_KEYS = ("quiz_mode", "quiz_direction", "filter_category", "filter_field", "filter_level", "search_terms_filter", "search_filter_query")
+_RESULT_CODES = {'': 0, '〇': 1, '×': 2}
+_RESULT_VALUES = np.array(['', '〇', '×'], dtype=object)
+_SESSION_ID = re.compile(r"^[0-9a-f]{16,64}$")
+
+
+def is_valid_session_id(session_id) -> bool:
+    """ファイル名に使ってよいセッションIDかどうかを返します。"""
+    return isinstance(session_id, str) and bool(_SESSION_ID.match(session_id))
+
+
+def capture(quiz_df: pd.DataFrame, direction_progress=None) -> dict:
+    """回答済みの単語の位置と進捗を、quiz_df から切り離したコピーとして取り出します（decode と同じ形の辞書）。
+
+    direction_progress（quiz_engine.DirectionProgress）を渡すと、出題方向ごとの回答数も取り出します。
+    """
+    answered = ((quiz_df['〇×結果'] != '') | (quiz_df['正解回数'] > 0) | (quiz_df['不正解回数'] > 0)).to_numpy()
+    positions = np.flatnonzero(answered)
+    part = quiz_df.iloc[positions]
+    occurrences = deck_keys(quiz_df).get_level_values(1).to_numpy()
+    if direction_progress is not None:
+        directions, direction_ids, direction_counts = direction_progress.to_arrays()
+    else:
+        directions, direction_ids, direction_counts = [], np.array([], dtype=np.int64), np.zeros((0, 0), dtype=np.int32)
+    direction_positions = quiz_df.index.get_indexer(direction_ids)
+    kept = direction_positions >= 0
+    direction_positions = direction_positions[kept]
+    return {
+        "term_ids": part.index.to_numpy(dtype=np.int64),
+        "terms": part['単語'].astype(str).to_numpy(dtype=object),
+        "occurrences": occurrences[positions].astype(np.int32),
+        "results": part['〇×結果'].map(_RESULT_CODES).fillna(0).to_numpy(dtype=np.int8),
+        "correct": part['正解回数'].to_numpy(dtype=np.int64).astype(np.int32),
+        "incorrect": part['不正解回数'].to_numpy(dtype=np.int64).astype(np.int32),
+        "last": pd.to_datetime(part['最終実施日時']).to_numpy(dtype='datetime64[ns]').astype(np.int64),  # NaT は int64 の最小値になる
+        "directions": list(directions),
+        "direction_term_ids": direction_ids[kept],
+        "direction_terms": quiz_df['単語'].astype(str).to_numpy(dtype=object)[direction_positions],
+        "direction_occurrences": occurrences[direction_positions].astype(np.int32),
+        "direction_counts": direction_counts[kept],
+    }
+
+
+def encode_progress(progress: dict, ui_state: dict) -> bytes:
+    """capture した進捗と画面状態をバイナリにします。"""
+    terms = "\x1f".join(progress["terms"]).encode('utf-8')
+    meta = json.dumps(ui_state, ensure_ascii=False, default=str).encode('utf-8')
+    body = b"".join([
+        struct.pack('<III', len(meta), len(progress["term_ids"]), len(terms)), meta, terms,
+        progress["term_ids"].astype('<i8').tobytes(),
+        progress["occurrences"].astype('<i4').tobytes(),
+        progress["results"].astype('i1').tobytes(),
+        progress["correct"].astype('<i4').tobytes(),
+        progress["incorrect"].astype('<i4').tobytes(),
+        progress["last"].astype('<i8').tobytes(),
+        _encode_directions(progress),
+    ])
+    return MAGIC + zlib.compress(body, 6)
+
+
+def _encode_directions(progress: dict) -> bytes:
+    """出題方向ごとの回答数のブロック（方向名・単語・term_id・出現番号・回答数の2次元配列）をバイナリにします。"""
+    names = "\x1f".join(progress["directions"]).encode('utf-8')
+    terms = "\x1f".join(progress["direction_terms"]).encode('utf-8')
+    counts = progress["direction_counts"]
+    return b"".join([
+        struct.pack('<IIII', len(names), len(progress["direction_term_ids"]), len(terms), counts.shape[1]), names, terms,
+        progress["direction_term_ids"].astype('<i8').tobytes(),
+        progress["direction_occurrences"].astype('<i4').tobytes(),
+        counts.astype('<i4').tobytes(),
+    ])
+
+
+def encode(quiz_df: pd.DataFrame, ui_state: dict) -> bytes:
+    """回答済みの単語の進捗と画面状態をバイナリにします。"""
+    return encode_progress(capture(quiz_df), ui_state)
+
+
+def decode(data: bytes) -> dict:
+    """encode したバイナリを {"ui": 画面状態, "term_ids": ..., "terms": ..., ...} に戻します。
+
+    出題方向ごとの回答数のブロックがない（それを保存する前の）スナップショットは、方向ごとの回答数を空として読みます。
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError("not a session snapshot")
+    body = zlib.decompress(data[len(MAGIC):])
+    meta_len, n, terms_len = struct.unpack_from('<III', body)
+    offset = struct.calcsize('<III')
+    ui_state = json.loads(body[offset:offset + meta_len].decode('utf-8'))
+    offset += meta_len
+    terms = body[offset:offset + terms_len].decode('utf-8').split("\x1f") if n else []
+    offset += terms_len
+
+    def take(dtype, count=n):
+        nonlocal offset
+        values = np.frombuffer(body, dtype=dtype, count=count, offset=offset)
+        offset += values.nbytes
+        return values
+
+    snapshot = {
+        "ui": ui_state,
+        "term_ids": take('<i8'),
+        "terms": np.array(terms, dtype=object),
+        "occurrences": take('<i4'),
+        "results": take('i1'),
+        "correct": take('<i4'),
+        "incorrect": take('<i4'),
+        "last": take('<i8'),
+        "directions": [],
+        "direction_term_ids": np.array([], dtype=np.int64),
+        "direction_terms": np.array([], dtype=object),
+        "direction_occurrences": np.array([], dtype=np.int32),
+        "direction_counts": np.zeros((0, 0), dtype=np.int32),
+    }
+    if offset < len(body):
+        names_len, m, terms_len, width = struct.unpack_from('<IIII', body, offset)
+        offset += struct.calcsize('<IIII')
+        names = body[offset:offset + names_len].decode('utf-8')
+        offset += names_len
+        direction_terms = body[offset:offset + terms_len].decode('utf-8').split("\x1f") if m else []
+        offset += terms_len
+        snapshot.update({
+            "directions": names.split("\x1f") if names else [],
+            "direction_term_ids": take('<i8', m),
+            "direction_terms": np.array(direction_terms, dtype=object),
+            "direction_occurrences": take('<i4', m),
+            "direction_counts": take('<i4', m * width).reshape(m, width),
+        })
+    return snapshot
+
+
+def _locate_rows(quiz_df: pd.DataFrame, term_ids: np.ndarray, terms: np.ndarray, occurrences: np.ndarray) -> np.ndarray:
+    """保存時の term_id の行の、今の quiz_df での位置を返します（見つからない行は -1）。
+
+    保存時の term_id（インデックス）の単語が一致すればそのまま使うので、処理量は保存した単語数に比例します。
+    デッキが更新されて一致しない単語だけ、（単語, 出現番号）のキーで探し直します。
+    """
+    positions = quiz_df.index.get_indexer(term_ids)
+    words = quiz_df['単語'].to_numpy(dtype=object)
+    matched = positions >= 0
+    matched[matched] = words[positions[matched]] == terms[matched]
+    if not matched.all():
+        missing = ~matched
+        keys = pd.MultiIndex.from_arrays([terms[missing], occurrences[missing]])
+        positions[missing] = deck_keys(quiz_df).get_indexer(keys)
+    return positions
+
+
+def apply_progress(quiz_df: pd.DataFrame, snapshot: dict) -> int:
+    """スナップショットの進捗を quiz_df に書き戻し、復元した単語数を返します（処理量は回答済みの単語数に比例します）。"""
+    n = len(snapshot["term_ids"])
+    if n == 0:
+        return 0
+    positions = _locate_rows(quiz_df, snapshot["term_ids"], snapshot["terms"], snapshot["occurrences"])
+    found = positions >= 0
+    target = positions[found]
+
+    last = snapshot["last"][found].astype('datetime64[ns]')
+    updates = {
+        '〇×結果': _RESULT_VALUES[snapshot["results"][found]],
+        '正解回数': snapshot["correct"][found].astype(np.int64),
+        '不正解回数': snapshot["incorrect"][found].astype(np.int64),
+        '最終実施日時': last,
+    }
+    for col, values in updates.items():
+        quiz_df.iloc[target, quiz_df.columns.get_loc(col)] = values
+    return int(found.sum())
+
+
+def direction_arrays(quiz_df: pd.DataFrame, snapshot: dict) -> tuple:
+    """スナップショットの出題方向ごとの回答数を、今の quiz_df の term_id に付け替えて返します。
+
+    戻り値は quiz_engine.DirectionProgress.from_arrays にそのまま渡せる (方向のリスト, term_id の配列, 回答数の2次元配列) です。
+    """
+    positions = _locate_rows(quiz_df, snapshot["direction_term_ids"], snapshot["direction_terms"], snapshot["direction_occurrences"])
+    found = positions >= 0
+    return snapshot["directions"], quiz_df.index.to_numpy(dtype=np.int64)[positions[found]], snapshot["direction_counts"][found]
+
+
+class SnapshotStore:
+    """セッションごとのスナップショットをファイルに保存するストア。
+
+    stage() はその時点の回答済みの単語の進捗だけをコピーして預かり、エンコードと書き込みはバックグラウンドスレッドが
+    interval 秒ごとにまとめて行います（書き込みまでの間にセッションが進捗を変えても、登録時の状態が保存されます）。プロセス終了時（atexit）にも残りを書き出します。
+    """
+
+    def __init__(self, directory: str = DEFAULT_STORE_DIR, interval: float = 30.0, max_age_days: float = 30.0):
+        self.directory = directory
+        self.interval = interval
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._staged = {}  # セッションID -> (capture した進捗, 画面状態)
+        os.makedirs(directory, exist_ok=True)
+        self._prune()
+        threading.Thread(target=self._run, name="session-snapshot", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.snap")
+
+    def stage(self, session_id: str, quiz_df: pd.DataFrame, ui_state: dict, direction_progress=None):
+        """次の書き込みで保存するセッションの状態を登録します（同じセッションは最新の状態で上書き）。"""
+        if not is_valid_session_id(session_id) or quiz_df is None:
+            return
+        progress = capture(quiz_df, direction_progress)  # 登録後にセッションが quiz_df を書き換えても影響しないよう、ここで取り出しておく
+        with self._lock:
+            self._staged[session_id] = (progress, ui_state)
+
+    def flush(self):
+        """登録されたスナップショットをすべて書き出します。"""
+        with self._lock:
+            staged, self._staged = self._staged, {}
+        for session_id, (progress, ui_state) in staged.items():
+            try:
+                data = encode_progress(progress, ui_state)
+                tmp_path = f"{self._path(session_id)}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(session_id))
+            except Exception as e:  # 1セッションの失敗で他のセッションの保存を止めない
+                logger.warning("failed to write session snapshot %s: %s", session_id, e)
+
+    def load(self, session_id: str):
+        """保存されたスナップショットを decode して返します。なければ None を返します。"""
+        if not is_valid_session_id(session_id):
+            return None
+        with self._lock:
+            staged = self._staged.get(session_id)
+        if staged is not None:  # まだ書き出していない最新の状態がある
+            progress, ui_state = staged
+            return {"ui": ui_state, **progress}
+        try:
+            with open(self._path(session_id), 'rb') as f:
+                return decode(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zlib.error, struct.error) as e:
+            logger.warning("ignoring unreadable session snapshot %s: %s", session_id, e)
+            return None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def _prune(self):
+        """長期間更新されていないスナップショットを削除します。"""
+        limit = time.time() - self.max_age_days * 86400
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith(".snap") and os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
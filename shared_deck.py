@@ -0,0 +1,190 @@
+"""複数の Streamlit ワーカープロセスで読み取り専用のデッキを共有するためのストア。
+
+デッキのうちセッションで書き換えない列（単語・説明などのテキスト列とカテゴリ系の列）を
+Arrow IPC ファイルとして一度だけ書き出し、各プロセスはそれを memory map してコピーなしで参照します。
+どのファイルが最新かは manifest.json（バージョン番号と元CSVの更新日時・サイズ、書き出し形式の指紋）で管理し、
+os.replace で差し替えることで、デッキの再構築を各プロセスがアトミックに取り込めるようにしています。
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス間ロックなしで動かす
+    fcntl = None
+
+from deck_validation import COLUMN_TYPES, REQUIRED_COLUMNS
+from deck_watcher import PROGRESS_COLUMNS
+
+# 辞書エンコード（カテゴリコード化）して保存する列
+CATEGORY_COLUMNS = ['カテゴリ', '分野', '試験区分', '出題確率（推定）', 'シラバス改定有無']
+
+DEFAULT_STORE_DIR = os.path.join(tempfile.gettempdir(), "tango_quiz_shared_deck")
+# 書き出すファイルの形式のバージョン（_publish / _attach や型変換の処理を変えたら上げる）
+STORE_FORMAT = 1
+
+
+def format_fingerprint() -> str:
+    """書き出し形式と列の型定義の指紋。ストアは再起動後も残るので、コードが変わったら古いデッキを使わないようにします。"""
+    schema = {
+        "format": STORE_FORMAT,
+        "required": REQUIRED_COLUMNS,
+        "categories": CATEGORY_COLUMNS,
+        "progress": PROGRESS_COLUMNS,
+        "types": COLUMN_TYPES,
+    }
+    encoded = json.dumps(schema, ensure_ascii=False, sort_keys=True, default=lambda v: getattr(v, "__name__", str(v)))
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _text_values(values: pd.Series) -> np.ndarray:
+    """欠損値を空文字にした文字列の配列を返します。"""
+    return values.astype(object).fillna('').astype(str).to_numpy(dtype=object)
+
+
+def _string_dtype():
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except TypeError:  # pandas 2.3 未満
+        return pd.StringDtype("pyarrow")
+
+
+class SharedDeckStore:
+    """memory map したデッキを manifest のバージョンで管理するストア。"""
+
+    def __init__(self, directory: str = DEFAULT_STORE_DIR, keep_versions: int = 2):
+        import pyarrow  # noqa: F401  共有ストアを使う場合のみ必要
+        self.directory = directory
+        self.keep_versions = keep_versions
+        self.fingerprint = format_fingerprint()
+        self._manifest_path = os.path.join(directory, "manifest.json")
+        self._lock_path = os.path.join(directory, "publish.lock")
+        self._thread_lock = threading.Lock()
+        self._attached = None  # (バージョン, DataFrame) 。memory map の寿命を DataFrame と揃えて保持する
+        self.cache_hits = 0  # get_or_build で公開済みのデッキを使えた回数（メトリクス用）
+        self.cache_misses = 0
+        self.mapped_bytes = 0  # 現在 memory map しているデッキファイルのサイズ
+        os.makedirs(directory, exist_ok=True)
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def lookup(self, source_stat):
+        """元CSVの (mtime_ns, size) と書き出し形式の指紋が一致する公開済みデッキがあれば (バージョン, DataFrame) を返します。"""
+        manifest = self._read_manifest()
+        if manifest is None or tuple(manifest["source_stat"]) != tuple(source_stat):
+            return None
+        if manifest.get("fingerprint") != self.fingerprint:  # 別のバージョンのコードが書き出したデッキ
+            return None
+        return manifest["version"], self._attach(manifest)
+
+    def get_or_build(self, source_stat, build_fn):
+        """公開済みのデッキを取得し、なければ build_fn() で作って公開します。
+
+        戻り値は (バージョン, DataFrame, このプロセスで構築したかどうか) です。
+        プロセス間ロックの中で再確認するので、同じ更新を複数のワーカーが重複してパースすることはありません。
+        """
+        with self._thread_lock, open(self._lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                found = self.lookup(source_stat)
+                if found is not None:
+                    self.cache_hits += 1
+                    return found[0], found[1], False
+                self.cache_misses += 1
+                version, df = self._publish(build_fn(), source_stat)
+                return version, df, True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _publish(self, deck: pd.DataFrame, source_stat):
+        import pyarrow as pa
+
+        manifest = self._read_manifest()
+        version = (manifest["version"] if manifest else 0) + 1
+        shared_columns = [col for col in deck.columns if col not in PROGRESS_COLUMNS]
+
+        arrays = []
+        for col in shared_columns:
+            values = deck[col]
+            if col in CATEGORY_COLUMNS:
+                arrays.append(pa.array(_text_values(values), pa.large_string()).dictionary_encode())
+            elif values.dtype.kind in 'biufcmM':
+                arrays.append(pa.array(values.to_numpy(), from_pandas=True))
+            else:
+                arrays.append(pa.array(_text_values(values), pa.large_string()))
+        table = pa.Table.from_arrays(arrays, names=shared_columns).replace_schema_metadata(
+            {"columns": json.dumps(list(deck.columns), ensure_ascii=False)}
+        )
+
+        file_name = f"deck-v{version}.arrow"
+        path = os.path.join(self.directory, file_name)
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+        new_manifest = {
+            "version": version, "file": file_name, "source_stat": list(source_stat), "fingerprint": self.fingerprint,
+        }
+        tmp_manifest = self._manifest_path + ".tmp"
+        with open(tmp_manifest, 'w', encoding='utf-8') as f:
+            json.dump(new_manifest, f)
+        os.replace(tmp_manifest, self._manifest_path)  # ここで新しいバージョンがアトミックに公開される
+
+        self._cleanup(version)
+        return version, self._attach(new_manifest)
+
+    def _cleanup(self, current_version: int):
+        """古いバージョンのファイルを削除します（memory map 中のファイルは削除後も参照できます）。"""
+        for name in os.listdir(self.directory):
+            if not (name.startswith("deck-v") and name.endswith(".arrow")):
+                continue
+            try:
+                version = int(name[len("deck-v"):-len(".arrow")])
+            except ValueError:
+                continue
+            if version <= current_version - self.keep_versions:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _attach(self, manifest: dict) -> pd.DataFrame:
+        """manifest が指すファイルを memory map し、進捗カラムだけを新しく付けた DataFrame を返します。"""
+        if self._attached is not None and self._attached[0] == manifest["version"]:
+            return self._attached[1]
+
+        import pyarrow as pa
+
+        source = pa.memory_map(os.path.join(self.directory, manifest["file"]), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        self.mapped_bytes = source.size()
+        string_dtype = _string_dtype()
+        df = table.to_pandas(
+            types_mapper=lambda t: string_dtype if pa.types.is_large_string(t) else None
+        )
+
+        n = len(df)
+        df['〇×結果'] = pd.Series(np.full(n, '', dtype=object), index=df.index, dtype=object)  # 回答ごとに O(1) で書き換えられる object 型にする
+        df['正解回数'] = np.zeros(n, dtype=np.int64)
+        df['不正解回数'] = np.zeros(n, dtype=np.int64)
+        df['最終実施日時'] = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+
+        columns = json.loads(table.schema.metadata[b"columns"].decode('utf-8'))
+        df = df[[col for col in columns if col in df.columns]]
+        self._attached = (manifest["version"], df)
+        return df
@@ -0,0 +1,51 @@
+"""起動時間（初回描画まで・最初の問題表示まで）の計測値を保持するモジュール。
+
+コールドスタートの劣化を追えるように、プロセス全体で共有して直近の値を保持し、ログにも出力します。
+"""
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class StartupMetrics:
+    """初回描画までの時間と、セッション開始から最初の問題表示までの時間を記録します。"""
+
+    def __init__(self, max_samples: int = 500):
+        self._lock = threading.Lock()
+        self.cold_first_paint_ms = None  # プロセス起動後、最初の実行での初回描画までの時間
+        self.first_paint_ms = deque(maxlen=max_samples)
+        self.first_question_ms = deque(maxlen=max_samples)
+
+    def record_first_paint(self, elapsed_ms: float):
+        with self._lock:
+            cold = self.cold_first_paint_ms is None
+            if cold:
+                self.cold_first_paint_ms = elapsed_ms
+            self.first_paint_ms.append(elapsed_ms)
+        if cold:
+            logger.info("cold start: first paint %.1f ms", elapsed_ms)
+
+    def record_first_question(self, elapsed_ms: float):
+        with self._lock:
+            self.first_question_ms.append(elapsed_ms)
+        logger.info("session first question %.1f ms", elapsed_ms)
+
+    def summary(self) -> dict:
+        """{指標名: (件数, p50, p95)} と、コールドスタート時の初回描画時間を返します。"""
+        with self._lock:
+            paints, questions = list(self.first_paint_ms), list(self.first_question_ms)
+            cold = self.cold_first_paint_ms
+        return {
+            "cold_first_paint_ms": cold,
+            "first_paint_ms": (len(paints), _percentile(paints, 0.5), _percentile(paints, 0.95)),
+            "first_question_ms": (len(questions), _percentile(questions, 0.5), _percentile(questions, 0.95)),
+        }
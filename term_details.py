@@ -0,0 +1,144 @@
+"""フィードバック表示やデータビューアでしか使わない詳細テキスト列を、セッション外の SQLite に置くストア。
+
+セッションの quiz_df には出題・絞り込みに必要な列（単語・説明・カテゴリなど）だけを残し、
+詳細列は DataFrame のインデックス（term_id）をキーにして必要になったときだけ取り出します。
+ファイル名は詳細列の内容のハッシュなので、同じデッキを使うセッションやワーカー間で共有されます。
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+# セッションに持たせず、必要なときにストアから取り出す列
+DETAIL_COLUMNS = ['試験区分', '午後記述での使用例', '使用理由／文脈', '改定の意図・影響']
+
+DEFAULT_STORE_DIR = os.path.join(tempfile.gettempdir(), "tango_quiz_term_details")
+
+
+class TermDetailStore:
+    """デッキごとの詳細列を SQLite ファイルに保存し、term_id で引けるようにするストア。"""
+
+    def __init__(self, directory: str = DEFAULT_STORE_DIR, max_age_days: float = 7.0, mmap_size: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_age_days = max_age_days
+        self.mmap_size = mmap_size
+        self._lock = threading.Lock()
+        self._connections = {}  # deck_id -> sqlite3.Connection
+        self._ids_by_key = {}  # 呼び出し側のキャッシュキー -> deck_id（ハッシュ計算の省略用）
+        self.cache_hits = 0  # put で書き込みを省略できた回数（メトリクス用）
+        self.cache_misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, deck_id: str) -> str:
+        return os.path.join(self.directory, f"details-{deck_id}.sqlite")
+
+    def put(self, details: pd.DataFrame, cache_key=None) -> str:
+        """詳細列の DataFrame（インデックスが term_id）を保存し、deck_id を返します。
+
+        cache_key を渡すと、同じキーでの2回目以降の呼び出しではハッシュ計算も省略します。
+        """
+        if cache_key is not None and cache_key in self._ids_by_key:
+            self.cache_hits += 1
+            self._touch(self._ids_by_key[cache_key])
+            return self._ids_by_key[cache_key]
+
+        hashed = pd.util.hash_pandas_object(details, index=True).to_numpy()
+        deck_id = hashlib.blake2b(hashed.tobytes() + "\x1f".join(details.columns).encode('utf-8'), digest_size=8).hexdigest()
+
+        path = self._path(deck_id)
+        if not os.path.exists(path):
+            self.cache_misses += 1
+            self._write(path, details)
+            self._prune()
+        else:
+            self.cache_hits += 1
+            self._touch(deck_id)
+        if cache_key is not None:
+            self._ids_by_key[cache_key] = deck_id
+        return deck_id
+
+    def _write(self, path: str, details: pd.DataFrame):
+        columns = ", ".join(f'"{col}" TEXT' for col in details.columns)
+        placeholders = ", ".join("?" for _ in range(len(details.columns) + 1))
+        rows = zip(
+            (int(i) for i in details.index),
+            *(details[col].astype(object).fillna('').astype(str) for col in details.columns),
+        )
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute(f"CREATE TABLE details (term_id INTEGER PRIMARY KEY, {columns})")
+            conn.executemany(f"INSERT INTO details VALUES ({placeholders})", rows)
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)  # 書き込みが終わってから公開する（他のワーカーが途中のファイルを読まないように）
+
+    def _touch(self, deck_id: str):
+        """使われている詳細ファイルの更新日時を今にして、_prune で削除されないようにします。"""
+        try:
+            os.utime(self._path(deck_id))
+        except OSError:
+            pass
+
+    def _prune(self):
+        """長期間使われていない詳細ファイルを削除します。このプロセスで使っているファイルは古くても残します。"""
+        limit = time.time() - self.max_age_days * 86400
+        in_use = {self._path(deck_id) for deck_id in (*self._ids_by_key.values(), *self._connections)}
+        for name in os.listdir(self.directory):
+            if not name.startswith("details-"):
+                continue
+            path = os.path.join(self.directory, name)
+            if path in in_use:
+                continue
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _connection(self, deck_id: str) -> sqlite3.Connection:
+        conn = self._connections.get(deck_id)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self._path(deck_id)}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._connections[deck_id] = conn
+        return conn
+
+    def get(self, deck_id: str, term_id: int) -> dict:
+        """1語分の詳細列を {列名: 値} で返します。見つからない場合は空の dict を返します。"""
+        if deck_id is None or term_id is None:
+            return {}
+        try:
+            with self._lock:
+                cursor = self._connection(deck_id).execute(
+                    "SELECT * FROM details WHERE term_id = ?", (int(term_id),)
+                )
+                row = cursor.fetchone()
+                names = [d[0] for d in cursor.description]
+        except sqlite3.Error:
+            return {}
+        if row is None:
+            return {}
+        return dict(zip(names[1:], row[1:]))
+
+    def get_frame(self, deck_id: str) -> pd.DataFrame:
+        """デッキ全体の詳細列を term_id をインデックスにした DataFrame で返します（データビューア・エクスポート用）。"""
+        if deck_id is None:
+            return pd.DataFrame()
+        try:
+            with self._lock:
+                return pd.read_sql_query("SELECT * FROM details", self._connection(deck_id), index_col="term_id")
+        except (sqlite3.Error, pd.errors.DatabaseError):
+            return pd.DataFrame()
+
+
+def split_details(df: pd.DataFrame):
+    """DataFrame を（詳細列を除いた DataFrame, 詳細列だけの DataFrame）に分けます。"""
+    detail_columns = [col for col in DETAIL_COLUMNS if col in df.columns]
+    return df.drop(columns=detail_columns), df[detail_columns]
@@ -0,0 +1,46 @@
+"""DeckWatcher（tango.csv の監視と差分更新）のテスト。"""
+import time
+
+import pytest
+
+from deck_validation import apply_column_types
+from deck_watcher import DeckWatcher
+
+HEADER = "単語,説明,カテゴリ,分野\n"
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("broken", [
+    HEADER + "A,a,x,y\nC,c,x,y\nB,b,x,y,余分,な列\n",  # pandas の ParserError
+    (HEADER + "A,a,x,y\n").encode("utf-8") + b"B,\xff\xfe,x,y\n",  # UnicodeDecodeError
+])
+def test_refresh_keeps_deck_when_file_is_broken(tmp_path, broken):
+    path = tmp_path / "tango.csv"
+    path.write_text(HEADER + "A,a,x,y\n", encoding="utf-8")
+    watcher = DeckWatcher(str(path), apply_column_types, poll_interval=0.01)
+    assert watcher.refresh()
+    stat = watcher._stat
+
+    if isinstance(broken, bytes):
+        path.write_bytes(broken)
+    else:
+        path.write_text(broken, encoding="utf-8")
+    wait_until(watcher._dirty.is_set)
+    with pytest.raises(ValueError):
+        watcher.refresh()
+    assert watcher.deck["単語"].tolist() == ["A"] and watcher.version == 0
+    assert watcher.load_error is not None
+    assert watcher._stat == stat
+
+    # 壊れたファイルのまま stat が変わらなくても、直したファイルは次の確認で読み直される
+    path.write_text(HEADER + "A,a,x,y\nB,b,x,y\n", encoding="utf-8")
+    wait_until(watcher._dirty.is_set)
+    assert watcher.refresh()
+    assert watcher.deck["単語"].tolist() == ["A", "B"]
+    assert watcher.load_error is None
@@ -0,0 +1,41 @@
+"""ProgressStats（回答の集計値）のテスト。"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from progress_stats import ProgressStats
+
+
+def record_days(stats, days, start=datetime(2025, 1, 1, 9, 30)):
+    for day in range(days):
+        stats.record({"単語": f"単語{day}"}, day % 3 != 0, start + timedelta(days=day))
+
+
+@pytest.mark.parametrize("days", [1, 100, 121, 365, 1000])
+def test_downsampled_timeline_respects_max_points(days):
+    stats = ProgressStats()
+    record_days(stats, days)
+    timeline = stats.downsampled_timeline(max_points=120)
+    assert 1 <= len(timeline) <= 120
+    assert sum(c + i for _, c, i in timeline) == days
+    assert sum(c for _, c, _ in timeline) == stats.correct
+
+
+def test_downsampled_timeline_keeps_minutes_for_short_sessions():
+    stats = ProgressStats()
+    start = datetime(2025, 1, 1, 9, 0)
+    for minute in range(30):
+        stats.record({"単語": "A"}, True, start + timedelta(minutes=minute))
+    timeline = stats.downsampled_timeline(max_points=120)
+    assert len(timeline) == 30
+    assert [when for when, _, _ in timeline] == [start + timedelta(minutes=m) for m in range(30)]
+
+
+def test_downsampled_timeline_unaligned_span():
+    # 幅の倍数で区切ると span / 幅 より1つ多くなる範囲でも上限を超えない
+    stats = ProgressStats()
+    start = datetime(2025, 1, 1, 9, 3)
+    stats.record({"単語": "A"}, True, start)
+    stats.record({"単語": "B"}, False, start + timedelta(minutes=599))
+    assert len(stats.downsampled_timeline(max_points=120)) <= 120
+    assert stats.downsampled_timeline(max_points=1)[0][1:] == (1, 1)
@@ -0,0 +1,206 @@
+"""QuizEngine（出題・回答の記録・集計）のテスト。"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import quiz_engine
+from deck_validation import apply_column_types
+from quiz_engine import EXAM_MODE, QUIZ_MODES, QuizEngine, QuizFilters
+
+
+def make_deck(rows: int = 12) -> pd.DataFrame:
+    deck = pd.DataFrame({
+        "単語": [f"単語{i}" for i in range(rows)],
+        "説明": [f"説明{i}" for i in range(rows)],
+        "カテゴリ": ["テクノロジ" if i % 2 == 0 else "マネジメント" for i in range(rows)],
+        "分野": [f"分野{i % 3}" for i in range(rows)],
+        # 奇数行だけ使用例がある
+        "午後記述での使用例": [f"使用例{i}" if i % 2 else np.nan for i in range(rows)],
+        "試験区分": ["午前・午後" if i % 4 == 0 else "午前" for i in range(rows)],
+        "出題確率（推定）": ["高" if i < 3 else np.nan for i in range(rows)],
+        "シラバス改定有無": ["Ver.7.0で追加" if i % 3 == 0 else np.nan for i in range(rows)],
+    })
+    return apply_column_types(deck)
+
+
+@pytest.fixture
+def engine():
+    return QuizEngine(make_deck(), seed=0)
+
+
+@pytest.mark.parametrize("mode", QUIZ_MODES)
+def test_next_question_default_direction(engine, mode):
+    if mode == "苦手":  # 回答済みの単語だけが候補になる
+        engine.record_answer(0, "誤り", term="単語0")
+    question = engine.next_question(QuizFilters(), mode)
+    assert question is not None
+    row = engine.deck.loc[question["term_id"]]
+    assert question["単語"] == row["単語"]
+    assert question["prompt"] == row["単語"]
+    assert row["説明"] in question["choices"]
+    assert len(question["choices"]) == quiz_engine.WRONG_CHOICE_COUNT + 1
+    assert len(set(question["choices"])) == len(question["choices"])
+
+
+@pytest.mark.parametrize("direction", [d for d in quiz_engine.DIRECTIONS if d != quiz_engine.DEFAULT_DIRECTION])
+@pytest.mark.parametrize("mode", ["未回答", "復習", EXAM_MODE])
+def test_next_question_directions(engine, direction, mode):
+    prompt_col, answer_col = quiz_engine.DIRECTIONS[direction]
+    for _ in range(10):
+        question = engine.next_question(QuizFilters(), mode, direction)
+        row = engine.deck.loc[question["term_id"]]
+        assert question["direction"] == direction
+        assert question["prompt"] == row[prompt_col]
+        assert row[answer_col] in question["choices"]
+        if prompt_col == "午後記述での使用例":  # 使用例のない単語は出題しない
+            assert question["term_id"] % 2 == 1
+
+
+def test_filters_limit_candidates(engine):
+    filters = QuizFilters(category="マネジメント", field="分野1")
+    for _ in range(10):
+        question = engine.next_question(filters, "復習")
+        assert question["カテゴリ"] == "マネジメント" and question["分野"] == "分野1"
+    assert engine.next_question(QuizFilters(category="存在しない"), "復習") is None
+
+
+def test_level_filter_matches_blank_level():
+    # 読み込み時に欠損値は空文字になるので、空文字で絞り込める（アプリと同じ）
+    engine = QuizEngine(make_deck(), seed=0)
+    question = engine.next_question(QuizFilters(level=""), "復習")
+    assert question is not None and question["term_id"] % 3 != 0
+
+
+def test_record_answer_updates_deck_and_stats(engine):
+    question = engine.next_question(QuizFilters(), "未回答")
+    term_id = question["term_id"]
+    correct = engine.deck.at[term_id, "説明"]
+    result = engine.record_answer(term_id, correct, term=question["単語"], elapsed_ms=1200)
+    assert result.is_correct and result.correct_answer == correct
+    assert engine.deck.at[term_id, "〇×結果"] == "〇"
+    assert engine.deck.at[term_id, "正解回数"] == 1
+
+    wrong = engine.record_answer(1, "誤り", term="単語1", elapsed_ms=800)
+    assert not wrong.is_correct
+    assert engine.deck.at[1, "〇×結果"] == "×" and engine.deck.at[1, "不正解回数"] == 1
+
+    stats = engine.stats()
+    assert stats["answered"] == 2 and stats["correct"] == 1
+    assert stats["scope_answered"] == 2 and stats["scope_correct"] == 1
+    assert stats["remaining"] == len(engine.deck) - 2
+    assert stats["mean_answer_ms"] == pytest.approx(1000)
+
+
+def test_unanswered_mode_skips_answered_terms(engine):
+    for term_id in engine.deck.index[:-1]:
+        engine.record_answer(term_id, "誤り", term=engine.deck.at[term_id, "単語"])
+    last = engine.deck.index[-1]
+    assert engine.next_question(QuizFilters(), "未回答")["term_id"] == last
+    engine.record_answer(last, "誤り", term=engine.deck.at[last, "単語"])
+    assert engine.next_question(QuizFilters(), "未回答") is None
+
+
+def test_record_answer_uses_current_direction(engine):
+    question = engine.next_question(QuizFilters(), "復習", "説明→単語")
+    result = engine.record_answer(question["term_id"], question["単語"], term=question["単語"])
+    assert result.direction == "説明→単語" and result.is_correct
+
+
+def test_locate_falls_back_to_term(engine):
+    # デッキの更新で term_id がずれた場合は単語で探し直す
+    result = engine.record_answer(3, "説明5", term="単語5")
+    assert result.term_id == 5 and result.is_correct
+    # term_id が存在しない場合も単語で探す
+    assert engine.record_answer(999, "説明2", term="単語2").term_id == 2
+    # どちらでも見つからなければ None
+    assert engine.record_answer(999, "説明2", term="ない単語") is None
+    assert engine.record_answer(999, "説明2") is None
+
+
+def test_scope_counters_per_filter(engine):
+    filters = QuizFilters(category="テクノロジ")
+    engine.record_answer(0, "説明0", term="単語0", filters=filters)
+    engine.record_answer(1, "説明1", term="単語1")
+    assert engine.stats(filters)["scope_answered"] == 1
+    assert engine.stats()["scope_answered"] == 1
+    assert engine.stats()["answered"] == 2
+
+
+def test_same_seed_same_questions():
+    first = QuizEngine(make_deck(), seed=42)
+    second = QuizEngine(make_deck(), seed=42)
+    for _ in range(5):
+        a = first.next_question(QuizFilters(), "復習")
+        b = second.next_question(QuizFilters(), "復習")
+        assert (a["term_id"], a["choices"]) == (b["term_id"], b["choices"])
+
+
+def test_question_set_has_no_duplicates(engine):
+    questions = engine.question_set(8, QuizFilters(), "復習")
+    assert len(questions) == 8
+    assert len({q["term_id"] for q in questions}) == 8
+    assert len(engine.question_set(100, QuizFilters(), "復習")) == len(engine.deck)
+
+
+def test_load_deck_matches_app_types(tmp_path):
+    path = tmp_path / "deck.csv"
+    pd.DataFrame({
+        "単語": ["A", "B"], "説明": ["a", "b"], "カテゴリ": ["c", "c"], "分野": ["f", "f"],
+        "シラバス改定有無": ["Ver.7.0で追加", None],
+    }).to_csv(path, index=False)
+    deck = quiz_engine.load_deck(str(path))
+    assert deck["シラバス改定有無"].tolist() == ["Ver.7.0で追加", ""]
+    assert deck["〇×結果"].tolist() == ["", ""]
+    assert deck["正解回数"].tolist() == [0, 0]
+
+
+def test_load_deck_requires_columns(tmp_path):
+    path = tmp_path / "deck.csv"
+    pd.DataFrame({"単語": ["A"]}).to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        quiz_engine.load_deck(str(path))
+
+
+def test_directions_track_progress_separately(engine):
+    # 説明→単語 で回答しても、単語→説明 の未回答からは外れない
+    engine.record_answer(0, "単語0", term="単語0", direction="説明→単語")
+    assert engine.deck.at[0, "〇×結果"] == ""
+    assert engine.direction_progress.counts(0, "説明→単語") == (1, 0)
+    assert engine.stats()["remaining"] == len(engine.deck)
+    assert engine.stats(direction="説明→単語")["remaining"] == len(engine.deck) - 1
+
+    # 単語→説明 で回答しても、説明→単語 の未回答からは外れない
+    for term_id in engine.deck.index[1:]:
+        engine.record_answer(term_id, "誤り", term=engine.deck.at[term_id, "単語"])
+    assert engine.next_question(QuizFilters(), "未回答", "説明→単語")["term_id"] != 0
+    assert engine.next_question(QuizFilters(), "未回答")["term_id"] == 0
+
+
+def test_weak_mode_uses_direction_counts(engine):
+    engine.record_answer(2, "誤り", term="単語2", direction="説明→単語")
+    assert engine.next_question(QuizFilters(), "苦手") is None
+    for _ in range(5):
+        assert engine.next_question(QuizFilters(), "苦手", "説明→単語")["term_id"] == 2
+
+
+def test_direction_progress_keyed_by_term_id():
+    deck = make_deck()
+    deck.loc[5, "単語"] = "単語4"  # 同じ単語の行が2つある
+    engine = QuizEngine(deck, seed=0)
+    engine.record_answer(5, "単語4", term="単語4", direction="説明→単語")
+    assert engine.direction_progress.counts(5, "説明→単語") == (1, 0)
+    assert engine.direction_progress.counts(4, "説明→単語") == (0, 0)
+    view = engine.progress_view(deck, "説明→単語")
+    assert view.loc[[4, 5], "〇×結果"].tolist() == ["", "〇"]
+
+    engine.direction_progress.remap({5: 50})
+    assert engine.direction_progress.counts(50, "説明→単語") == (1, 0)
+    assert engine.direction_progress.summary() == [("説明→単語", 1, 1)]
+
+
+def test_main_reports_no_candidates(tmp_path, capsys):
+    path = tmp_path / "deck.csv"
+    pd.DataFrame({"単語": ["A", "B"], "説明": ["a", "b"], "カテゴリ": ["c", "c"], "分野": ["f", "f"]}).to_csv(path, index=False)
+    assert quiz_engine.main([str(path), "--direction", "使用例→単語", "--answers", "3"]) == 1
+    assert "出題できる単語がありません" in capsys.readouterr().err
+    assert quiz_engine.main([str(path), "--answers", "3"]) == 0
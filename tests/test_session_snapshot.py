@@ -0,0 +1,93 @@
+"""セッションのスナップショット（保存・復元）のテスト。"""
+import pandas as pd
+
+import session_snapshot
+from deck_validation import apply_column_types
+from session_snapshot import SnapshotStore
+
+SESSION_ID = "0123456789abcdef01234567"
+
+
+def make_deck() -> pd.DataFrame:
+    return apply_column_types(pd.DataFrame({
+        "単語": ["A", "B", "A", "C"],
+        "説明": ["a", "b", "a2", "c"],
+        "カテゴリ": ["x"] * 4,
+        "分野": ["y"] * 4,
+    }))
+
+
+def answer(deck, position, result):
+    deck.iloc[position, deck.columns.get_loc("〇×結果")] = result
+    col = "正解回数" if result == "〇" else "不正解回数"
+    deck.iloc[position, deck.columns.get_loc(col)] += 1
+    deck.iloc[position, deck.columns.get_loc("最終実施日時")] = pd.Timestamp("2026-01-02 03:04:05")
+
+
+def test_encode_decode_round_trip():
+    deck = make_deck()
+    answer(deck, 1, "〇")
+    answer(deck, 2, "×")
+    snapshot = session_snapshot.decode(session_snapshot.encode(deck, {"quiz_mode": "復習"}))
+    assert snapshot["ui"] == {"quiz_mode": "復習"}
+    assert snapshot["term_ids"].tolist() == [1, 2]
+    assert snapshot["occurrences"].tolist() == [0, 1]
+
+    restored = make_deck()
+    assert session_snapshot.apply_progress(restored, snapshot) == 2
+    assert restored["〇×結果"].tolist() == ["", "〇", "×", ""]
+    assert restored.at[2, "最終実施日時"] == pd.Timestamp("2026-01-02 03:04:05")
+
+
+def test_stage_keeps_progress_at_stage_time(tmp_path):
+    store = SnapshotStore(str(tmp_path), interval=3600)
+    deck = make_deck()
+    answer(deck, 0, "〇")
+    store.stage(SESSION_ID, deck, {"quiz_mode": "未回答"})
+    # 書き込み前にセッションが進捗を変えても、登録時の状態が保存される
+    answer(deck, 3, "×")
+    deck.iloc[0, deck.columns.get_loc("〇×結果")] = "×"
+
+    staged = store.load(SESSION_ID)
+    assert staged["term_ids"].tolist() == [0]
+    store.flush()
+    saved = store.load(SESSION_ID)
+    assert saved["term_ids"].tolist() == [0]
+    assert saved["results"].tolist() == [1]
+    assert saved["correct"].tolist() == [1]
+
+
+def test_direction_progress_round_trip(tmp_path):
+    from quiz_engine import DirectionProgress
+
+    store = SnapshotStore(str(tmp_path), interval=3600)
+    deck = make_deck()
+    progress = DirectionProgress()
+    progress.record(2, "説明→単語", True)
+    progress.record(2, "説明→単語", False)
+    progress.record(3, "使用例→単語", True)
+    store.stage(SESSION_ID, deck, {}, progress)
+    progress.record(0, "説明→単語", True)  # 登録後の回答は保存されない
+    store.flush()
+
+    # デッキが更新されて term_id がずれても、（単語, 出現番号）で付け替えて戻す
+    restored = make_deck().iloc[[3, 0, 1, 2]].reset_index(drop=True)
+    snapshot = session_snapshot.decode((tmp_path / f"{SESSION_ID}.snap").read_bytes())
+    rebuilt = DirectionProgress.from_arrays(*session_snapshot.direction_arrays(restored, snapshot))
+    assert rebuilt.counts(3, "説明→単語") == (1, 1)
+    assert rebuilt.counts(0, "使用例→単語") == (1, 0)
+    assert rebuilt.counts(1, "説明→単語") == (0, 0)
+    view = rebuilt.progress(restored, "説明→単語")
+    assert view["〇×結果"].tolist() == ["", "", "", "×"]
+
+
+def test_snapshot_without_direction_block():
+    # 方向ごとの回答数を保存する前の形式も読める
+    deck = make_deck()
+    answer(deck, 1, "〇")
+    data = session_snapshot.encode(deck, {})
+    body = session_snapshot.zlib.decompress(data[len(session_snapshot.MAGIC):])
+    legacy = session_snapshot.MAGIC + session_snapshot.zlib.compress(body[:-len(session_snapshot._encode_directions(session_snapshot.capture(deck)))])
+    snapshot = session_snapshot.decode(legacy)
+    assert snapshot["term_ids"].tolist() == [1]
+    assert snapshot["directions"] == [] and len(snapshot["direction_term_ids"]) == 0
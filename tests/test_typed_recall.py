@@ -0,0 +1,24 @@
+"""入力式の出題の採点（typed_recall）のテスト。"""
+import pandas as pd
+
+from typed_recall import RecallIndex, normalize
+
+
+def test_normalize_ignores_width_case_and_kana():
+    assert normalize("ＴＣＰ／ＩＰ") == normalize("tcp ip")
+    assert normalize("パケットフィルタリング") == normalize("ぱけっと・ふぃるたりんぐ")
+
+
+def test_duplicated_terms_are_listed_once():
+    index = RecallIndex(pd.Series(["ウェアレベリング", "ウェアレベリング", "うぇあれべりんぐ", "ウェアレベリング", "RAID"]))
+    assert index.lookup("ウェアレベリング") == ["ウェアレベリング", "うぇあれべりんぐ"]
+    assert index.similar("ウェアレベリングx") == [(1, "ウェアレベリング"), (1, "うぇあれべりんぐ")]
+
+
+def test_grade_near_miss_and_other_term():
+    index = RecallIndex(pd.Series(["パケットフィルタリング", "パケットフィルタリング", "ハッシュ", "ハッシュ関数"]))
+    near = index.grade("パケットフィルタリンク", "パケットフィルタリング")
+    assert near.is_correct and not near.exact and near.distance == 1
+    assert index.grade("ハッシュ", "ハッシュ関数").other_term == "ハッシュ"
+    wrong = index.grade("ハッシュかん", "パケットフィルタリング")
+    assert not wrong.is_correct and wrong.suggestions.count("ハッシュ関数") <= 1
@@ -0,0 +1,160 @@
+"""入力式の出題（説明を見て単語を入力する）の採点。
+
+入力と単語は NFKC 正規化・大文字小文字の統一・カタカナのひらがな化・空白や中黒などの区切りの除去をした
+キーで比べます。単語側のキーはデッキの読み込み後に一度だけ作り、タイプミスなどの惜しい回答は
+上限付きの編集距離で判定します。近い単語の候補は、キーの長さと文字集合のビット列で NumPy でまとめて絞り込んでから
+編集距離を計算するので、大きなデッキでも全単語とは比べません::
+
+    index = RecallIndex(deck["単語"])
+    index.grade("ぱけっとふぃるたりんぐ", "パケットフィルタリング")
+"""
+import unicodedata
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# 比べるときに無視する区切り文字（NFKC 後の文字で指定する）
+_SEPARATORS = str.maketrans("", "", " \t\r\n・-‐‑–—_/")
+# カタカナ（ァ〜ヶ）をひらがなに寄せる
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+# 惜しい回答として正解にする編集距離の上限: (この文字数以上のキー, 上限) の大きい順
+NEAR_MISS_DISTANCES = ((8, 2), (4, 1))
+# 候補として表示する近い単語の数
+SUGGESTION_LIMIT = 5
+
+
+def normalize(text) -> str:
+    """入力や単語を比較用のキーにします（全角・半角、カタカナ・ひらがな、大文字・小文字の違いを無視）。"""
+    if text is None:
+        return ""
+    key = unicodedata.normalize("NFKC", str(text)).casefold()
+    return key.translate(_SEPARATORS).translate(_KATAKANA_TO_HIRAGANA)
+
+
+def near_miss_distance(key: str) -> int:
+    """キーの長さに応じた、惜しい回答として認める編集距離の上限を返します（短い単語は完全一致のみ）。"""
+    for length, distance in NEAR_MISS_DISTANCES:
+        if len(key) >= length:
+            return distance
+    return 0
+
+
+def bounded_distance(a: str, b: str, limit: int) -> int:
+    """a と b の編集距離を返します。limit を超えることが分かった時点で打ち切り、limit + 1 を返します。"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) > len(b):
+        a, b = b, a
+    previous = list(range(len(a) + 1))
+    for j, char_b in enumerate(b, 1):
+        current = [j]
+        row_min = j
+        for i, char_a in enumerate(a, 1):
+            cost = previous[i - 1] + (char_a != char_b)
+            cost = min(cost, previous[i] + 1, current[i - 1] + 1)
+            current.append(cost)
+            row_min = min(row_min, cost)
+        if row_min > limit:  # この行の最小値より距離が小さくなることはない
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def _signature(key: str) -> int:
+    """キーに含まれる文字の集合を 64 ビットにまとめたビット列（文字コードの下位 6 ビットの位置に立てる）。"""
+    bits = 0
+    for char in key:
+        bits |= 1 << (ord(char) & 63)
+    return bits
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """uint64 の各要素の立っているビットの数を返します。"""
+    if hasattr(np, "bitwise_count"):  # NumPy 2.0 以降
+        return np.bitwise_count(values)
+    return np.unpackbits(values.astype('<u8').view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+@dataclass
+class RecallGrade:
+    """入力式の回答の採点結果。"""
+    is_correct: bool
+    exact: bool  # 正規化したキーが完全に一致したかどうか
+    distance: int  # 正解とのキーの編集距離（上限を超えた場合は上限 + 1）
+    answer_key: str
+    suggestions: list = field(default_factory=list)  # 入力に近いデッキの単語（不正解・惜しい回答のとき）
+    other_term: str = None  # 入力が正解以外の単語と一致した（正解より近かった）場合、その単語
+
+
+class RecallIndex:
+    """デッキの単語の正規化キーと、近い単語を探すための索引。デッキの読み込み後に一度だけ作ります。"""
+
+    def __init__(self, terms):
+        self.index = getattr(terms, "index", None)
+        self.terms_by_key = {}  # 正規化キー -> 単語のリスト（重複なし）
+        for term in terms:
+            if term is None or term != term:  # NaN
+                continue
+            key = normalize(term)
+            if key:
+                same_key = self.terms_by_key.setdefault(key, [])
+                if str(term) not in same_key:  # デッキの重複行（同じ単語の別の説明など）は1つにまとめる
+                    same_key.append(str(term))
+        # キーを長さ順に並べ、長さの範囲を二分探索で切り出してから文字集合のビット列で候補を絞る
+        self._keys = sorted(self.terms_by_key, key=len)
+        self._lengths = np.array([len(key) for key in self._keys], dtype=np.int64)
+        self._signatures = np.array([_signature(key) for key in self._keys], dtype=np.uint64)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _candidates(self, key: str, max_distance: int) -> np.ndarray:
+        """編集距離が max_distance 以内の可能性があるキーの位置を返します。
+
+        片方にしかない文字は1文字ごとに少なくとも1回の編集が必要なので、文字集合のビット列の差が
+        max_distance を超えるキーは距離を計算せずに除けます（ビットの衝突は差を小さく見せるだけなので取りこぼしません）。
+        """
+        low = np.searchsorted(self._lengths, len(key) - max_distance, side="left")
+        high = np.searchsorted(self._lengths, len(key) + max_distance, side="right")
+        signature = np.uint64(_signature(key))
+        window = self._signatures[low:high]
+        close = (_popcount(window & ~signature) <= max_distance) & (_popcount(signature & ~window) <= max_distance)
+        return low + np.flatnonzero(close)
+
+    def matches(self, terms) -> bool:
+        return self.index is not None and self.index.equals(getattr(terms, "index", None))
+
+    def lookup(self, text: str) -> list:
+        """入力と正規化キーが一致する単語のリストを返します。"""
+        return self.terms_by_key.get(normalize(text), [])
+
+    def similar(self, text: str, max_distance: int = 2, limit: int = SUGGESTION_LIMIT) -> list:
+        """入力に近い単語を [(距離, 単語), ...] で近い順に最大 limit 件返します。"""
+        key = normalize(text)
+        found = []
+        for position in self._candidates(key, max_distance):
+            candidate = self._keys[position]
+            distance = bounded_distance(key, candidate, max_distance)
+            if distance <= max_distance:
+                found.append((distance, candidate))
+        found = sorted(found)[:limit]
+        return [(distance, term) for distance, key in found for term in self.terms_by_key[key]][:limit]
+
+    def grade(self, answer: str, expected: str) -> RecallGrade:
+        """入力 answer を正解の単語 expected と比べて採点します。
+
+        正規化キーが一致すれば正解、編集距離が near_miss_distance 以内なら惜しい回答として正解にします。
+        ただし入力がデッキの別の単語と一致する（正解より近い）場合は、その単語と取り違えたとして不正解にします。
+        """
+        answer_key, expected_key = normalize(answer), normalize(expected)
+        if answer_key == expected_key:
+            return RecallGrade(True, True, 0, answer_key)
+        allowed = near_miss_distance(expected_key)
+        # 候補は入力・正解の長い方に合わせた距離まで探す（短い入力を広く探すと無関係な短い単語ばかりになる）
+        radius = max(allowed, near_miss_distance(answer_key), 1)
+        distance = bounded_distance(answer_key, expected_key, radius)
+        nearby = self.similar(answer, radius) if answer_key else []
+        suggestions = [term for _, term in nearby if normalize(term) != expected_key]
+        closer = [term for d, term in nearby if d < distance and normalize(term) != expected_key]
+        other_term = closer[0] if closer else None
+        return RecallGrade(distance <= allowed and other_term is None, False, distance, answer_key, suggestions, other_term)
@@ -0,0 +1,82 @@
+"""データビューアに渡す Arrow テーブルのキャッシュ。
+
+st.dataframe に DataFrame を渡すと、再実行のたびに全列（長いテキストの詳細列を含む）を Arrow に変換します。
+デッキの列（単語・説明・詳細列など）はデッキのバージョンごとに変わらないので、一度だけ Arrow に変換して
+全セッションで共有し、セッションごとに変わる進捗の列だけをその都度変換して結合します。
+結合したテーブルはセッション側で進捗のバージョンが変わるまで使い回すので、変化のない再実行はキャッシュを引くだけです。
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import pandas as pd
+import pyarrow as pa
+
+from deck_watcher import PROGRESS_COLUMNS
+
+
+@dataclass(frozen=True)
+class _DeckTable:
+    """進捗の列を除いたデッキの Arrow テーブル（インデックスの term_id を含む）。"""
+    table: pa.Table
+    index: pd.Index  # 行の term_id（進捗の列と行がそろっているかの確認用）
+    head: pd.DataFrame  # 先頭1行（結合後のスキーマの pandas メタデータを作るのに使う）
+    metadata: dict = field(default_factory=dict)  # (列名, 進捗の列の型) -> 結合後のスキーマのメタデータ
+
+
+class ViewerTableCache:
+    """デッキの列の Arrow テーブルをデッキのキーごとに保持するキャッシュ（全セッションで共有）。"""
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._tables = OrderedDict()  # デッキのキー -> _DeckTable
+        self.cache_hits = 0  # メトリクス用
+        self.cache_misses = 0
+
+    def deck_table(self, deck_key, build_frame) -> _DeckTable:
+        """deck_key のデッキの列の Arrow テーブルを返します。なければ build_frame() の DataFrame から作ります。"""
+        with self._lock:
+            entry = self._tables.get(deck_key)
+            if entry is not None:
+                self._tables.move_to_end(deck_key)
+                self.cache_hits += 1
+                return entry
+        return self._build(deck_key, build_frame)
+
+    def _build(self, deck_key, build_frame) -> _DeckTable:
+        # 変換はロックの外で行う（同じキーを同時に変換しても結果は同じなので、後から入れた方を使う）
+        df = build_frame()
+        df = df[[col for col in df.columns if col not in PROGRESS_COLUMNS]]
+        entry = _DeckTable(pa.Table.from_pandas(df, preserve_index=True), df.index, df.head(1))
+        with self._lock:
+            self.cache_misses += 1
+            self._tables[deck_key] = entry
+            self._tables.move_to_end(deck_key)
+            while len(self._tables) > self.maxsize:
+                self._tables.popitem(last=False)
+        return entry
+
+    def viewer_table(self, deck_key, build_frame, progress: pd.DataFrame, columns: list = None) -> pa.Table:
+        """デッキの列のテーブルに progress の進捗の列を結合した、データビューア用のテーブルを返します。
+
+        columns を渡すとその順に列を並べます（含まれない列は末尾に付けます）。
+        progress のインデックスはデッキと同じ term_id の並びである必要があります。
+        """
+        deck = self.deck_table(deck_key, build_frame)
+        if not deck.index.equals(progress.index):  # 同じキーで行の違うデッキが来た場合は作り直す
+            deck = self._build(deck_key, build_frame)
+        progress_columns = [col for col in PROGRESS_COLUMNS if col in progress.columns]
+
+        arrays = dict(zip(deck.table.column_names, deck.table.columns))
+        arrays.update((col, pa.Array.from_pandas(progress[col])) for col in progress_columns)
+        names = [col for col in (columns or []) if col in arrays]
+        names += [col for col in arrays if col not in names]
+        # st.dataframe は pandas メタデータでインデックスと列の型を判断するので、結合後の列で作り直す（列と型が同じ間は使い回す）
+        metadata_key = (tuple(names), tuple(str(progress[col].dtype) for col in progress_columns))
+        metadata = deck.metadata.get(metadata_key)
+        if metadata is None:
+            head = deck.head.join(progress[progress_columns].head(1))
+            metadata = pa.Schema.from_pandas(head[[col for col in names if col in head.columns]], preserve_index=True).metadata
+            deck.metadata[metadata_key] = metadata
+        return pa.Table.from_arrays([arrays[col] for col in names], names=names).replace_schema_metadata(metadata)
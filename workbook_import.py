@@ -0,0 +1,85 @@
+"""Excel（.xlsx）・OpenDocument（.ods）のブックをデッキとして読み込むモジュール。
+
+ブックのシートごとに1つの出題分野が入っている前提で、各シートを読み込み、カテゴリ・分野が空の行には
+シート名を入れて、シート単位でアプリと同じ型変換（deck_validation.apply_column_types）をしてから結合します。
+シートの解析はプロセスプールで並列に行うので、大きなブックでも他のセッションの処理を止めません。
+
+xlsx には openpyxl、ods には odfpy が必要です。
+"""
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from deck_validation import REQUIRED_COLUMNS, apply_column_types, missing_required_columns
+
+# 拡張子 -> pandas.read_excel のエンジン
+ENGINES = {"xlsx": "openpyxl", "ods": "odf"}
+WORKBOOK_TYPES = tuple(ENGINES)
+# このサイズ未満のブックや1シートだけのブックは、プロセスを起動せずにその場で読む
+PARALLEL_MIN_BYTES = 256 * 1024
+# シート名を入れる列（空の値だけを埋める）
+SHEET_TAG_COLUMNS = ('カテゴリ', '分野')
+
+
+@dataclass
+class WorkbookResult:
+    """read_workbook の結果。"""
+    deck: pd.DataFrame
+    sheets: list = field(default_factory=list)  # 読み込んだシート名
+    skipped: dict = field(default_factory=dict)  # シート名 -> 読み込まなかった理由
+
+
+def workbook_kind(file_name: str):
+    """ファイル名の拡張子からブックの種類（"xlsx" / "ods"）を返します。ブックでなければ None を返します。"""
+    ext = os.path.splitext(file_name)[1].lower().lstrip(".")
+    return ext if ext in ENGINES else None
+
+
+def parse_sheet(data: bytes, kind: str, sheet: str):
+    """1シートを読み込み、(型変換済みの DataFrame, 読み込まなかった理由) を返します（ワーカープロセスで実行）。"""
+    return prepare_sheet(pd.read_excel(io.BytesIO(data), sheet_name=sheet, engine=ENGINES[kind]), sheet)
+
+
+def prepare_sheet(df: pd.DataFrame, sheet: str):
+    """読み込んだシートにシート名を付けて型変換し、(DataFrame, 読み込まなかった理由) を返します。"""
+    df = df.dropna(how='all')
+    if df.empty:
+        return None, "データがありません"
+    for col in SHEET_TAG_COLUMNS:
+        if col not in df.columns:
+            df[col] = sheet
+        else:
+            df[col] = df[col].where(df[col].notna() & (df[col].astype(str).str.strip() != ''), sheet)
+    missing = missing_required_columns(df.columns)
+    if missing:
+        return None, f"必須カラムがありません: {', '.join(missing)}"
+    return apply_column_types(df), None
+
+
+def read_workbook(data: bytes, kind: str, max_workers: int = None) -> WorkbookResult:
+    """ブックの全シートを読み込み、1つのデッキに結合して返します。"""
+    with pd.ExcelFile(io.BytesIO(data), engine=ENGINES[kind]) as book:
+        names = list(book.sheet_names)
+        workers = min(len(names), max_workers or os.cpu_count() or 1)
+        if workers > 1 and len(data) >= PARALLEL_MIN_BYTES:
+            # Streamlit のサーバーはマルチスレッドなので、fork ではなく spawn でワーカーを起動する
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                parsed = list(executor.map(parse_sheet, [data] * len(names), [kind] * len(names), names))
+        else:  # 開いたブックをシート間で使い回す
+            parsed = [prepare_sheet(book.parse(name), name) for name in names]
+
+    result = WorkbookResult(deck=pd.DataFrame(columns=REQUIRED_COLUMNS))
+    frames = []
+    for name, (df, reason) in zip(names, parsed):
+        if df is None:
+            result.skipped[name] = reason
+        else:
+            frames.append(df)
+            result.sheets.append(name)
+    if frames:
+        result.deck = pd.concat(frames, ignore_index=True)
+    return result